@@ -0,0 +1,179 @@
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request
+
+from skep.metrics import NULL_TIMER, RequestTimer
+
+
+def wsgi_environ(scope, body):
+    "Build a WSGI environ for an ASGI HTTP request"
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in {'CONTENT_TYPE', 'CONTENT_LENGTH'}:
+            name = f'HTTP_{name}'
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+
+    # The body has already been read in full.
+    environ.setdefault('CONTENT_LENGTH', str(len(body)))
+    return environ
+
+
+def asgi_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+class ASGIApp:
+    """Serve the skep app over ASGI.
+
+    Requests for ``/`` and ``/python`` are handled on the event loop; any
+    work that may block on S3 (signing a URL, or streaming a support
+    package) runs in a bounded thread pool, so a single process can handle
+    many concurrent requests. All other requests are passed to the Flask
+    app, in the thread pool.
+    """
+    def __init__(self, app, max_workers=None):
+        self.app = app
+        self.support_packages = app.extensions['support_packages']
+        self.landing_page = app.extensions['landing_page']
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or app.config['ASGI_MAX_WORKERS'],
+            thread_name_prefix='skep-asgi',
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def http(self, scope, receive, send):
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        environ = wsgi_environ(scope, body)
+        if scope['method'] in {'GET', 'HEAD'} and scope['path'] == '/':
+            response = self.landing_page.response(Request(environ))
+        elif scope['method'] in {'GET', 'HEAD'} and scope['path'] == '/python':
+            response = await self.support_package(Request(environ))
+        else:
+            status, headers, chunks = await self.run(self.wsgi, environ)
+            await send({'type': 'http.response.start', 'status': status, 'headers': asgi_headers(headers)})
+            await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+            return
+
+        await self.send_response(response, environ, send)
+
+    async def support_package(self, request):
+        support_packages = self.support_packages
+        timer = NULL_TIMER if support_packages.metrics is None else RequestTimer()
+
+        # Requests are turned away on the event loop, before they can queue
+        # for the thread pool.
+        response = support_packages.shed(request)
+        if response is None:
+            try:
+                query, response = support_packages.query(request)
+                if response is None:
+                    if query[0] == 'windows' and not self.app.config['WINDOWS_MIRROR']:
+                        # python.org URLs are resolved without any I/O.
+                        response = support_packages.resolve(request, query, timer)
+                    else:
+                        response = await self.run(support_packages.resolve, request, query, timer)
+            except HTTPException as e:
+                response = e.get_response(request.environ)
+            except BaseException:
+                support_packages.release()
+                raise
+            # A streamed response is released once it has been sent.
+            support_packages.release(response)
+
+        if support_packages.metrics is not None:
+            support_packages.record(request, response.status_code, timer)
+        return response
+
+    async def send_response(self, response, environ, send):
+        headers = response.get_wsgi_headers(environ)
+        body = response.get_app_iter(environ)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': asgi_headers(headers.items()),
+        })
+
+        try:
+            if response.is_sequence:
+                await send({'type': 'http.response.body', 'body': b''.join(body)})
+            else:
+                # A streamed support package; each chunk is read from S3.
+                chunks = iter(body)
+                while True:
+                    chunk = await self.run(next, chunks, None)
+                    if chunk is None:
+                        break
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(body, 'close'):
+                await self.run(body.close)
+
+    def wsgi(self, environ):
+        # Run the Flask app, collecting the response.
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = headers
+
+        body = self.app(environ, start_response)
+        try:
+            chunks = list(body)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return response['status'], response['headers'], chunks
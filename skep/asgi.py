@@ -0,0 +1,5 @@
+from .aio import ASGIApp
+from .skep import create_app
+
+
+app = ASGIApp(create_app())
@@ -0,0 +1,135 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from skep.s3 import PresignerWrapper
+
+
+class PresignedURLCache:
+    """A bounded LRU cache of presigned URLs.
+
+    A cached URL is served for as long as it has at least ``margin`` seconds
+    of validity left; after that, the URL is re-signed. When the cache is
+    full, the least recently used URL is evicted.
+
+    If URLs are signed as of the start of a ``time_bucket``, a URL is only
+    served during the bucket it was signed in, so that every request in a
+    bucket gets the same URL.
+    """
+    def __init__(self, maxsize=256, margin=20, time_bucket=0, clock=time.time):
+        self.maxsize = maxsize
+        self.margin = margin
+        self.time_bucket = time_bucket
+        self.clock = clock
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def get(self, key, expires_in, sign):
+        """Retrieve the URL for ``key``, using ``sign()`` to sign it if needed.
+
+        ``expires_in`` is the lifetime (in seconds) of a URL produced by
+        ``sign()``.
+        """
+        now = self.clock()
+        bucket = int(now) // self.time_bucket if self.time_bucket else None
+        with self._lock:
+            try:
+                url, expires_at, signed_in = self._entries[key]
+                if signed_in == bucket and expires_at - now >= self.margin:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return url
+
+                # The URL is too close to expiry to be handed out.
+                del self._entries[key]
+                self.expirations += 1
+            except KeyError:
+                pass
+            self.misses += 1
+
+        # Sign outside the lock, so that a slow signature doesn't
+        # block requests for other keys.
+        url = sign()
+
+        with self._lock:
+            self._entries[key] = (url, now + expires_in, bucket)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return url
+
+    def bind(self, client):
+        return CachingPresigner(client, self)
+
+
+class CachingPresigner(PresignerWrapper):
+    "Serve presigned URLs from a cache."
+    def __init__(self, client, cache):
+        super().__init__(client)
+        self.cache = cache
+
+    def sign(self, method, params, expires_in):
+        return self.cache.get(
+            (method, params['Bucket'], params['Key']),
+            expires_in,
+            functools.partial(super().sign, method, params, expires_in),
+        )
+
+
+class NegativeCache:
+    """A bounded cache of requests that are known to fail.
+
+    Entries expire after ``ttl`` seconds, so a support package that is
+    uploaded later will eventually be found.
+    """
+    def __init__(self, maxsize=1024, ttl=60, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+
+        self.hits = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return False
+            self.hits += 1
+            return True
+
+    def add(self, key):
+        with self._lock:
+            self._entries[key] = self.clock() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
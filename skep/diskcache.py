@@ -0,0 +1,149 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+import threading
+from collections import OrderedDict
+
+TEMP_PREFIX = '.tmp-'
+
+
+class _Fill:
+    # A fill in progress, and the number of requests waiting on it.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters = 0
+
+
+class SupportPackageCache:
+    """A size-bounded on-disk cache of support packages, keyed by S3 key.
+
+    Files are filled atomically - they are written to a temporary file and
+    renamed into place - and concurrent requests for the same key wait for
+    a single download. When the cache holds more than ``max_bytes``, the
+    least recently used files are evicted.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._fills = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        # Adopt files left by a previous process, oldest first.
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                if entry.name.startswith(TEMP_PREFIX):
+                    # An interrupted fill.
+                    os.remove(entry.path)
+                else:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for mtime, name, size in sorted(entries):
+            self._entries[name] = size
+            self.size += size
+        self._evict()
+
+    def _evict(self):
+        # Must be called with the lock held. The most recently added file is
+        # always kept, even if it is larger than the cache.
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def filename(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        return f'{digest}-{posixpath.basename(key)}'
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': self.size,
+            'files': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+    def open(self, key, fill):
+        """Open the cached file for ``key`` for reading.
+
+        On a miss, ``fill(f)`` is called to write the content to the
+        (binary) file object ``f``. The file is opened before the cache lock
+        is released, so it can be read even if it is evicted by another
+        request.
+        """
+        name = self.filename(key)
+        path = os.path.join(self.directory, name)
+
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return open(path, 'rb')
+            # The fill stays registered until no request is waiting on it,
+            # so that a request arriving after a failed fill can't start a
+            # second, concurrent fill.
+            pending = self._fills.get(name)
+            if pending is None:
+                pending = self._fills[name] = _Fill()
+            pending.waiters += 1
+
+        try:
+            with pending.lock:
+                return self._fill(name, path, fill)
+        finally:
+            with self._lock:
+                pending.waiters -= 1
+                if not pending.waiters:
+                    del self._fills[name]
+
+    def _fill(self, name, path, fill):
+        # Must be called with the fill's lock held.
+        with self._lock:
+            # Another request may have filled the cache while we waited.
+            if name in self._entries:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return open(path, 'rb')
+            self.misses += 1
+
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory,
+            prefix=TEMP_PREFIX,
+            delete=False,
+        ) as f:
+            try:
+                fill(f)
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        os.replace(f.name, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self.size += size - self._entries.get(name, 0)
+            self._entries[name] = size
+            self._entries.move_to_end(name)
+            result = open(path, 'rb')
+            self._evict()
+        return result
@@ -0,0 +1,37 @@
+from werkzeug.exceptions import HTTPException, InternalServerError
+from werkzeug.wrappers import Request
+
+
+class FastPath:
+    """WSGI middleware that serves a single path without Flask's request handling.
+
+    GET and HEAD requests for ``path`` are passed to ``handler`` as a plain
+    werkzeug request, skipping the request context, URL routing, sessions
+    and request hooks. Everything else is delegated to the Flask app.
+    """
+    def __init__(self, app, path, handler):
+        self.app = app
+        self.path = path
+        self.handler = handler
+        self.wsgi_app = app.wsgi_app
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') != self.path or environ.get('REQUEST_METHOD') not in {'GET', 'HEAD'}:
+            return self.wsgi_app(environ, start_response)
+
+        request = Request(environ)
+        try:
+            response = self.handler(request)
+        except HTTPException as e:
+            response = e.get_response(environ)
+        except Exception:
+            # Handle unexpected errors in the same way as Flask.
+            propagate = self.app.config['PROPAGATE_EXCEPTIONS']
+            if propagate is None:
+                propagate = self.app.testing or self.app.debug
+            if propagate:
+                raise
+            self.app.logger.exception(f"Exception on {request.path} [{request.method}]")
+            response = InternalServerError().get_response(environ)
+
+        return response(environ, start_response)
@@ -0,0 +1,68 @@
+import calendar
+import hashlib
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from flask import Response, redirect
+
+
+def presigned_url_expiry(url):
+    """Determine when a presigned S3 URL expires, as a Unix timestamp.
+
+    Understands both SigV2 (``Expires``) and SigV4 (``X-Amz-Date`` +
+    ``X-Amz-Expires``) query strings. Returns None if the URL isn't
+    presigned.
+    """
+    query = parse_qs(urlsplit(url).query)
+    try:
+        amz_date = query['X-Amz-Date'][0]
+        signed_at = calendar.timegm(time.strptime(amz_date, '%Y%m%dT%H%M%SZ'))
+        return signed_at + int(query['X-Amz-Expires'][0])
+    except (KeyError, ValueError):
+        pass
+
+    try:
+        return int(query['Expires'][0])
+    except (KeyError, ValueError):
+        return None
+
+
+def redirect_max_age(url, margin, now=None):
+    "How long a redirect to a presigned URL can be cached."
+    expires_at = presigned_url_expiry(url)
+    if expires_at is None:
+        return 0
+
+    if now is None:
+        now = time.time()
+    # Stop caching the redirect just before the signature expires.
+    return max(int(expires_at - now - margin), 0)
+
+
+def redirect_etag(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def cacheable_redirect(request, url, max_age, now=None):
+    """Redirect to ``url``, allowing the redirect to be cached for ``max_age`` seconds.
+
+    If the client already holds this redirect (``If-None-Match``), a 304 is
+    returned instead.
+    """
+    if now is None:
+        now = time.time()
+
+    etag = redirect_etag(url)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = redirect(url, code=302)
+
+    response.set_etag(etag)
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    response.expires = now + max_age
+    return response
@@ -0,0 +1,82 @@
+import logging
+import threading
+
+from skep.s3 import PresignerWrapper
+
+logger = logging.getLogger(__name__)
+
+
+class S3Inventory:
+    """An in-memory index of the support packages that exist in S3.
+
+    The index is built with a single paginated listing of the bucket, and
+    can be refreshed periodically in a background thread. Until the first
+    listing succeeds, every key is assumed to exist.
+    """
+    def __init__(self, s3, bucket, prefix='python/'):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+
+        self.keys = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return 0 if self.keys is None else len(self.keys)
+
+    def exists(self, key):
+        return self.keys is None or key in self.keys
+
+    def refresh(self):
+        keys = set()
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            keys.update(obj['Key'] for obj in page.get('Contents', []))
+
+        # Replace the index in a single step, so requests never see a
+        # partial listing.
+        self.keys = frozenset(keys)
+
+    def safe_refresh(self):
+        # A failed refresh leaves the previous index in place.
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Unable to refresh the S3 inventory")
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            self.safe_refresh()
+
+    def start(self, interval):
+        "Refresh the index every ``interval`` seconds in a background thread."
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(interval,),
+            name='skep-s3-inventory',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def bind(self, client):
+        return InventoryPresigner(client, self)
+
+
+class InventoryPresigner(PresignerWrapper):
+    "Only sign URLs for keys that exist."
+    def __init__(self, client, inventory):
+        super().__init__(client)
+        self.inventory = inventory
+
+    def sign(self, method, params, expires_in):
+        if not self.inventory.exists(params['Key']):
+            raise ValueError(f"{params['Key']} does not exist")
+        return super().sign(method, params, expires_in)
@@ -0,0 +1,174 @@
+"""Build a manifest of the sizes and checksums of support packages.
+
+Every object in the support bucket that ``/python`` can resolve to is
+hashed, and the results are written as a compact JSON document. The app
+loads the manifest once at startup, and serves it at ``/python/manifest``::
+
+    $ python -m skep.manifest --bucket briefcase-support --output instance/manifest.json
+
+Objects whose size and ETag are unchanged since the previous manifest
+aren't hashed again.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from skep import platforms, proxy
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _compile_resolvable_keys():
+    # Maps (prefix, suffix) of each support package key template to the
+    # request it answers, and each mirrored Windows key to its request.
+    templates = {
+        pair: (platform, version, host_arch)
+        for (platform, version, host_arch), pair in platforms.SUPPORT_TEMPLATES.items()
+    }
+    windows = {
+        platforms.WINDOWS_MIRROR_KEYS[url]: (
+            'windows',
+            version,
+            host_arch,
+            str(platforms.WINDOWS_MICRO_VERSIONS[version]),
+        )
+        for (version, host_arch), url in platforms.WINDOWS_INDEX.items()
+    }
+    return templates, windows
+
+
+TEMPLATES, WINDOWS_KEYS = _compile_resolvable_keys()
+DEFAULT_KEYS = set(platforms.SUPPORT_INDEX.values()) | set(WINDOWS_KEYS)
+
+
+def resolve_key(key):
+    "The (platform, version, host_arch, revision) that resolves to ``key``, or None."
+    try:
+        return WINDOWS_KEYS[key]
+    except KeyError:
+        pass
+
+    for (prefix, suffix), (platform, version, host_arch) in TEMPLATES.items():
+        if key.startswith(prefix) and key.endswith(suffix):
+            revision = key[len(prefix):len(key) - len(suffix)]
+            if revision.isdigit():
+                return platform, version, host_arch, revision
+    return None
+
+
+def hash_object(s3, bucket, key, chunk_size=CHUNK_SIZE):
+    "The SHA-256 of an S3 object, read one chunk at a time."
+    sha256 = hashlib.sha256()
+    obj = proxy.get_object(s3, bucket, key)
+    for chunk in proxy.iter_body(obj['Body'], chunk_size):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def build_manifest(s3, bucket, previous=None, jobs=4, prefix='python/'):
+    """Build a manifest of every resolvable support package in ``bucket``.
+
+    Entries in ``previous`` (an earlier manifest) are reused if the object's
+    size and ETag haven't changed.
+    """
+    reusable = {
+        (entry['key'], entry['size'], entry['etag']): entry['sha256']
+        for entry in (previous or {}).get('packages', [])
+    }
+
+    objects = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            request = resolve_key(obj['Key'])
+            if request is not None:
+                objects.append((request, obj['Key'], obj['Size'], obj['ETag']))
+
+    def entry(item):
+        (platform, version, host_arch, revision), key, size, etag = item
+        sha256 = reusable.get((key, size, etag))
+        if sha256 is None:
+            logger.info("Hashing %s", key)
+            sha256 = hash_object(s3, bucket, key)
+        return {
+            'platform': platform,
+            'version': version,
+            'arch': host_arch,
+            'revision': revision,
+            'default': key in DEFAULT_KEYS,
+            'key': key,
+            'size': size,
+            'etag': etag,
+            'sha256': sha256,
+        }
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        packages = list(executor.map(entry, objects))
+
+    # The manifest doesn't record when it was built, so an unchanged bucket
+    # produces an identical document (and ETag).
+    packages.sort(key=lambda entry: (
+        entry['platform'],
+        tuple(int(part) for part in entry['version'].split('.')),
+        entry['arch'] or '',
+        int(entry['revision']),
+    ))
+    return {'bucket': bucket, 'packages': packages}
+
+
+def dumps(manifest):
+    return json.dumps(manifest, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def write_manifest(manifest, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, prefix='.tmp-', delete=False) as f:
+        try:
+            f.write(dumps(manifest))
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, path)
+
+
+def read_manifest(path):
+    try:
+        with open(path, 'rb') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m skep.manifest', description=__doc__.split('\n')[0])
+    parser.add_argument('--bucket', default='briefcase-support', help="The S3 bucket of support packages.")
+    parser.add_argument('--region', default='us-west-2', help="The region of the S3 bucket.")
+    parser.add_argument('--output', default='instance/manifest.json', help="The file to write the manifest to.")
+    parser.add_argument('--jobs', type=int, default=4, help="The number of objects to hash in parallel.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    import boto3
+
+    manifest = build_manifest(
+        boto3.client('s3', region_name=args.region),
+        args.bucket,
+        previous=read_manifest(args.output),
+        jobs=args.jobs,
+    )
+    write_manifest(manifest, args.output)
+    print(f"{len(manifest['packages'])} support packages written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import bisect
+import json
+import logging
+import threading
+import time
+
+from skep.s3 import PresignerWrapper
+
+request_logger = logging.getLogger('skep.requests')
+
+# Latency histogram buckets, in seconds.
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+# The phases of a support package request. "overhead" is everything else:
+# routing, argument parsing and response processing by Flask.
+PHASES = ('client', 'resolve', 'sign', 'respond', 'overhead')
+
+DESCRIPTIONS = {
+    'skep_requests_total': ('counter', 'Requests for support packages, by platform, version and status.'),
+    'skep_request_duration_seconds': ('histogram', 'Total time taken to serve a support package request.'),
+    'skep_request_phase_seconds': ('histogram', 'Time spent in each phase of a support package request.'),
+}
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    values = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return f'{{{values}}}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            yield f'{name}_bucket', labels + (('le', _number(bound)),), cumulative
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, self.count
+
+
+class Metrics:
+    """An in-process registry of counters and histograms.
+
+    Rendered in the Prometheus text exposition format. Collectors can be
+    registered to report values (such as cache statistics) that are
+    maintained elsewhere.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self._counters[name, labels] = self._counters.get((name, labels), 0) + value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            try:
+                histogram = self._histograms[name, labels]
+            except KeyError:
+                histogram = self._histograms[name, labels] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collector):
+        "Register a callable that returns a list of (name, labels, value) gauges."
+        self._collectors.append(collector)
+
+    def render(self):
+        families = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                families.setdefault(name, []).append((name, labels, value))
+            for (name, labels), histogram in self._histograms.items():
+                families.setdefault(name, []).extend(histogram.samples(name, labels))
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                families.setdefault(name, []).append((name, labels, value))
+
+        lines = []
+        for family in sorted(families):
+            metric_type, description = DESCRIPTIONS.get(family, ('gauge', None))
+            if description:
+                lines.append(f'# HELP {family} {description}')
+            lines.append(f'# TYPE {family} {metric_type}')
+            for name, labels, value in families[family]:
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class _Phase:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+
+
+class RequestTimer:
+    "Accumulates the time spent in each phase of a request."
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+
+    def add(self, name, elapsed):
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def finish(self):
+        "Return the total duration, and the exclusive time spent in each phase."
+        total = time.perf_counter() - self.start
+        phases = dict(self.phases)
+        # Signing happens inside resolution.
+        if 'sign' in phases and 'resolve' in phases:
+            phases['resolve'] = max(phases['resolve'] - phases['sign'], 0.0)
+        phases['overhead'] = max(total - sum(phases.values()), 0.0)
+        return total, phases
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class NullTimer:
+    "A timer that records nothing, used when metrics are disabled."
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+
+NULL_TIMER = NullTimer()
+
+
+class TimingPresigner(PresignerWrapper):
+    "Record the time spent signing URLs."
+    def __init__(self, client, timer):
+        super().__init__(client)
+        self.timer = timer
+
+    def sign(self, method, params, expires_in):
+        with self.timer.phase('sign'):
+            return super().sign(method, params, expires_in)
+
+
+def metric_label(value, known):
+    if value is None:
+        return 'none'
+    return value if value in known else 'other'
+
+
+def stats_collector(prefix, stats):
+    "A collector that reports each value returned by ``stats()`` as a gauge."
+    def collect():
+        return [(f'{prefix}_{name}', (), value) for name, value in stats().items()]
+    return collect
+
+
+def record_request(metrics, timer, platform, version, status, log=False, **fields):
+    total, phases = timer.finish()
+
+    labels = (('platform', platform), ('version', version), ('status', status))
+    metrics.inc('skep_requests_total', labels)
+    metrics.observe('skep_request_duration_seconds', (('platform', platform),), total)
+    for phase, elapsed in phases.items():
+        metrics.observe('skep_request_phase_seconds', (('phase', phase),), elapsed)
+
+    if log:
+        request_logger.info(json.dumps({
+            'platform': platform,
+            'version': version,
+            'status': status,
+            'duration': total,
+            'phases': phases,
+            **fields,
+        }))
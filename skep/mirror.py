@@ -0,0 +1,226 @@
+"""Mirror the pinned python.org Windows embed packages.
+
+Every embed package that ``platforms`` can redirect to is downloaded,
+verified, and stored in the support bucket (or a local directory) under
+the key given by ``platforms.windows_mirror_key``. Packages that have
+already been mirrored are skipped. To serve Windows requests from the
+mirror, set ``WINDOWS_MIRROR = True`` in the instance config::
+
+    $ python -m skep.mirror --bucket briefcase-support
+"""
+import argparse
+import base64
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from skep import platforms
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+MIRRORED = 'mirrored'
+SKIPPED = 'skipped'
+MISSING = 'missing'
+FAILED = 'failed'
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def embed_packages(origin=platforms.WINDOWS_EMBED_ORIGIN):
+    """The (key, url) of every pinned embed package.
+
+    The packages are downloaded from ``origin``, which replaces the
+    python.org origin in their URLs.
+    """
+    return sorted(
+        (key, origin + url[len(platforms.WINDOWS_EMBED_ORIGIN):])
+        for url, key in platforms.WINDOWS_MIRROR_KEYS.items()
+    )
+
+
+def read_checksums(f):
+    "Read expected MD5 checksums, by filename, from ``md5sum``-style lines."
+    checksums = {}
+    for line in f:
+        if line.strip():
+            checksum, filename = line.split()
+            checksums[os.path.basename(filename.lstrip('*'))] = checksum.lower()
+    return checksums
+
+
+class DirectoryMirror:
+    "Store mirrored packages in a local directory, laid out by key."
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, *key.split('/'))
+
+    def exists(self, key, size):
+        try:
+            return os.path.getsize(self.path(key)) == size
+        except OSError:
+            return False
+
+    def put(self, key, f, md5):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f.close()
+        os.replace(f.name, path)
+
+
+class BucketMirror:
+    "Store mirrored packages in an S3 bucket."
+    def __init__(self, s3, bucket):
+        self.s3 = s3
+        self.bucket = bucket
+
+    def exists(self, key, size):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.s3.head_object(Bucket=self.bucket, Key=key)['ContentLength'] == size
+        except ClientError as e:
+            if e.response['Error']['Code'] in {'404', 'NoSuchKey'}:
+                return False
+            raise
+
+    def put(self, key, f, md5):
+        f.seek(0)
+        # S3 rejects the upload if the content doesn't match the checksum.
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=f,
+            ContentMD5=base64.b64encode(md5.digest()).decode('ascii'),
+            ContentType='application/zip',
+        )
+
+
+def upstream_size(url, timeout):
+    request = urllib.request.Request(url, method='HEAD')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return int(response.headers['Content-Length'])
+
+
+def mirror_package(destination, key, url, checksums=None, timeout=60):
+    """Mirror a single embed package.
+
+    Returns ``SKIPPED`` if the package has already been mirrored, ``MISSING``
+    if it doesn't exist upstream, and ``MIRRORED`` otherwise.
+    """
+    try:
+        size = upstream_size(url, timeout)
+    except urllib.error.HTTPError as e:
+        e.close()
+        if e.code == 404:
+            return MISSING
+        raise
+
+    if destination.exists(key, size):
+        return SKIPPED
+
+    md5 = hashlib.md5()
+    received = 0
+    with tempfile.NamedTemporaryFile(
+        dir=getattr(destination, 'directory', None),
+        prefix='.tmp-',
+        delete=False,
+    ) as f:
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    md5.update(chunk)
+                    received += len(chunk)
+
+            if received != size:
+                raise ChecksumMismatch(f"{url}: expected {size} bytes, received {received}")
+            expected = (checksums or {}).get(url.rsplit('/', 1)[1])
+            if expected is not None and expected != md5.hexdigest():
+                raise ChecksumMismatch(f"{url}: expected MD5 {expected}, received {md5.hexdigest()}")
+
+            f.flush()
+            destination.put(key, f, md5)
+        finally:
+            f.close()
+            if os.path.exists(f.name):
+                os.remove(f.name)
+
+    return MIRRORED
+
+
+def sync(destination, packages, checksums=None, jobs=4, timeout=60):
+    "Mirror ``packages`` in parallel, returning the result for each key."
+    def mirror(package):
+        key, url = package
+        try:
+            result = mirror_package(destination, key, url, checksums=checksums, timeout=timeout)
+        except Exception:
+            logger.exception("Unable to mirror %s", url)
+            result = FAILED
+        logger.info("%s: %s", key, result)
+        return key, result
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return dict(executor.map(mirror, packages))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m skep.mirror', description=__doc__.split('\n')[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--bucket', help="The S3 bucket to mirror into.")
+    target.add_argument('--directory', help="The local directory to mirror into.")
+    parser.add_argument('--region', default='us-west-2', help="The region of the S3 bucket.")
+    parser.add_argument(
+        '--origin',
+        default=platforms.WINDOWS_EMBED_ORIGIN,
+        help="The URL to download embed packages from.",
+    )
+    parser.add_argument(
+        '--checksums',
+        type=argparse.FileType('r'),
+        help="A file of expected MD5 checksums, in md5sum format.",
+    )
+    parser.add_argument('--jobs', type=int, default=4, help="The number of parallel downloads.")
+    parser.add_argument('--timeout', type=float, default=60, help="The timeout for each request, in seconds.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.bucket:
+        import boto3
+
+        destination = BucketMirror(boto3.client('s3', region_name=args.region), args.bucket)
+    else:
+        destination = DirectoryMirror(args.directory)
+
+    checksums = read_checksums(args.checksums) if args.checksums else None
+    results = sync(
+        destination,
+        embed_packages(args.origin),
+        checksums=checksums,
+        jobs=args.jobs,
+        timeout=args.timeout,
+    )
+
+    counts = {result: list(results.values()).count(result) for result in (MIRRORED, SKIPPED, MISSING, FAILED)}
+    print(', '.join(f'{count} {result}' for result, count in counts.items()))
+    return 1 if counts[FAILED] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
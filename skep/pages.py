@@ -0,0 +1,60 @@
+import gzip
+import hashlib
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+class PrecompressedPage:
+    """A static page, compressed once and served conditionally.
+
+    The page is stored uncompressed, gzipped and (if the ``brotli`` package
+    is installed) brotli-compressed. Each request is served the smallest
+    variant the client accepts, with a strong ETag for that variant, so a
+    client revalidating a page it already holds gets a 304.
+    """
+    def __init__(self, body, mimetype='text/html', max_age=3600):
+        self.mimetype = mimetype
+        self.max_age = max_age
+
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        # A fixed mtime keeps the gzip output (and so the ETag) stable.
+        self.variants = {
+            'identity': body,
+            'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+        }
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(body)
+
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        self.etags = {encoding: f'{digest}-{encoding}' for encoding in self.variants}
+
+        # Preferred encodings first, for clients that accept several equally.
+        self.encodings = [
+            encoding
+            for encoding in ('br', 'gzip', 'identity')
+            if encoding in self.variants
+        ]
+
+    def response(self, request):
+        encoding = request.accept_encodings.best_match(self.encodings, default='identity')
+        etag = self.etags[encoding]
+
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.content_encoding = encoding
+
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response
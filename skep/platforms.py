@@ -1,106 +1,210 @@
+# The support packages that were current as of the release of Briefcase
+# v0.3.10. Since then, this service has been "static"; the catalog is
+# compiled into lookup tables when this module is imported, so resolving
+# a request is a single dictionary lookup.
+#
+# Each entry is (platform, host_arch, key template, {version: default revision}).
+SUPPORT_CATALOG = [
+    (
+        'android',
+        None,
+        'python/{version}/android/Python-{version}-Android-support.b{revision}.zip',
+        {
+            '3.6': 3,
+            '3.7': 9,
+            '3.8': 5,
+            '3.9': 3,
+            '3.10': 2,
+        },
+    ),
+    (
+        'iOS',
+        None,
+        'python/{version}/iOS/Python-{version}-iOS-support.b{revision}.tar.gz',
+        {
+            '3.5': 12,
+            '3.6': 14,
+            '3.7': 9,
+            '3.8': 9,
+            '3.9': 7,
+            '3.10': 3,
+        },
+    ),
+    (
+        'macOS',
+        None,
+        'python/{version}/macOS/Python-{version}-macOS-support.b{revision}.tar.gz',
+        {
+            '3.5': 12,
+            '3.6': 14,
+            '3.7': 9,
+            '3.8': 9,
+            '3.9': 7,
+            '3.10': 3,
+        },
+    ),
+    (
+        'linux',
+        'x86_64',
+        'python/{version}/linux/x86_64/Python-{version}-linux-x86_64-support.b{revision}.tar.gz',
+        {
+            '3.5': 2,
+            '3.6': 4,
+            '3.7': 6,
+            '3.8': 6,
+            '3.9': 4,
+            '3.10': 3,
+        },
+    ),
+]
+
+# The URL for Windows embed packages is known; the micro versions are locked
+# to the most recent known versions as of the pre-release of Briefcase 0.3.10.
+WINDOWS_EMBED_ORIGIN = 'https://www.python.org/ftp/python/'
+WINDOWS_EMBED_URL = (
+    WINDOWS_EMBED_ORIGIN
+    + '{version}.{micro}/python-{version}.{revision}-embed-{host_arch}.zip'
+)
+WINDOWS_MICRO_VERSIONS = {
+    '3.5': 4,
+    '3.6': 8,
+    '3.7': 9,
+    '3.8': 10,
+    '3.9': 13,
+    '3.10': 7,
+}
+WINDOWS_HOST_ARCHES = ['amd64', 'win32', 'arm64']
+WINDOWS_DEFAULT_HOST_ARCH = 'amd64'
+
+
+def _split_template(template, **kwargs):
+    # Pre-format everything except the revision, leaving a (prefix, suffix)
+    # pair that only needs to be concatenated around a revision.
+    prefix, suffix = template.split('{revision}')
+    return prefix.format(**kwargs), suffix.format(**kwargs)
+
+
+def _compile_support_index(catalog):
+    # Maps (platform, version, host_arch, None) to the key of the default
+    # revision, and (platform, version, host_arch) to a (prefix, suffix) pair
+    # for explicitly requested revisions.
+    index = {}
+    templates = {}
+    for platform, host_arch, template, revisions in catalog:
+        for version, revision in revisions.items():
+            prefix, suffix = _split_template(template, version=version)
+            templates[platform, version, host_arch] = (prefix, suffix)
+            index[platform, version, host_arch, None] = f'{prefix}{revision}{suffix}'
+    return index, templates
+
+
+def _compile_windows_index(micro_versions, host_arches):
+    # Maps (version, host_arch) to the URL of the default revision.
+    index = {}
+    for version, micro in micro_versions.items():
+        for host_arch in host_arches:
+            index[version, host_arch] = WINDOWS_EMBED_URL.format(
+                version=version,
+                micro=micro,
+                revision=micro,
+                host_arch=host_arch,
+            )
+    return index
+
+
+def _compile_windows_mirror_keys(index):
+    # Maps the URL of each pinned embed package to its key in the support
+    # bucket, alongside the support packages for other platforms.
+    return {
+        url: f'python/{version}/windows/{url.rsplit("/", 1)[1]}'
+        for (version, host_arch), url in index.items()
+    }
+
+
+SUPPORT_INDEX, SUPPORT_TEMPLATES = _compile_support_index(SUPPORT_CATALOG)
+WINDOWS_INDEX = _compile_windows_index(WINDOWS_MICRO_VERSIONS, WINDOWS_HOST_ARCHES)
+WINDOWS_MIRROR_KEYS = _compile_windows_mirror_keys(WINDOWS_INDEX)
+
+
+def is_supported(platform, version, host_arch, revision):
+    """Could a request for a support package be resolved?
+
+    This is a check against the compiled tables that doesn't raise; any
+    request that passes can be resolved by ``windows_support_url`` or
+    ``support_key``.
+    """
+    if platform == 'windows':
+        # Any explicitly requested revision is passed through to python.org.
+        return bool(revision) or version in WINDOWS_MICRO_VERSIONS
+    return (platform, version, host_arch) in SUPPORT_TEMPLATES
 
 
 def windows_support_url(version, host_arch, revision):
     if host_arch is None:
-        host_arch = 'amd64'
-
-    # The URL for embed packages is known:
-    url = (
-        'https://www.python.org/ftp/python/{version}.{micro}'
-        '/python-{version}.{revision}-embed-{host_arch}.zip'
-    )
+        host_arch = WINDOWS_DEFAULT_HOST_ARCH
 
     if revision:
         # A specific revision has been requested.
         parts = revision.split('.')
-        best_url = url.format(
+        return WINDOWS_EMBED_URL.format(
             version=version, micro=parts[0], revision=revision, host_arch=host_arch
         )
-    else:
-        # Lock the most recent known versions as of the pre-release of Briefcase 0.3.10
-        try:
-            micro = {
-                '3.5': 4,
-                '3.6': 8,
-                '3.7': 9,
-                '3.8': 10,
-                '3.9': 13,
-                '3.10': 7,
-            }[version]
-
-            best_url = url.format(
-                version=version,
-                micro=micro,
-                revision=micro,
-                host_arch=host_arch,
-            )
-        except KeyError:
+
+    url = WINDOWS_INDEX.get((version, host_arch))
+    if url is None:
+        # An architecture we haven't precompiled.
+        micro = WINDOWS_MICRO_VERSIONS.get(version)
+        if micro is None:
             raise ValueError('Unsupported major.minor version')
 
-    return best_url
+        url = WINDOWS_EMBED_URL.format(
+            version=version,
+            micro=micro,
+            revision=micro,
+            host_arch=host_arch,
+        )
+
+    return url
 
 
-def support_url(s3, bucket, platform, version, host_arch, revision):
-    try:
-        if host_arch is None:
-            prefix = f'python/{version}/{platform}'
-
-            if platform == "android":
-                best_revision = {
-                    '3.6': 3,
-                    '3.7': 9,
-                    '3.8': 5,
-                    '3.9': 3,
-                    '3.10': 2,
-                }[version]
-                if revision is None:
-                    revision = best_revision
-
-                top_build = f"{prefix}/Python-{version}-Android-support.b{revision}.zip"
-            elif platform in {"iOS", "macOS"}:
-                best_revision = {
-                    '3.5': 12,
-                    '3.6': 14,
-                    '3.7': 9,
-                    '3.8': 9,
-                    '3.9': 7,
-                    '3.10': 3,
-                }[version]
-                if revision is None:
-                    revision = best_revision
-
-                top_build = f"{prefix}/Python-{version}-{platform}-support.b{revision}.tar.gz"
-            else:
-                top_build = None
-        elif platform == "linux" and host_arch == "x86_64":
-            prefix = f'python/{version}/{platform}/{host_arch}'
-
-            best_revision = {
-                '3.5': 2,
-                '3.6': 4,
-                '3.7': 6,
-                '3.8': 6,
-                '3.9': 4,
-                '3.10': 3,
-            }[version]
-            if revision is None:
-                revision = best_revision
-
-            top_build = f"{prefix}/Python-{version}-linux-{host_arch}-support.b{revision}.tar.gz"
-        else:
-            top_build = None
-    except KeyError:
-        top_build = None
+def windows_mirror_key(url):
+    "The key of a mirrored embed package, or None if ``url`` isn't mirrored."
+    return WINDOWS_MIRROR_KEYS.get(url)
+
+
+def support_key(platform, version, host_arch, revision):
+    if revision is None:
+        key = SUPPORT_INDEX.get((platform, version, host_arch, None))
+    else:
+        template = SUPPORT_TEMPLATES.get((platform, version, host_arch))
+        key = None if template is None else template[0] + str(revision) + template[1]
 
     # If we didn't find a file, raise 404.
-    if top_build is None:
+    if key is None:
         raise ValueError()
 
+    return key
+
+
+def presigned_url(s3, bucket, key):
     return s3.generate_presigned_url(
         'get_object',
         Params={
             'Bucket': bucket,
-            'Key': top_build
+            'Key': key,
         },
         ExpiresIn=60
     )
+
+
+def support_url(s3, bucket, platform, version, host_arch, revision):
+    return presigned_url(
+        s3,
+        bucket=bucket,
+        key=support_key(
+            platform=platform,
+            version=version,
+            host_arch=host_arch,
+            revision=revision,
+        ),
+    )
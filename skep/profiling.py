@@ -0,0 +1,81 @@
+import cProfile
+import hmac
+import logging
+import os
+import pstats
+import random
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Skep-Profile'
+
+
+class RequestProfiler:
+    """Profile a sample of requests, aggregating the results per endpoint.
+
+    A request is profiled if it carries ``token`` in the profiling header,
+    or at random with probability ``rate``. Only one request is profiled at
+    a time; a request that is sampled while another is being profiled runs
+    normally. After each profiled request, the aggregated statistics for the
+    endpoint are written to ``<directory>/<endpoint>.pstats``.
+    """
+    def __init__(self, directory, rate=0.0, token=None, random=random.random):
+        self.directory = directory
+        self.rate = rate
+        self.token = token
+        self.random = random
+
+        self.samples = {}
+
+        self._stats = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def sampled(self, header=None):
+        if self.token and header and hmac.compare_digest(header, self.token):
+            return True
+        return self.random() < self.rate
+
+    def filename(self, endpoint):
+        return os.path.join(self.directory, f'{endpoint}.pstats')
+
+    def run(self, endpoint, func, *args, **kwargs):
+        if not self._lock.acquire(blocking=False):
+            # Another request is being profiled.
+            return func(*args, **kwargs)
+
+        try:
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(func, *args, **kwargs)
+            finally:
+                self._record(endpoint, profile)
+        finally:
+            self._lock.release()
+
+    def _record(self, endpoint, profile):
+        # Must be called with the lock held.
+        try:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+            self.samples[endpoint] = self.samples.get(endpoint, 0) + 1
+
+            # Write to a temporary file and rename it into place, so readers
+            # never see a partial file.
+            fd, path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+            os.close(fd)
+            try:
+                stats.dump_stats(path)
+                os.replace(path, self.filename(endpoint))
+            except BaseException:
+                os.remove(path)
+                raise
+        except Exception:
+            # Profiling must never break the request.
+            logger.exception("Unable to record profile for %s", endpoint)
@@ -0,0 +1,302 @@
+import os
+import posixpath
+import uuid
+import zlib
+
+from flask import Response
+from werkzeug.http import http_date, unquote_etag
+from werkzeug.utils import send_file
+
+# Content types for support packages, if the object store doesn't provide one.
+CONTENT_TYPES = {
+    '.zip': 'application/zip',
+    '.gz': 'application/gzip',
+}
+
+# Each part of a multi-range response is a separate request to S3, so
+# requests for more ranges than this are sent the whole object.
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    def __init__(self, length=None):
+        super().__init__(length)
+        self.length = length
+
+
+def get_object(s3, bucket, key, **kwargs):
+    """Retrieve an object from S3.
+
+    Raises ``ValueError`` if the object doesn't exist, ``RangeNotSatisfiable``
+    if a requested range lies outside the object, and ``RuntimeError`` if
+    it couldn't be retrieved.
+    """
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    try:
+        return s3.get_object(Bucket=bucket, Key=key, **kwargs)
+    except ClientError as e:
+        error = e.response.get('Error', {})
+        if error.get('Code') in {'NoSuchKey', '404'}:
+            raise ValueError(f'{key} does not exist')
+        if error.get('Code') == 'InvalidRange':
+            length = error.get('ActualObjectSize')
+            raise RangeNotSatisfiable(None if length is None else int(length))
+        raise RuntimeError(f'Unable to retrieve {key}') from e
+    except BotoCoreError as e:
+        raise RuntimeError(f'Unable to retrieve {key}') from e
+
+
+def head_object(s3, bucket, key):
+    "Retrieve the metadata of an object in S3."
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    try:
+        return s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in {'NoSuchKey', '404'}:
+            raise ValueError(f'{key} does not exist')
+        raise RuntimeError(f'Unable to retrieve {key}') from e
+    except BotoCoreError as e:
+        raise RuntimeError(f'Unable to retrieve {key}') from e
+
+
+def iter_body(body, chunk_size):
+    # Read the body one chunk at a time, so memory use is bounded by the
+    # chunk size, not the size of the object.
+    try:
+        while True:
+            chunk = body.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        body.close()
+
+
+class ObjectBody:
+    """The body of a streamed response, read from S3 one chunk at a time.
+
+    Unlike a generator, closing it always closes the S3 body, even if it
+    was never iterated (for example, in reply to a HEAD request).
+    """
+    def __init__(self, body, chunk_size):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        return iter_body(self.body, self.chunk_size)
+
+    def close(self):
+        self.body.close()
+
+
+def content_type(key, obj):
+    try:
+        return obj['ContentType']
+    except KeyError:
+        return CONTENT_TYPES.get(posixpath.splitext(key)[1], 'application/octet-stream')
+
+
+def s3_range(start, stop):
+    "Convert a (start, stop) range from werkzeug into an HTTP Range header."
+    if start < 0:
+        return f'bytes={start}'
+    elif stop is None:
+        return f'bytes={start}-'
+    return f'bytes={start}-{stop - 1}'
+
+
+def resolve_range(start, stop, length):
+    "Convert a (start, stop) range into absolute offsets, or None if unsatisfiable."
+    if start < 0:
+        return max(length + start, 0), length
+    elif start >= length:
+        return None
+    return start, length if stop is None else min(stop, length)
+
+
+def content_range(start, stop, length):
+    return f'bytes {start}-{stop - 1}/{length}'
+
+
+def validator_matches(if_range, obj):
+    "Does the If-Range validator match the current version of the object?"
+    if if_range.etag is not None:
+        etag, weak = unquote_etag(obj.get('ETag'))
+        # If-Range requires a strong comparison.
+        return not weak and etag == if_range.etag
+    elif if_range.date is not None and 'LastModified' in obj:
+        return obj['LastModified'].replace(microsecond=0) == if_range.date
+    return False
+
+
+def object_headers(key, obj):
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'Content-Disposition': f'attachment; filename="{posixpath.basename(key)}"',
+    }
+    if 'ETag' in obj:
+        headers['ETag'] = obj['ETag']
+    if 'LastModified' in obj:
+        headers['Last-Modified'] = http_date(obj['LastModified'])
+    return headers
+
+
+def range_not_satisfiable(length):
+    headers = {}
+    if length is not None:
+        headers['Content-Range'] = f'bytes */{length}'
+    return Response(status=416, headers=headers)
+
+
+def head_response(s3, bucket, key):
+    # The headers of a full response, without reading the object.
+    meta = head_object(s3, bucket, key)
+    headers = object_headers(key, meta)
+    headers['Content-Length'] = str(meta['ContentLength'])
+    return Response(status=200, content_type=content_type(key, meta), headers=headers)
+
+
+def full_response(s3, bucket, key, chunk_size, obj=None):
+    if obj is None:
+        obj = get_object(s3, bucket, key)
+
+    headers = object_headers(key, obj)
+    headers['Content-Length'] = str(obj['ContentLength'])
+    return Response(
+        ObjectBody(obj['Body'], chunk_size),
+        status=200,
+        content_type=content_type(key, obj),
+        headers=headers,
+        direct_passthrough=True,
+    )
+
+
+def single_range_response(s3, bucket, key, chunk_size, byte_range, if_range):
+    # Forward the range to S3, so only the requested bytes are read.
+    try:
+        obj = get_object(s3, bucket, key, Range=s3_range(*byte_range))
+    except RangeNotSatisfiable as e:
+        # If the client's copy is stale, the range is ignored.
+        if if_range is not None and not validator_matches(if_range, head_object(s3, bucket, key)):
+            return full_response(s3, bucket, key, chunk_size)
+        return range_not_satisfiable(e.length)
+
+    if if_range is not None and not validator_matches(if_range, obj):
+        # The client's copy is stale; send the whole object.
+        obj['Body'].close()
+        return full_response(s3, bucket, key, chunk_size)
+
+    headers = object_headers(key, obj)
+    headers['Content-Length'] = str(obj['ContentLength'])
+    headers['Content-Range'] = obj['ContentRange']
+    return Response(
+        ObjectBody(obj['Body'], chunk_size),
+        status=206,
+        content_type=content_type(key, obj),
+        headers=headers,
+        direct_passthrough=True,
+    )
+
+
+def multi_range_response(s3, bucket, key, chunk_size, byte_ranges, if_range):
+    # S3 only serves a single range per request, so read the object's
+    # metadata, then retrieve each part as it is sent.
+    meta = head_object(s3, bucket, key)
+    if if_range is not None and not validator_matches(if_range, meta):
+        return full_response(s3, bucket, key, chunk_size)
+
+    length = meta['ContentLength']
+    parts = [
+        part
+        for part in (resolve_range(start, stop, length) for start, stop in byte_ranges)
+        if part is not None
+    ]
+    if not parts:
+        return range_not_satisfiable(length)
+
+    part_type = content_type(key, meta)
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (
+            f'--{boundary}\r\n'
+            f'Content-Type: {part_type}\r\n'
+            f'Content-Range: {content_range(start, stop, length)}\r\n'
+            '\r\n'
+        ).encode('ascii')
+        for start, stop in parts
+    ]
+    trailer = f'--{boundary}--\r\n'.encode('ascii')
+
+    def body():
+        for (start, stop), header in zip(parts, part_headers):
+            yield header
+            obj = get_object(s3, bucket, key, Range=s3_range(start, stop))
+            yield from iter_body(obj['Body'], chunk_size)
+            yield b'\r\n'
+        yield trailer
+
+    headers = object_headers(key, meta)
+    headers['Content-Length'] = str(
+        sum(len(header) + (stop - start) + 2 for (start, stop), header in zip(parts, part_headers))
+        + len(trailer)
+    )
+    return Response(
+        body(),
+        status=206,
+        content_type=f'multipart/byteranges; boundary={boundary}',
+        headers=headers,
+        direct_passthrough=True,
+    )
+
+
+def object_response(s3, bucket, key, chunk_size, range=None, if_range=None, method='GET'):
+    """Stream an S3 object through the app.
+
+    If a byte ``range`` is requested (and the ``if_range`` validator, if
+    any, matches), only the requested bytes are retrieved and sent. A HEAD
+    request only retrieves the object's metadata.
+    """
+    if method == 'HEAD':
+        return head_response(s3, bucket, key)
+    if range is None or range.units != 'bytes' or len(range.ranges) > MAX_RANGES:
+        return full_response(s3, bucket, key, chunk_size)
+
+    if_range = if_range if if_range and (if_range.etag or if_range.date) else None
+    if len(range.ranges) == 1:
+        return single_range_response(s3, bucket, key, chunk_size, range.ranges[0], if_range)
+    return multi_range_response(s3, bucket, key, chunk_size, range.ranges, if_range)
+
+
+def cached_object_response(cache, s3, bucket, key, chunk_size, environ):
+    """Serve an S3 object from the on-disk cache, filling the cache on a miss.
+
+    The file is handed to the WSGI server's file wrapper, so servers that
+    support it can use ``sendfile``; Range and conditional requests are
+    handled by werkzeug.
+    """
+    def fill(f):
+        obj = get_object(s3, bucket, key)
+        for chunk in iter_body(obj['Body'], chunk_size):
+            f.write(chunk)
+
+    f = cache.open(key, fill)
+    try:
+        stat = os.fstat(f.fileno())
+        response = send_file(
+            f,
+            environ,
+            mimetype=content_type(key, {}),
+            as_attachment=True,
+            download_name=posixpath.basename(key),
+            conditional=False,
+            etag=f'{stat.st_mtime}-{stat.st_size}-{zlib.adler32(f.name.encode("utf-8")) & 0xffffffff}',
+            last_modified=stat.st_mtime,
+        )
+        # werkzeug doesn't know the size of an open file.
+        response.content_length = stat.st_size
+        return response.make_conditional(environ, accept_ranges=True, complete_length=stat.st_size)
+    except BaseException:
+        f.close()
+        raise
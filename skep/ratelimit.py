@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryStore:
+    """Token buckets held in memory, by a single process.
+
+    When the app runs in more than one process, a shared store (for
+    example, in Redis) can be used instead; it only needs to provide
+    ``take()``. When the store is full, the least recently used bucket is
+    dropped.
+    """
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key, rate, burst, now, cost=1):
+        """Take ``cost`` tokens from the bucket for ``key``.
+
+        Buckets hold up to ``burst`` tokens, and are refilled at ``rate``
+        tokens per second. Returns 0 if the tokens were taken; otherwise,
+        the number of seconds until they will be available.
+        """
+        with self._lock:
+            try:
+                tokens, updated = self._buckets[key]
+                tokens = min(burst, tokens + (now - updated) * rate)
+                self._buckets.move_to_end(key)
+            except KeyError:
+                tokens = burst
+                while len(self._buckets) >= self.maxsize:
+                    self._buckets.popitem(last=False)
+
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) / rate
+
+
+class RateLimiter:
+    """Limit the rate of requests from each client, with a token bucket.
+
+    Each client can make up to ``burst`` requests at once, and ``rate``
+    requests per second after that. A request can cost more than one
+    token, but never more than ``burst``.
+    """
+    def __init__(self, rate, burst, store=None, clock=time.time):
+        self.rate = rate
+        self.burst = burst
+        self.store = MemoryStore() if store is None else store
+        self.clock = clock
+
+        self.limited = 0
+
+    def acquire(self, client, cost=1):
+        "Returns 0 if ``client`` can make a request; otherwise, how long it should wait."
+        wait = self.store.take(client, self.rate, self.burst, self.clock(), cost=cost)
+        if wait:
+            self.limited += 1
+        return wait
+
+
+class ConcurrencyLimit:
+    "A limit on the number of requests that are being served at once."
+    def __init__(self, limit):
+        self.limit = limit
+
+        self.active = 0
+        self.shed = 0
+
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        "Returns True if the request can be served; it must then be released."
+        with self._lock:
+            if self.active >= self.limit:
+                self.shed += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from skep.s3 import PresignerWrapper
+
+logger = logging.getLogger(__name__)
+
+# Error codes returned by HeadObject for a key that doesn't exist. Without
+# s3:ListBucket, S3 reports a missing key as forbidden.
+MISSING_CODES = {'403', '404', 'NoSuchKey'}
+
+
+class ReplicaSet:
+    """Replicas of the support bucket in other regions.
+
+    ``buckets`` maps each replica region to its bucket. A request is served
+    from the region named by its ``region`` query argument; otherwise, from
+    the region that ``countries`` maps the country in the ``header`` request
+    header to. Requests that don't select a replica are served from the
+    primary bucket.
+
+    Replication isn't instantaneous, so a key is only signed against a
+    replica once a HEAD request has found it there. The result is
+    remembered for ``ttl`` seconds; at most ``maxsize`` results are
+    remembered, and the least recently used is dropped first.
+    """
+    def __init__(self, clients, buckets, countries=None, header=None, ttl=300, maxsize=1024, clock=time.time):
+        self.clients = clients
+        self.buckets = buckets
+        self.countries = countries or {}
+        self.header = header
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+
+        self.served = 0
+        self.fallbacks = 0
+
+        self._found = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return {
+            'served': self.served,
+            'fallbacks': self.fallbacks,
+        }
+
+    def region(self, req):
+        "The replica region that should serve ``req``, or None for the primary bucket."
+        region = req.args.get('region')
+        if region is None and self.header is not None:
+            country = req.headers.get(self.header)
+            if country is not None:
+                region = self.countries.get(country.upper())
+        return region if region in self.buckets else None
+
+    def exists(self, region, key):
+        "Determine if the replica in ``region`` holds ``key``."
+        now = self.clock()
+        with self._lock:
+            try:
+                found, checked_at = self._found[region, key]
+                if now - checked_at < self.ttl:
+                    self._found.move_to_end((region, key))
+                    return found
+                del self._found[region, key]
+            except KeyError:
+                pass
+
+        from botocore.exceptions import ClientError
+
+        try:
+            self.clients.client(region).head_object(Bucket=self.buckets[region], Key=key)
+            found = True
+        except ClientError as e:
+            if e.response['Error']['Code'] not in MISSING_CODES:
+                logger.exception("Unable to find %s in %s", key, region)
+                return False
+            found = False
+        except Exception:
+            # An unreachable replica isn't remembered as missing the key.
+            logger.exception("Unable to find %s in %s", key, region)
+            return False
+
+        with self._lock:
+            self._found[region, key] = (found, now)
+            self._found.move_to_end((region, key))
+            while len(self._found) > self.maxsize:
+                self._found.popitem(last=False)
+        return found
+
+    def bind(self, region, client, primary):
+        return ReplicaPresigner(client, primary, self, region)
+
+
+class ReplicaPresigner(PresignerWrapper):
+    """Sign URLs for the replica bucket in ``region``.
+
+    Keys that the replica doesn't hold are signed by ``primary``, for the
+    primary bucket.
+    """
+    def __init__(self, client, primary, replicas, region):
+        super().__init__(client)
+        self.primary = primary
+        self.replicas = replicas
+        self.region = region
+
+    def sign(self, method, params, expires_in):
+        if not self.replicas.exists(self.region, params['Key']):
+            self.replicas.fallbacks += 1
+            return self.primary.generate_presigned_url(method, Params=params, ExpiresIn=expires_in)
+
+        self.replicas.served += 1
+        return super().sign(method, dict(params, Bucket=self.replicas.buckets[self.region]), expires_in)
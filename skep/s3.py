@@ -0,0 +1,70 @@
+import threading
+
+
+class S3ClientPool:
+    """A thread-safe registry of S3 clients, keyed by region.
+
+    Constructing a boto3 client is expensive - it parses the service model,
+    resolves credentials and builds the endpoint - so each client is built
+    once, on first use, and then shared by every request.
+
+    boto3 is only imported when the first client is built, so requests
+    that never touch S3 don't pay for importing the AWS SDK.
+    """
+    def __init__(self, max_pool_connections=10, tcp_keepalive=True):
+        self.max_pool_connections = max_pool_connections
+        self.tcp_keepalive = tcp_keepalive
+
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, region):
+        try:
+            return self._clients[region]
+        except KeyError:
+            pass
+
+        with self._lock:
+            # Another thread may have built the client while we were
+            # waiting for the lock.
+            try:
+                return self._clients[region]
+            except KeyError:
+                import boto3
+                from botocore.config import Config
+
+                client = boto3.client(
+                    's3',
+                    region_name=region,
+                    config=Config(
+                        max_pool_connections=self.max_pool_connections,
+                        tcp_keepalive=self.tcp_keepalive,
+                    ),
+                )
+                self._clients[region] = client
+                return client
+
+    def close(self):
+        """Close the connections held by every client.
+
+        The clients remain usable, and open new connections as needed.
+        """
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+
+
+class PresignerWrapper:
+    """Wrap an S3 client, or another wrapper, to change how URLs are presigned.
+
+    Subclasses override ``sign()``, and call ``super().sign()`` to sign
+    with the wrapped client.
+    """
+    def __init__(self, client):
+        self.client = client
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600):
+        return self.sign(ClientMethod, Params, ExpiresIn)
+
+    def sign(self, method, params, expires_in):
+        return self.client.generate_presigned_url(method, Params=params, ExpiresIn=expires_in)
@@ -0,0 +1,272 @@
+"""Serve the app from a pool of pre-forked worker processes.
+
+The app - with its lookup tables, S3 clients and manifest - is built once,
+in the master process, and shared copy-on-write by every worker::
+
+    $ python -m skep.serve --port 8000 --workers 4
+
+SIGHUP reloads the app: the master builds it again (re-reading the
+instance config and the manifest), starts a new set of workers, and then
+stops the old ones. SIGTERM and SIGINT stop every worker. Workers that
+are stopped finish their in-flight requests before exiting.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from skep.skep import create_app
+
+logger = logging.getLogger(__name__)
+
+# Signals are handled synchronously by the master, with sigtimedwait().
+SIGNALS = {signal.SIGCHLD, signal.SIGHUP, signal.SIGINT, signal.SIGTERM}
+STOP_SIGNALS = {signal.SIGINT, signal.SIGTERM}
+
+
+class RequestHandler(WSGIRequestHandler):
+    # A single-threaded worker can't hold a connection open between
+    # requests.
+    protocol_version = 'HTTP/1.0'
+
+    def log_request(self, code='-', size='-'):
+        if self.server.access_log:
+            super().log_request(code, size)
+
+
+class ThreadedRequestHandler(RequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+
+class WorkerServer(BaseWSGIServer):
+    multiprocess = True
+    access_log = False
+
+
+class ThreadedWorkerServer(socketserver.ThreadingMixIn, WorkerServer):
+    multithread = True
+    # In-flight requests are finished when the server is closed.
+    daemon_threads = False
+
+
+def load_app(app_factory=create_app):
+    "Build the app, and everything a worker will need, before forking."
+    app = app_factory()
+
+    # Build the S3 clients, importing boto3 in the process. Connections
+    # can't be shared between processes, so any that were opened while
+    # building the app are closed; the workers open their own.
+    s3_clients = app.extensions['s3']
+    for region in [app.config['S3_REGION'], *app.config['S3_REPLICAS']]:
+        s3_clients.client(region)
+    s3_clients.close()
+
+    # Threads don't survive a fork, so the inventory is refreshed by each
+    # worker instead.
+    inventory = app.extensions['s3_inventory']
+    if inventory is not None:
+        inventory.stop()
+
+    # Import whatever the first request needs.
+    app.test_client().get('/')
+    return app
+
+
+def serve(app, sock, threaded=False, access_log=False):
+    "Serve requests on ``sock`` until SIGTERM or SIGINT is received."
+    inventory = app.extensions['s3_inventory']
+    if inventory is not None and app.config['S3_INVENTORY_REFRESH_INTERVAL']:
+        inventory.start(app.config['S3_INVENTORY_REFRESH_INTERVAL'])
+
+    host, port = sock.getsockname()[:2]
+    server = (ThreadedWorkerServer if threaded else WorkerServer)(
+        host,
+        port,
+        app,
+        handler=ThreadedRequestHandler if threaded else RequestHandler,
+        fd=sock.fileno(),
+    )
+    server.access_log = access_log
+    thread = threading.Thread(target=server.serve_forever, args=(0.1,), name='skep-serve')
+    thread.start()
+
+    # Signals are blocked (as they were in the master), and are handled here.
+    signal.sigwait(STOP_SIGNALS)
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+    if inventory is not None:
+        inventory.stop()
+
+
+class Master:
+    """Manage a pool of worker processes, serving ``sock``.
+
+    ``app_factory`` is called to build the app when the master starts, and
+    again on every reload.
+    """
+    def __init__(self, sock, app_factory=create_app, workers=2, threaded=False, access_log=False, timeout=30):
+        self.sock = sock
+        self.app_factory = app_factory
+        self.num_workers = workers
+        self.threaded = threaded
+        self.access_log = access_log
+        self.timeout = timeout
+
+        self.app = None
+        self.generation = 0
+        self.stopping = False
+        # The generation of each worker, by process ID.
+        self.workers = {}
+        # When each worker that has been asked to stop must be killed.
+        self.deadlines = {}
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                serve(self.app, self.sock, threaded=self.threaded, access_log=self.access_log)
+            except BaseException:
+                logger.exception("Worker %d failed", os.getpid())
+                status = 1
+            finally:
+                logging.shutdown()
+                os._exit(status)
+
+        self.workers[pid] = self.generation
+        logger.info("Started worker %d", pid)
+
+    def load(self):
+        # The previous app (if any) can be collected once it is replaced.
+        gc.unfreeze()
+        self.app = load_app(self.app_factory)
+        self.generation += 1
+        # The garbage collector ignores objects that exist before the fork,
+        # so it doesn't touch (and copy) the pages they live in.
+        gc.freeze()
+
+    def retire(self, pids):
+        for pid in pids:
+            if pid not in self.deadlines:
+                self.deadlines[pid] = time.monotonic() + self.timeout
+                os.kill(pid, signal.SIGTERM)
+
+    def reload(self):
+        logger.info("Reloading")
+        try:
+            self.load()
+        except Exception:
+            logger.exception("Unable to reload; the current workers will keep running")
+            return
+
+        old = list(self.workers)
+        for i in range(self.num_workers):
+            self.spawn()
+        self.retire(old)
+
+    def stop(self):
+        logger.info("Stopping")
+        self.stopping = True
+        self.retire(list(self.workers))
+
+    def reap(self):
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+
+            generation = self.workers.pop(pid, None)
+            retired = self.deadlines.pop(pid, None) is not None
+            logger.info("Worker %d exited with status %d", pid, os.waitstatus_to_exitcode(status))
+            # A worker that exits unexpectedly is replaced.
+            if generation == self.generation and not retired and not self.stopping:
+                self.spawn()
+
+    def kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in self.deadlines.items():
+            if deadline <= now and pid in self.workers:
+                logger.warning("Worker %d didn't stop in time; killing it", pid)
+                os.kill(pid, signal.SIGKILL)
+
+    def run(self):
+        signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+        self.load()
+        for i in range(self.num_workers):
+            self.spawn()
+
+        while self.workers:
+            # Wake up periodically to kill workers that are slow to stop.
+            sig = signal.sigtimedwait(SIGNALS, 1)
+            signum = None if sig is None else sig.si_signo
+            if signum == signal.SIGCHLD:
+                self.reap()
+            elif signum == signal.SIGHUP:
+                if not self.stopping:
+                    self.reload()
+            elif signum in STOP_SIGNALS:
+                self.stop()
+            self.kill_overdue()
+
+
+def listen(host, port, backlog=2048):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.create_server((host, port), family=family, backlog=backlog)
+    # Every worker waits for connections on the same socket; the workers
+    # that don't win a connection mustn't block in accept().
+    sock.setblocking(False)
+    return sock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m skep.serve', description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1', help="The address to listen on.")
+    parser.add_argument('--port', type=int, default=8000, help="The port to listen on.")
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help="The number of worker processes.",
+    )
+    parser.add_argument(
+        '--threaded',
+        action='store_true',
+        help="Handle each request in a worker on its own thread.",
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=30,
+        help="How long a worker may take to finish its requests when stopped, in seconds.",
+    )
+    parser.add_argument('--access-log', action='store_true', help="Log every request.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='[%(process)d] %(message)s')
+
+    sock = listen(args.host, args.port)
+    host, port = sock.getsockname()[:2]
+    logger.info("Listening on http://%s:%d", f'[{host}]' if ':' in host else host, port)
+
+    Master(
+        sock,
+        workers=args.workers,
+        threaded=args.threaded,
+        access_log=args.access_log,
+        timeout=args.timeout,
+    ).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
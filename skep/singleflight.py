@@ -0,0 +1,67 @@
+import functools
+import threading
+
+from skep.s3 import PresignerWrapper
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into a single call.
+
+    While a call for a key is in flight, any other caller for that key waits
+    for it to finish, and shares its result (or exception). Results aren't
+    kept once the call has finished.
+    """
+    def __init__(self):
+        self.coalesced = 0
+
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def bind(self, client):
+        return CoalescingPresigner(client, self)
+
+
+class CoalescingPresigner(PresignerWrapper):
+    "Share one signature between concurrent requests to sign the same URL."
+    def __init__(self, client, flight):
+        super().__init__(client)
+        self.flight = flight
+
+    def sign(self, method, params, expires_in):
+        return self.flight.do(
+            (method, params['Bucket'], params['Key'], expires_in),
+            functools.partial(super().sign, method, params, expires_in),
+        )
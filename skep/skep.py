@@ -1,37 +1,22 @@
+import functools
 import os
 
-import boto3
-from flask import Flask, abort, redirect, request
+from flask import Flask, Response, abort, g, jsonify, request
 
-from skep import platforms
+from skep.cache import NegativeCache, PresignedURLCache
+from skep.diskcache import SupportPackageCache
+from skep.fastpath import FastPath
+from skep.inventory import S3Inventory
+from skep.metrics import NULL_TIMER, Metrics, RequestTimer, stats_collector
+from skep.pages import PrecompressedPage
+from skep.profiling import PROFILE_HEADER, RequestProfiler
+from skep.ratelimit import ConcurrencyLimit, RateLimiter
+from skep.replicas import ReplicaSet
+from skep.s3 import S3ClientPool
+from skep.singleflight import SingleFlight
+from skep.support import SupportPackages
 
-
-def create_app(test_config=None):
-    app = Flask(__name__, instance_relative_config=True)
-    app.config.from_mapping(
-        SECRET_KEY='dev',
-        S3_BUCKET='briefcase-support',
-        S3_REGION='us-west-2',
-        STREAMING_CHUNK_SIZE=1024,
-    )
-
-    if test_config is None:
-        # load the instance config, if it exists, when not testing
-        app.config.from_pyfile('config.py', silent=True)
-    else:
-        # load the test config if passed in
-        app.config.from_mapping(test_config)
-
-    # Ensure the instance folder exists
-    try:
-        os.makedirs(app.instance_path)
-    except OSError:
-        pass
-
-    # Views
-    @app.route('/')
-    def hello():
-        return """
+LANDING_PAGE = """
 <html>
 <head>
     <link rel="stylesheet" type="text/css" href="//fonts.googleapis.com/css?family=Cutive">
@@ -66,40 +51,305 @@ def create_app(test_config=None):
 </body>
 """
 
+
+def create_app(test_config=None):
+    app = Flask(__name__, instance_relative_config=True)
+    app.config.from_mapping(
+        SECRET_KEY='dev',
+        S3_BUCKET='briefcase-support',
+        S3_REGION='us-west-2',
+        S3_MAX_POOL_CONNECTIONS=10,
+        S3_TCP_KEEPALIVE=True,
+        S3_PREWARM=False,
+        S3_SIGNER='boto3',
+        S3_INVENTORY=False,
+        S3_INVENTORY_REFRESH_INTERVAL=300,
+        S3_REPLICAS={},
+        S3_REPLICA_COUNTRIES={},
+        S3_REPLICA_HEADER='CloudFront-Viewer-Country',
+        S3_REPLICA_CHECK_TTL=300,
+        S3_REPLICA_CHECK_SIZE=1024,
+        PRESIGN_TIME_BUCKET=0,
+        PRESIGNED_URL_CACHE_SIZE=256,
+        PRESIGNED_URL_CACHE_MARGIN=20,
+        NEGATIVE_CACHE_SIZE=1024,
+        NEGATIVE_CACHE_TTL=60,
+        COALESCE_SIGNING=True,
+        BATCH_MAX_SIZE=100,
+        RATE_LIMIT_PER_MINUTE=0,
+        RATE_LIMIT_BURST=20,
+        RATE_LIMIT_HEADER=None,
+        RATE_LIMIT_STORE=None,
+        MAX_CONCURRENT_REQUESTS=0,
+        OVERLOAD_RETRY_AFTER=1,
+        STREAMING=False,
+        STREAMING_CHUNK_SIZE=1024 * 1024,
+        WINDOWS_REDIRECT_MAX_AGE=30 * 24 * 60 * 60,
+        WINDOWS_MIRROR=False,
+        REDIRECT_EXPIRY_MARGIN=5,
+        DISK_CACHE_DIR=None,
+        DISK_CACHE_MAX_BYTES=0,
+        METRICS=True,
+        METRICS_LOG=False,
+        PROFILE_RATE=0.0,
+        PROFILE_TOKEN=None,
+        PROFILE_DIR=None,
+        LANDING_PAGE_MAX_AGE=60 * 60,
+        MANIFEST_PATH=None,
+        MANIFEST_MAX_AGE=5 * 60,
+        WSGI_FAST_PATH=False,
+        ASGI_MAX_WORKERS=16,
+    )
+
+    if test_config is None:
+        # load the instance config, if it exists, when not testing
+        app.config.from_pyfile('config.py', silent=True)
+    else:
+        # load the test config if passed in
+        app.config.from_mapping(test_config)
+
+    # Ensure the instance folder exists
+    try:
+        os.makedirs(app.instance_path)
+    except OSError:
+        pass
+
+    # S3 clients are shared by all requests.
+    s3_clients = S3ClientPool(
+        max_pool_connections=app.config['S3_MAX_POOL_CONNECTIONS'],
+        tcp_keepalive=app.config['S3_TCP_KEEPALIVE'],
+    )
+    app.extensions['s3'] = s3_clients
+    if app.config['S3_PREWARM']:
+        s3_clients.client(app.config['S3_REGION'])
+
+    # Presigned URLs are reused while they have enough validity left.
+    if app.config['PRESIGNED_URL_CACHE_SIZE']:
+        url_cache = PresignedURLCache(
+            maxsize=app.config['PRESIGNED_URL_CACHE_SIZE'],
+            margin=app.config['PRESIGNED_URL_CACHE_MARGIN'],
+            time_bucket=app.config['PRESIGN_TIME_BUCKET'],
+        )
+    else:
+        url_cache = None
+    app.extensions['presigned_url_cache'] = url_cache
+
+    # Keys can be checked against an index of the bucket before signing.
+    if app.config['S3_INVENTORY']:
+        inventory = S3Inventory(
+            s3_clients.client(app.config['S3_REGION']),
+            bucket=app.config['S3_BUCKET'],
+        )
+        inventory.safe_refresh()
+        if app.config['S3_INVENTORY_REFRESH_INTERVAL']:
+            inventory.start(app.config['S3_INVENTORY_REFRESH_INTERVAL'])
+    else:
+        inventory = None
+    app.extensions['s3_inventory'] = inventory
+
+    # Support packages can be served from replicas of the bucket in other
+    # regions, closer to the user.
+    if app.config['S3_REPLICAS']:
+        unknown = set(app.config['S3_REPLICA_COUNTRIES'].values()) - set(app.config['S3_REPLICAS'])
+        if unknown:
+            raise ValueError(f"S3_REPLICA_COUNTRIES refers to unknown replica regions {sorted(unknown)}")
+        replicas = ReplicaSet(
+            s3_clients,
+            buckets=app.config['S3_REPLICAS'],
+            countries={country.upper(): region for country, region in app.config['S3_REPLICA_COUNTRIES'].items()},
+            header=app.config['S3_REPLICA_HEADER'],
+            ttl=app.config['S3_REPLICA_CHECK_TTL'],
+            maxsize=app.config['S3_REPLICA_CHECK_SIZE'],
+        )
+    else:
+        replicas = None
+    app.extensions['s3_replicas'] = replicas
+
+    # The landing page is compressed once, rather than on every request.
+    landing_page = PrecompressedPage(LANDING_PAGE, max_age=app.config['LANDING_PAGE_MAX_AGE'])
+
+    # The manifest of support package checksums is built offline (by
+    # ``python -m skep.manifest``), and loaded once.
+    try:
+        with open(app.config['MANIFEST_PATH'] or os.path.join(app.instance_path, 'manifest.json'), 'rb') as f:
+            manifest = PrecompressedPage(f.read(), mimetype='application/json', max_age=app.config['MANIFEST_MAX_AGE'])
+    except FileNotFoundError:
+        manifest = None
+
+    # Streamed support packages can be cached on disk.
+    if app.config['DISK_CACHE_MAX_BYTES']:
+        disk_cache = SupportPackageCache(
+            directory=app.config['DISK_CACHE_DIR'] or os.path.join(app.instance_path, 'packages'),
+            max_bytes=app.config['DISK_CACHE_MAX_BYTES'],
+        )
+    else:
+        disk_cache = None
+    app.extensions['disk_cache'] = disk_cache
+
+    # Concurrent requests to sign the same URL share a single signature.
+    if app.config['COALESCE_SIGNING']:
+        signing_flight = SingleFlight()
+    else:
+        signing_flight = None
+    app.extensions['signing_flight'] = signing_flight
+
+    # Requests that are known to fail are rejected without being resolved.
+    if app.config['NEGATIVE_CACHE_SIZE']:
+        negative_cache = NegativeCache(
+            maxsize=app.config['NEGATIVE_CACHE_SIZE'],
+            ttl=app.config['NEGATIVE_CACHE_TTL'],
+        )
+    else:
+        negative_cache = None
+    app.extensions['negative_cache'] = negative_cache
+
+    # Clients that make too many requests, and requests beyond what the app
+    # can serve at once, are turned away before any work is done.
+    if app.config['RATE_LIMIT_PER_MINUTE']:
+        rate_limiter = RateLimiter(
+            rate=app.config['RATE_LIMIT_PER_MINUTE'] / 60,
+            burst=app.config['RATE_LIMIT_BURST'],
+            store=app.config['RATE_LIMIT_STORE'],
+        )
+    else:
+        rate_limiter = None
+    app.extensions['rate_limiter'] = rate_limiter
+    if app.config['MAX_CONCURRENT_REQUESTS']:
+        concurrency = ConcurrencyLimit(app.config['MAX_CONCURRENT_REQUESTS'])
+    else:
+        concurrency = None
+    app.extensions['concurrency_limit'] = concurrency
+
+    # Support package requests are timed and counted in-process.
+    if app.config['METRICS']:
+        metrics = Metrics()
+        if url_cache is not None:
+            metrics.add_collector(stats_collector('skep_presigned_url_cache', url_cache.stats))
+        if disk_cache is not None:
+            metrics.add_collector(stats_collector('skep_disk_cache', disk_cache.stats))
+        if negative_cache is not None:
+            metrics.add_collector(stats_collector(
+                'skep_negative_cache',
+                lambda: {'size': len(negative_cache), 'hits': negative_cache.hits},
+            ))
+        if signing_flight is not None:
+            metrics.add_collector(stats_collector(
+                'skep_signing',
+                lambda: {'coalesced': signing_flight.coalesced},
+            ))
+        if inventory is not None:
+            metrics.add_collector(stats_collector('skep_s3_inventory', lambda: {'size': len(inventory)}))
+        if replicas is not None:
+            metrics.add_collector(stats_collector('skep_s3_replicas', replicas.stats))
+        if rate_limiter is not None:
+            metrics.add_collector(stats_collector('skep_rate_limit', lambda: {'limited': rate_limiter.limited}))
+        if concurrency is not None:
+            metrics.add_collector(stats_collector(
+                'skep_concurrency',
+                lambda: {'active': concurrency.active, 'shed': concurrency.shed},
+            ))
+    else:
+        metrics = None
+    app.extensions['metrics'] = metrics
+
+    # A sample of requests can be profiled.
+    if app.config['PROFILE_RATE'] or app.config['PROFILE_TOKEN']:
+        profiler = RequestProfiler(
+            directory=app.config['PROFILE_DIR'] or os.path.join(app.instance_path, 'profiles'),
+            rate=app.config['PROFILE_RATE'],
+            token=app.config['PROFILE_TOKEN'],
+        )
+    else:
+        profiler = None
+    app.extensions['profiler'] = profiler
+
+    # Requests for support packages are resolved outside the views, so the
+    # fast path and the ASGI app can serve them too.
+    support_packages = SupportPackages(
+        app.config,
+        s3_clients,
+        url_cache=url_cache,
+        inventory=inventory,
+        replicas=replicas,
+        disk_cache=disk_cache,
+        signing_flight=signing_flight,
+        negative_cache=negative_cache,
+        rate_limiter=rate_limiter,
+        concurrency=concurrency,
+        metrics=metrics,
+        profiler=profiler,
+    )
+    app.extensions['support_packages'] = support_packages
+    app.extensions['landing_page'] = landing_page
+
+    if metrics is not None:
+        @app.before_request
+        def start_request_timer():
+            if request.endpoint == 'support_package':
+                g.timer = RequestTimer()
+
+        @app.after_request
+        def record_request_metrics(response):
+            timer = g.pop('timer', None)
+            if timer is not None:
+                support_packages.record(request, response.status_code, timer)
+            return response
+
+    # Views
+    @app.route('/')
+    def hello():
+        return landing_page.response(request)
+
     @app.route("/python", methods=['GET'])
     def support_package():
-        # Extract arguments from the URL.
-        py_version = request.args.get('version')
-        platform = request.args.get('platform')
-        host_arch = request.args.get('arch')
-        revision = request.args.get('revision')
+        return support_packages.response(request, g.get('timer', NULL_TIMER))
 
-        if py_version is None:
-            abort(400, "No Python version requested")
-        if platform is None:
-            abort(400, "No platform requested")
+    @app.route("/python/manifest", methods=['GET'])
+    def support_package_manifest():
+        if manifest is None:
+            abort(404)
+        return manifest.response(request)
 
-        try:
-            if platform == 'windows':
-                url = platforms.windows_support_url(
-                    version=py_version,
-                    host_arch=host_arch,
-                    revision=revision,
-                )
-            else:
-                url = platforms.support_url(
-                    boto3.client('s3', region_name=app.config['S3_REGION']),
-                    bucket=app.config['S3_BUCKET'],
-                    platform=platform,
-                    version=py_version,
-                    host_arch=host_arch,
-                    revision=revision,
-                )
-
-            return redirect(url, code=302)
-        except ValueError:
+    @app.route("/metrics", methods=['GET'])
+    def metrics_endpoint():
+        if metrics is None:
             abort(404)
-        except RuntimeError:
-            abort(502)
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    @app.route("/python/batch", methods=['POST'])
+    def support_package_batch():
+        packages = request.get_json(silent=True)
+        max_size = support_packages.max_batch_size
+        # Each support package in a batch counts against the rate limit; a
+        # batch that will be rejected counts once.
+        valid = isinstance(packages, list) and len(packages) <= max_size
+        error = support_packages.shed(request, cost=max(len(packages), 1) if valid else 1)
+        if error is not None:
+            return error
+        try:
+            if not isinstance(packages, list):
+                abort(400, "Expected a JSON list of support package requests")
+            if len(packages) > max_size:
+                abort(400, f"No more than {max_size} support packages can be requested at once")
+            return jsonify(support_packages.batch(request, packages))
+        finally:
+            support_packages.release()
+
+    # When profiling is disabled, the views aren't wrapped at all.
+    if profiler is not None:
+        def profiled(endpoint, view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if profiler.sampled(request.headers.get(PROFILE_HEADER)):
+                    return profiler.run(endpoint, view, *args, **kwargs)
+                return view(*args, **kwargs)
+            return wrapper
+
+        for endpoint in ('hello', 'support_package'):
+            app.view_functions[endpoint] = profiled(endpoint, app.view_functions[endpoint])
+
+    # /python can be served directly, bypassing Flask's request handling.
+    if app.config['WSGI_FAST_PATH']:
+        app.wsgi_app = FastPath(app, '/python', support_packages.handle)
 
     return app
@@ -0,0 +1,390 @@
+import math
+
+from flask import Response, abort
+from werkzeug.exceptions import BadRequest, HTTPException, NotFound, ServiceUnavailable, TooManyRequests
+from werkzeug.wsgi import ClosingIterator
+
+from skep import platforms, proxy
+from skep.headers import cacheable_redirect, presigned_url_expiry, redirect_max_age
+from skep.metrics import NULL_TIMER, RequestTimer, TimingPresigner, metric_label, record_request
+from skep.profiling import PROFILE_HEADER
+from skep.sigv4 import SigV4Presigner
+
+TRUTHY = {'1', 'true', 'yes'}
+
+# Metrics are labelled with known platforms and versions only, so that
+# arbitrary query arguments can't create new time series.
+KNOWN_PLATFORMS = {entry[0] for entry in platforms.SUPPORT_CATALOG} | {'windows'}
+KNOWN_VERSIONS = {
+    version
+    for entry in platforms.SUPPORT_CATALOG
+    for version in entry[3]
+} | set(platforms.WINDOWS_MICRO_VERSIONS)
+
+# Error pages for rejected requests are rendered once, so they can be
+# returned without raising an exception.
+NO_VERSION = BadRequest("No Python version requested").get_body()
+NO_PLATFORM = BadRequest("No platform requested").get_body()
+NOT_FOUND = NotFound().get_body()
+TOO_MANY_REQUESTS = TooManyRequests().get_body()
+SERVICE_UNAVAILABLE = ServiceUnavailable().get_body()
+
+
+def error_response(body, status):
+    return Response(body, status=status, mimetype='text/html')
+
+
+def retry_response(body, status, retry_after):
+    response = error_response(body, status)
+    response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+class SupportPackages:
+    """Resolve requests for support packages.
+
+    Built once per app, from its config and shared components (any of
+    which may be None, if disabled). ``/python`` is served in stages, so
+    that a server can run each stage where it fits: ``shed()`` and
+    ``query()`` never block, ``resolve()`` may block on S3, and
+    ``release()`` must follow a successful ``shed()``. ``response()`` runs
+    every stage in turn.
+    """
+    def __init__(
+        self,
+        config,
+        s3_clients,
+        url_cache=None,
+        inventory=None,
+        replicas=None,
+        disk_cache=None,
+        signing_flight=None,
+        negative_cache=None,
+        rate_limiter=None,
+        concurrency=None,
+        metrics=None,
+        profiler=None,
+    ):
+        # URLs can be signed by boto3, or by the built-in SigV4 signer.
+        if config['S3_SIGNER'] not in {'boto3', 'sigv4'}:
+            raise ValueError(f"Unknown S3 signer {config['S3_SIGNER']!r}")
+        if config['PRESIGN_TIME_BUCKET'] and config['S3_SIGNER'] != 'sigv4':
+            # boto3 always signs as of the current time.
+            raise ValueError("PRESIGN_TIME_BUCKET requires the 'sigv4' S3 signer")
+
+        self.config = config
+        self.s3_clients = s3_clients
+        self.url_cache = url_cache
+        self.inventory = inventory
+        self.replicas = replicas
+        self.disk_cache = disk_cache
+        self.signing_flight = signing_flight
+        self.negative_cache = negative_cache
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.metrics = metrics
+        self.profiler = profiler
+
+        self._sigv4_presigners = {}
+
+    def presigner(self, region, timer=None, check_inventory=True):
+        "Sign URLs for the bucket in ``region``."
+        if self.config['S3_SIGNER'] == 'sigv4':
+            try:
+                s3 = self._sigv4_presigners[region]
+            except KeyError:
+                s3 = self._sigv4_presigners.setdefault(
+                    region,
+                    SigV4Presigner.from_environment(
+                        region,
+                        time_bucket=self.config['PRESIGN_TIME_BUCKET'],
+                    ),
+                )
+        else:
+            s3 = self.s3_clients.client(region)
+
+        if timer is not None and self.metrics is not None:
+            s3 = TimingPresigner(s3, timer)
+        if self.signing_flight is not None:
+            s3 = self.signing_flight.bind(s3)
+        if self.url_cache is not None:
+            s3 = self.url_cache.bind(s3)
+        if self.inventory is not None and check_inventory:
+            s3 = self.inventory.bind(s3)
+        return s3
+
+    def request_presigner(self, req, timer=None):
+        "Sign URLs for the bucket that should serve ``req``."
+        region = self.replicas.region(req) if self.replicas is not None else None
+        if region is None:
+            return self.presigner(self.config['S3_REGION'], timer=timer)
+
+        # Keys that aren't in the inventory are rejected before the replica
+        # is checked for them.
+        s3 = self.replicas.bind(
+            region,
+            self.presigner(region, timer=timer, check_inventory=False),
+            primary=self.presigner(self.config['S3_REGION'], timer=timer, check_inventory=False),
+        )
+        if self.inventory is not None:
+            s3 = self.inventory.bind(s3)
+        return s3
+
+    def url(self, py_version, platform, host_arch, revision, s3=None):
+        """The URL of a support package.
+
+        Raises ``ValueError`` if there is no such support package, and
+        ``RuntimeError`` if the URL can't be produced.
+        """
+        if platform == 'windows':
+            url = platforms.windows_support_url(
+                version=py_version,
+                host_arch=host_arch,
+                revision=revision,
+            )
+            # Pinned embed packages can be served from the support bucket.
+            key = platforms.windows_mirror_key(url) if self.config['WINDOWS_MIRROR'] else None
+            # If the package hasn't been mirrored, python.org still has it.
+            if key is None or (self.inventory is not None and not self.inventory.exists(key)):
+                return url
+            return platforms.presigned_url(
+                self.presigner(self.config['S3_REGION']) if s3 is None else s3,
+                bucket=self.config['S3_BUCKET'],
+                key=key,
+            )
+
+        return platforms.support_url(
+            self.presigner(self.config['S3_REGION']) if s3 is None else s3,
+            bucket=self.config['S3_BUCKET'],
+            platform=platform,
+            version=py_version,
+            host_arch=host_arch,
+            revision=revision,
+        )
+
+    def record(self, req, status, timer):
+        "Record a request in the metrics."
+        record_request(
+            self.metrics,
+            timer,
+            platform=metric_label(req.args.get('platform'), KNOWN_PLATFORMS),
+            version=metric_label(req.args.get('version'), KNOWN_VERSIONS),
+            status=status,
+            log=self.config['METRICS_LOG'],
+            arch=req.args.get('arch'),
+            revision=req.args.get('revision'),
+        )
+
+    def client_address(self, req):
+        header = self.config['RATE_LIMIT_HEADER']
+        value = req.headers.get(header) if header else None
+        if value:
+            # Proxies append to X-Forwarded-For, so the last address was
+            # added by the proxy in front of the app.
+            return value.rsplit(',', 1)[-1].strip()
+        return req.remote_addr
+
+    @property
+    def max_batch_size(self):
+        # A batch costs one token for each support package in it, so it
+        # can't be larger than a client's burst.
+        if self.rate_limiter is not None:
+            return min(self.config['BATCH_MAX_SIZE'], self.rate_limiter.burst)
+        return self.config['BATCH_MAX_SIZE']
+
+    def shed(self, req, cost=1):
+        """Returns an error response if ``req`` must be turned away.
+
+        Otherwise, ``release()`` must be called once the request has been
+        served. The request uses ``cost`` tokens of the client's rate limit,
+        unless it is shed.
+        """
+        if self.concurrency is not None and not self.concurrency.acquire():
+            return retry_response(SERVICE_UNAVAILABLE, 503, self.config['OVERLOAD_RETRY_AFTER'])
+        if self.rate_limiter is not None:
+            wait = self.rate_limiter.acquire(self.client_address(req), cost=cost)
+            if wait:
+                self.release()
+                return retry_response(TOO_MANY_REQUESTS, 429, wait)
+        return None
+
+    def release(self, response=None):
+        # A streamed ``response`` is only released once it has been sent.
+        # Its body is passed straight to the server, so it is wrapped,
+        # rather than using the response's call_on_close().
+        if self.concurrency is not None:
+            if response is not None and not response.is_sequence:
+                response.response = ClosingIterator(response.response, self.concurrency.release)
+            else:
+                self.concurrency.release()
+
+    def query(self, req):
+        "Returns the query for a valid request, or an error response. This never blocks."
+        # Extract arguments from the URL.
+        py_version = req.args.get('version')
+        platform = req.args.get('platform')
+        host_arch = req.args.get('arch')
+        revision = req.args.get('revision')
+        # Support packages can be streamed through the app, rather than
+        # redirecting to S3.
+        stream = self.config['STREAMING'] or req.args.get('stream') in TRUTHY
+
+        if py_version is None:
+            return None, error_response(NO_VERSION, 400)
+        if platform is None:
+            return None, error_response(NO_PLATFORM, 400)
+
+        # Reject anything that isn't in the catalog before doing any work.
+        if not platforms.is_supported(platform, py_version, host_arch, revision):
+            return None, error_response(NOT_FOUND, 404)
+        query = (platform, py_version, host_arch, revision, stream)
+        if self.negative_cache is not None and query in self.negative_cache:
+            return None, error_response(NOT_FOUND, 404)
+
+        return query, None
+
+    def resolve(self, req, query, timer=NULL_TIMER):
+        "The response to a valid query. May block on S3 (to sign a URL, or to stream a support package)."
+        platform, py_version, host_arch, revision, stream = query
+        try:
+            if platform != 'windows' and stream:
+                return self.stream(req, platform, py_version, host_arch, revision, timer)
+
+            if platform == 'windows' and not self.config['WINDOWS_MIRROR']:
+                s3 = None
+            else:
+                with timer.phase('client'):
+                    s3 = self.request_presigner(req, timer=timer)
+            with timer.phase('resolve'):
+                url = self.url(py_version, platform, host_arch, revision, s3=s3)
+
+            with timer.phase('respond'):
+                if platform == 'windows' and presigned_url_expiry(url) is None:
+                    # python.org URLs don't change.
+                    max_age = self.config['WINDOWS_REDIRECT_MAX_AGE']
+                else:
+                    # The redirect can be cached until the signature expires.
+                    max_age = redirect_max_age(url, margin=self.config['REDIRECT_EXPIRY_MARGIN'])
+
+                response = cacheable_redirect(req, url, max_age)
+                if self.replicas is not None and self.replicas.countries and self.replicas.header:
+                    # The redirect depends on where the user is.
+                    response.vary.add(self.replicas.header)
+                return response
+        except ValueError:
+            if self.negative_cache is not None:
+                self.negative_cache.add(query)
+            return error_response(NOT_FOUND, 404)
+        except RuntimeError:
+            abort(502)
+
+    def stream(self, req, platform, py_version, host_arch, revision, timer):
+        with timer.phase('resolve'):
+            key = platforms.support_key(
+                platform=platform,
+                version=py_version,
+                host_arch=host_arch,
+                revision=revision,
+            )
+            if self.inventory is not None and not self.inventory.exists(key):
+                raise ValueError(f'{key} does not exist')
+        with timer.phase('client'):
+            s3 = self.s3_clients.client(self.config['S3_REGION'])
+        with timer.phase('respond'):
+            # werkzeug can't serve multiple ranges from a file, so those are
+            # read from S3.
+            if self.disk_cache is not None and not (req.range and len(req.range.ranges) > 1):
+                return proxy.cached_object_response(
+                    self.disk_cache,
+                    s3,
+                    bucket=self.config['S3_BUCKET'],
+                    key=key,
+                    chunk_size=self.config['STREAMING_CHUNK_SIZE'],
+                    environ=req.environ,
+                )
+            return proxy.object_response(
+                s3,
+                bucket=self.config['S3_BUCKET'],
+                key=key,
+                chunk_size=self.config['STREAMING_CHUNK_SIZE'],
+                range=req.range,
+                if_range=req.if_range,
+                method=req.method,
+            )
+
+    def response(self, req, timer=NULL_TIMER):
+        "The response to a request for ``/python``."
+        error = self.shed(req)
+        if error is not None:
+            return error
+        try:
+            query, response = self.query(req)
+            if response is None:
+                response = self.resolve(req, query, timer)
+        except BaseException:
+            self.release()
+            raise
+        self.release(response)
+        return response
+
+    def handle(self, req):
+        "Serve ``req`` without Flask: it is profiled and recorded here, rather than by Flask's hooks."
+        timer = NULL_TIMER if self.metrics is None else RequestTimer()
+        try:
+            if self.profiler is not None and self.profiler.sampled(req.headers.get(PROFILE_HEADER)):
+                response = self.profiler.run('support_package', self.response, req, timer)
+            else:
+                response = self.response(req, timer)
+        except HTTPException as e:
+            response = e.get_response(req.environ)
+
+        if self.metrics is not None:
+            self.record(req, response.status_code, timer)
+        return response
+
+    def batch(self, req, packages):
+        "Resolve a list of support package requests, each to a result dictionary."
+        # All S3 URLs in the batch are signed with the same client, for the
+        # same bucket.
+        s3 = None
+        results = []
+        for package in packages:
+            if not isinstance(package, dict):
+                results.append({'status': 400, 'error': "Expected a support package request"})
+                continue
+
+            # Values must be strings, like query arguments: a JSON number
+            # can't be converted faithfully (3.10 would become "3.1").
+            fields = ('version', 'platform', 'arch', 'revision')
+            invalid = [arg for arg in fields if package.get(arg) is not None and not isinstance(package[arg], str)]
+            if invalid:
+                results.append({'status': 400, 'error': f"Expected {invalid[0]} to be a string"})
+                continue
+
+            py_version, platform, host_arch, revision = (package.get(arg) for arg in fields)
+            result = {
+                'version': py_version,
+                'platform': platform,
+                'arch': host_arch,
+                'revision': revision,
+            }
+
+            if py_version is None:
+                result.update(status=400, error="No Python version requested")
+            elif platform is None:
+                result.update(status=400, error="No platform requested")
+            elif not platforms.is_supported(platform, py_version, host_arch, revision):
+                result.update(status=404, error="No support package found")
+            else:
+                try:
+                    if (platform != 'windows' or self.config['WINDOWS_MIRROR']) and s3 is None:
+                        s3 = self.request_presigner(req)
+                    url = self.url(py_version, platform, host_arch, revision, s3=s3)
+                    result.update(status=200, url=url)
+                except ValueError:
+                    result.update(status=404, error="No support package found")
+                except RuntimeError:
+                    result.update(status=502, error="Unable to produce a support package URL")
+            results.append(result)
+
+        return results
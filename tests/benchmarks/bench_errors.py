@@ -0,0 +1,25 @@
+import pytest
+
+from skep.skep import create_app
+
+
+@pytest.fixture(scope='module')
+def error_client():
+    return create_app({'TESTING': True}).test_client()
+
+
+@pytest.mark.parametrize(
+    "name, url, status",
+    [
+        ('errors.no_version', '/python', 400),
+        ('errors.no_platform', '/python?version=3.10', 400),
+        ('errors.unknown_platform', '/python?version=3.10&platform=beos', 404),
+        ('errors.unknown_version', '/python?version=2.7&platform=iOS', 404),
+        ('errors.unknown_arch', '/python?version=3.10&platform=linux&arch=sparc', 404),
+        ('errors.windows_unknown_version', '/python?version=2.7&platform=windows', 404),
+    ]
+)
+def bench_error_path(error_client, measure, check_budget, name, url, status):
+    "Rejecting a bad request stays within budget"
+    assert error_client.get(url).status_code == status
+    check_budget(name, measure(lambda: error_client.get(url), iterations=500))
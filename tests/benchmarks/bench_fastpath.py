@@ -0,0 +1,54 @@
+import boto3
+import pytest
+from werkzeug.test import EnvironBuilder
+
+from skep.skep import create_app
+from tests.fakes import FakeS3
+
+QUERIES = {
+    'iOS': 'version=3.10&platform=iOS',
+    'windows': 'version=3.10&platform=windows',
+    'not_found': 'version=3.4&platform=iOS',
+}
+
+
+@pytest.fixture(scope='module')
+def apps():
+    s3 = FakeS3()
+    original = boto3.client
+    boto3.client = lambda *args, **kwargs: s3
+    try:
+        yield {
+            'flask': create_app({'TESTING': True}),
+            'fast_path': create_app({'TESTING': True, 'WSGI_FAST_PATH': True}),
+        }
+    finally:
+        boto3.client = original
+
+
+def wsgi_request(app, path, query):
+    "A function that calls ``app`` directly, bypassing the overhead of the test client"
+    environ = EnvironBuilder(path=path, query_string=query).get_environ()
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def call():
+        body = app(dict(environ), start_response)
+        for chunk in body:
+            pass
+        if hasattr(body, 'close'):
+            body.close()
+
+    return call
+
+
+@pytest.mark.parametrize('name', QUERIES)
+def bench_fast_path(apps, measure, check_budget, name):
+    "The fast path serves /python faster than Flask does"
+    timings = {}
+    for mode, app in apps.items():
+        timings[mode] = measure(wsgi_request(app, '/python', QUERIES[name]), iterations=1000)
+        check_budget(f'wsgi.direct.{mode}.{name}', timings[mode])
+
+    assert timings['fast_path'] < timings['flask']
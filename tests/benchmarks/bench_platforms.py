@@ -0,0 +1,85 @@
+import boto3
+import pytest
+
+from skep import platforms
+from skep.sigv4 import SigV4Presigner
+from tests.fakes import FakeS3
+
+ITERATIONS = 20000
+
+
+@pytest.mark.parametrize(
+    "name, version, host_arch, revision",
+    [
+        ('windows_support_url.default', '3.10', None, None),
+        ('windows_support_url.arch', '3.10', 'win32', None),
+        ('windows_support_url.revision', '3.10', None, '4.post1'),
+    ]
+)
+def bench_windows_support_url(measure, check_budget, name, version, host_arch, revision):
+    "Windows URLs are resolved within budget"
+    check_budget(name, measure(
+        lambda: platforms.windows_support_url(version=version, host_arch=host_arch, revision=revision),
+        iterations=ITERATIONS,
+    ))
+
+
+@pytest.mark.parametrize(
+    "name, platform, version, host_arch, revision",
+    [
+        ('support_key.default', 'iOS', '3.10', None, None),
+        ('support_key.revision', 'linux', '3.10', 'x86_64', '2'),
+    ]
+)
+def bench_support_key(measure, check_budget, name, platform, version, host_arch, revision):
+    "S3 keys are resolved within budget"
+    check_budget(name, measure(
+        lambda: platforms.support_key(platform=platform, version=version, host_arch=host_arch, revision=revision),
+        iterations=ITERATIONS,
+    ))
+
+
+def bench_is_supported(measure, check_budget):
+    "Queries are validated within budget"
+    check_budget('is_supported', measure(
+        lambda: platforms.is_supported('macOS', '3.10', None, None),
+        iterations=ITERATIONS,
+    ))
+
+
+@pytest.fixture(scope='module')
+def signers():
+    return {
+        'stub': FakeS3(),
+        'boto3': boto3.client(
+            's3',
+            region_name='us-west-2',
+            aws_access_key_id='AKIDEXAMPLE',
+            aws_secret_access_key='secret',
+        ),
+        'sigv4': SigV4Presigner('us-west-2', 'AKIDEXAMPLE', 'secret'),
+    }
+
+
+@pytest.mark.parametrize(
+    "signer, iterations",
+    [
+        ('stub', ITERATIONS),
+        ('boto3', 500),
+        ('sigv4', 5000),
+    ]
+)
+def bench_support_url(signers, measure, check_budget, signer, iterations):
+    "S3 URLs are resolved and signed within budget"
+    s3 = signers[signer]
+    check_budget(f'support_url.{signer}', measure(
+        lambda: platforms.support_url(
+            s3,
+            bucket='briefcase-support',
+            platform='macOS',
+            version='3.10',
+            host_arch=None,
+            revision=None,
+        ),
+        iterations=iterations,
+    ))
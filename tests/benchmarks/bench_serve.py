@@ -0,0 +1,93 @@
+"""Throughput of ``python -m skep.serve``, compared to the Lambda handler path.
+
+On Lambda, each instance serves one request at a time, through the app
+built by ``skep.zappa``. That path is run locally by calling the app
+in-process, one request at a time. This leaves out API Gateway, and
+Lambda's own invocation overhead (and cold starts), so it flatters Lambda.
+
+``skep.serve`` is measured over HTTP, with concurrent clients.
+"""
+import http.client
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+PATH = '/python?version=3.10&platform=macOS'
+
+WORKERS = os.cpu_count() or 1
+CLIENTS = 8
+REQUESTS_PER_CLIENT = 200
+
+CREDENTIALS = {'AWS_ACCESS_KEY_ID': 'AKIDEXAMPLE', 'AWS_SECRET_ACCESS_KEY': 'secret'}
+
+
+@pytest.fixture(scope='module')
+def server():
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'skep.serve', '--port', '0', '--workers', str(WORKERS)],
+        stderr=subprocess.PIPE,
+        text=True,
+        env=dict(os.environ, **CREDENTIALS),
+    )
+    try:
+        port = int(re.search(r'Listening on http://127.0.0.1:(\d+)', process.stderr.readline()).group(1))
+        # Drain the log, so the server never blocks writing to it.
+        threading.Thread(target=process.stderr.read, daemon=True).start()
+        yield port
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def get(port, path):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def bench_lambda(monkeypatch, measure, check_budget):
+    "The Lambda handler path stays within budget"
+    for name, value in CREDENTIALS.items():
+        monkeypatch.setenv(name, value)
+    import skep.zappa
+
+    client = skep.zappa.app.test_client()
+    assert client.get(PATH).status_code == 302
+
+    check_budget('lambda.python', measure(lambda: client.get(PATH), iterations=500))
+
+
+def bench_serve(server, check_budget):
+    "Throughput with concurrent clients over HTTP stays within budget"
+    assert get(server, PATH) == 302
+
+    barrier = threading.Barrier(CLIENTS + 1)
+    statuses = []
+
+    def client():
+        barrier.wait()
+        for i in range(REQUESTS_PER_CLIENT):
+            statuses.append(get(server, PATH))
+
+    threads = [threading.Thread(target=client) for i in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    assert set(statuses) == {302}
+    # Recorded as the wall-clock time per request, across all clients.
+    check_budget('serve.python', elapsed / (CLIENTS * REQUESTS_PER_CLIENT))
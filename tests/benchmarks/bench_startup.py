@@ -0,0 +1,60 @@
+import json
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+RUNS = 7
+
+# Run in a fresh interpreter, so that nothing is already imported.
+SCRIPT = """
+import json
+import time
+
+start = time.perf_counter()
+import skep.zappa
+imported = time.perf_counter()
+
+client = skep.zappa.app.test_client()
+client.get('/')
+home = time.perf_counter()
+client.get('/python?version=3.7&platform=windows')
+windows = time.perf_counter()
+
+print(json.dumps({
+    'startup.import': imported - start,
+    'startup.first_response': home - imported,
+    'startup.first_windows_response': windows - home,
+}))
+"""
+
+
+@pytest.fixture(scope='module')
+def startup():
+    runs = [
+        json.loads(subprocess.run(
+            [sys.executable, '-c', SCRIPT],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout)
+        for i in range(RUNS)
+    ]
+    return {
+        name: statistics.median(run[name] for run in runs)
+        for name in runs[0]
+    }
+
+
+@pytest.mark.parametrize(
+    'name',
+    [
+        'startup.import',
+        'startup.first_response',
+        'startup.first_windows_response',
+    ]
+)
+def bench_startup(startup, check_budget, name):
+    "Cold start stays within budget"
+    check_budget(name, startup[name])
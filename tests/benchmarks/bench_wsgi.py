@@ -0,0 +1,73 @@
+import threading
+import time
+
+import boto3
+import pytest
+
+from skep.skep import create_app
+from tests.fakes import FakeS3
+
+THREADS = 8
+REQUESTS_PER_THREAD = 250
+
+
+@pytest.fixture(scope='module')
+def app():
+    # The S3 client is a local stub, so no network or credentials are needed.
+    s3 = FakeS3()
+    original = boto3.client
+    boto3.client = lambda *args, **kwargs: s3
+    try:
+        yield create_app({'TESTING': True})
+    finally:
+        boto3.client = original
+
+
+@pytest.mark.parametrize(
+    "platform, query",
+    [
+        ('iOS', 'version=3.10&platform=iOS'),
+        ('macOS', 'version=3.10&platform=macOS'),
+        ('android', 'version=3.10&platform=android'),
+        ('linux', 'version=3.10&platform=linux&arch=x86_64'),
+        ('windows', 'version=3.10&platform=windows'),
+    ]
+)
+def bench_redirect(app, measure, check_budget, platform, query):
+    "A redirect through the full WSGI stack stays within budget"
+    client = app.test_client()
+    assert client.get(f'/python?{query}').status_code == 302
+
+    check_budget(f'wsgi.python.{platform}', measure(lambda: client.get(f'/python?{query}'), iterations=500))
+
+
+def bench_home(app, measure, check_budget):
+    "The home page stays within budget"
+    client = app.test_client()
+
+    check_budget('wsgi.home', measure(lambda: client.get('/'), iterations=500))
+
+
+def bench_threaded_throughput(app, check_budget):
+    "Throughput with concurrent clients stays within budget"
+    barrier = threading.Barrier(THREADS + 1)
+    statuses = []
+
+    def worker():
+        client = app.test_client()
+        barrier.wait()
+        for i in range(REQUESTS_PER_THREAD):
+            statuses.append(client.get('/python?version=3.10&platform=macOS').status_code)
+
+    threads = [threading.Thread(target=worker) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    assert set(statuses) == {302}
+    # Recorded as the wall-clock time per request, across all threads.
+    check_budget('wsgi.threaded', elapsed / (THREADS * REQUESTS_PER_THREAD))
@@ -0,0 +1,99 @@
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+BASELINE = Path(__file__).parent / 'baseline.json'
+
+# Measurements made during this run, by name.
+RESULTS = {}
+
+
+def baseline_path():
+    # A previous run's output can be used as the baseline.
+    return Path(os.environ.get('SKEP_BENCHMARK_BASELINE', BASELINE))
+
+
+def threshold_ratio():
+    # How much slower than the baseline a measurement may be before it is
+    # considered a regression.
+    return float(os.environ.get('SKEP_BENCHMARK_THRESHOLD', '2.0'))
+
+
+def load_baseline(path):
+    with path.open() as f:
+        data = json.load(f)
+    # Accept either a plain {name: seconds} mapping, or the output of a
+    # previous run.
+    if 'results' in data:
+        return {name: result['seconds'] for name, result in data['results'].items()}
+    return data
+
+
+@pytest.fixture(scope='session')
+def baseline():
+    return load_baseline(baseline_path())
+
+
+@pytest.fixture(scope='session')
+def threshold():
+    return threshold_ratio()
+
+
+@pytest.fixture
+def check_budget(baseline, threshold):
+    def check(name, seconds):
+        RESULTS[name] = seconds
+        if name not in baseline:
+            # A new benchmark; there's nothing to compare against yet.
+            return
+        budget = baseline[name] * threshold
+        assert seconds <= budget, (
+            f"{name} took {seconds * 1000:.4f}ms; "
+            f"the budget is {budget * 1000:.4f}ms"
+        )
+    return check
+
+
+@pytest.fixture(scope='session')
+def measure():
+    def measure(func, iterations, repeat=5):
+        "The best time per call of ``func`` over ``repeat`` runs of ``iterations`` calls."
+        func()
+        best = None
+        for i in range(repeat):
+            start = time.perf_counter()
+            for j in range(iterations):
+                func()
+            elapsed = (time.perf_counter() - start) / iterations
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    return measure
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not RESULTS:
+        return
+
+    baseline = load_baseline(baseline_path())
+    output = {
+        'timestamp': time.time(),
+        'python': sys.version,
+        'platform': platform.platform(),
+        'threshold': threshold_ratio(),
+        'results': {
+            name: {
+                'seconds': seconds,
+                'baseline': baseline.get(name),
+                'ratio': seconds / baseline[name] if baseline.get(name) else None,
+            }
+            for name, seconds in sorted(RESULTS.items())
+        },
+    }
+    path = Path(os.environ.get('SKEP_BENCHMARK_OUTPUT', 'benchmark-results.json'))
+    with path.open('w') as f:
+        json.dump(output, f, indent=4)
@@ -1,13 +1,17 @@
+import boto3
 import pytest
 
 from skep.skep import create_app
+from tests.fakes import FakeS3
 
 
-@pytest.fixture(scope='module')
-def test_client():
+@pytest.fixture(params=[False, True], ids=['flask', 'fast_path'])
+def test_client(request):
+    # Every test is run through Flask, and through the WSGI fast path.
     flask_app = create_app({
         'TESTING': True,
         'BCRYPT_LOG_ROUNDS': 4,
+        'WSGI_FAST_PATH': request.param,
     })
 
     # Flask provides a way to test your application by exposing the Werkzeug test Client
@@ -21,3 +25,11 @@ def test_client():
     yield testing_client  # this is where the testing happens!
 
     ctx.pop()
+
+
+@pytest.fixture
+def fake_s3(monkeypatch):
+    "Replace the S3 client used by the app with a local stand-in."
+    s3 = FakeS3()
+    monkeypatch.setattr(boto3, 'client', lambda *args, **kwargs: s3)
+    return s3
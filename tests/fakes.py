@@ -0,0 +1,111 @@
+import datetime
+import hashlib
+import io
+import re
+
+from botocore.exceptions import ClientError
+
+
+class FakeBody(io.BytesIO):
+    "A stand-in for botocore's StreamingBody that records how it is read."
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+class FakePaginator:
+    "A stand-in for botocore's list_objects_v2 paginator."
+    def __init__(self, s3, page_size):
+        self.s3 = s3
+        self.page_size = page_size
+
+    def paginate(self, Bucket, Prefix=''):
+        self.s3.calls.append(('list_objects_v2', Bucket, Prefix))
+        keys = sorted(key for key in self.s3.objects if key.startswith(Prefix))
+        for start in range(0, max(len(keys), 1), self.page_size):
+            yield {
+                'Contents': [
+                    {
+                        'Key': key,
+                        'Size': len(self.s3.objects[key]),
+                        'ETag': self.s3._metadata(self.s3.objects[key])['ETag'],
+                    }
+                    for key in keys[start:start + self.page_size]
+                ],
+            }
+
+
+class FakeS3:
+    "A local stand-in for an S3 client, backed by a dictionary of objects."
+    def __init__(self, objects=None, content_type='binary/octet-stream'):
+        self.objects = {} if objects is None else objects
+        self.content_type = content_type
+        self.last_modified = datetime.datetime(2022, 5, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+        self.bodies = []
+        self.calls = []
+
+    def _object(self, bucket, key, operation):
+        try:
+            return self.objects[key]
+        except KeyError:
+            raise ClientError(
+                {'Error': {'Code': 'NoSuchKey', 'Message': 'The specified key does not exist.'}},
+                operation,
+            )
+
+    def _metadata(self, data):
+        return {
+            'ContentLength': len(data),
+            'ContentType': self.content_type,
+            'ETag': f'"{hashlib.md5(data).hexdigest()}"',
+            'LastModified': self.last_modified,
+        }
+
+    def head_object(self, Bucket, Key):
+        self.calls.append(('head_object', Bucket, Key))
+        return self._metadata(self._object(Bucket, Key, 'HeadObject'))
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.calls.append(('get_object', Bucket, Key) + (() if Range is None else (Range,)))
+        data = self._object(Bucket, Key, 'GetObject')
+        length = len(data)
+
+        content_range = None
+        if Range is not None:
+            start, stop = re.match(r'bytes=(\d*)-(\d*)$', Range).groups()
+            if not start:
+                start, stop = max(length - int(stop), 0), length
+            else:
+                start, stop = int(start), length if not stop else min(int(stop) + 1, length)
+            if start >= length:
+                raise ClientError(
+                    {'Error': {
+                        'Code': 'InvalidRange',
+                        'Message': 'The requested range is not satisfiable',
+                        'ActualObjectSize': str(length),
+                    }},
+                    'GetObject',
+                )
+            content_range = f'bytes {start}-{stop - 1}/{length}'
+            data = data[start:stop]
+
+        body = FakeBody(data)
+        self.bodies.append(body)
+        obj = self._metadata(data)
+        obj['ETag'] = self._metadata(self.objects[Key])['ETag']
+        obj['Body'] = body
+        if content_range is not None:
+            obj['ContentRange'] = content_range
+        return obj
+
+    def get_paginator(self, operation_name):
+        assert operation_name == 'list_objects_v2'
+        return FakePaginator(self, page_size=2)
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600):
+        self.calls.append(('generate_presigned_url', Params['Bucket'], Params['Key']))
+        return f"https://{Params['Bucket']}.s3.amazonaws.com/{Params['Key']}?Expires={ExpiresIn}"
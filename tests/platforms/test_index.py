@@ -0,0 +1,190 @@
+import itertools
+from unittest import mock
+
+import pytest
+
+from skep.platforms import SUPPORT_INDEX, is_supported, support_key, support_url, windows_support_url
+
+# The implementations of windows_support_url and support_url that were in
+# place before the catalog was compiled into lookup tables. The compiled
+# tables must give exactly the same answers.
+
+
+def legacy_windows_support_url(version, host_arch, revision):
+    if host_arch is None:
+        host_arch = 'amd64'
+
+    # The URL for embed packages is known:
+    url = (
+        'https://www.python.org/ftp/python/{version}.{micro}'
+        '/python-{version}.{revision}-embed-{host_arch}.zip'
+    )
+
+    if revision:
+        # A specific revision has been requested.
+        parts = revision.split('.')
+        best_url = url.format(
+            version=version, micro=parts[0], revision=revision, host_arch=host_arch
+        )
+    else:
+        # Lock the most recent known versions as of the pre-release of Briefcase 0.3.10
+        try:
+            micro = {
+                '3.5': 4,
+                '3.6': 8,
+                '3.7': 9,
+                '3.8': 10,
+                '3.9': 13,
+                '3.10': 7,
+            }[version]
+
+            best_url = url.format(
+                version=version,
+                micro=micro,
+                revision=micro,
+                host_arch=host_arch,
+            )
+        except KeyError:
+            raise ValueError('Unsupported major.minor version')
+
+    return best_url
+
+
+def legacy_support_url(s3, bucket, platform, version, host_arch, revision):
+    try:
+        if host_arch is None:
+            prefix = f'python/{version}/{platform}'
+
+            if platform == "android":
+                best_revision = {
+                    '3.6': 3,
+                    '3.7': 9,
+                    '3.8': 5,
+                    '3.9': 3,
+                    '3.10': 2,
+                }[version]
+                if revision is None:
+                    revision = best_revision
+
+                top_build = f"{prefix}/Python-{version}-Android-support.b{revision}.zip"
+            elif platform in {"iOS", "macOS"}:
+                best_revision = {
+                    '3.5': 12,
+                    '3.6': 14,
+                    '3.7': 9,
+                    '3.8': 9,
+                    '3.9': 7,
+                    '3.10': 3,
+                }[version]
+                if revision is None:
+                    revision = best_revision
+
+                top_build = f"{prefix}/Python-{version}-{platform}-support.b{revision}.tar.gz"
+            else:
+                top_build = None
+        elif platform == "linux" and host_arch == "x86_64":
+            prefix = f'python/{version}/{platform}/{host_arch}'
+
+            best_revision = {
+                '3.5': 2,
+                '3.6': 4,
+                '3.7': 6,
+                '3.8': 6,
+                '3.9': 4,
+                '3.10': 3,
+            }[version]
+            if revision is None:
+                revision = best_revision
+
+            top_build = f"{prefix}/Python-{version}-linux-{host_arch}-support.b{revision}.tar.gz"
+        else:
+            top_build = None
+    except KeyError:
+        top_build = None
+
+    # If we didn't find a file, raise 404.
+    if top_build is None:
+        raise ValueError()
+
+    return s3.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': bucket,
+            'Key': top_build
+        },
+        ExpiresIn=60
+    )
+
+
+PLATFORMS = ['android', 'iOS', 'macOS', 'linux', 'windows', 'something']
+VERSIONS = ['2.7', '3.4', '3.5', '3.6', '3.7', '3.8', '3.9', '3.10', '3.11']
+HOST_ARCHES = [None, 'x86_64', 'arm64', 'amd64', 'win32']
+REVISIONS = [None, '2', 'b4', '4.post1']
+
+
+def _signed_key(func, **kwargs):
+    s3 = mock.MagicMock()
+    s3.generate_presigned_url.side_effect = lambda method, Params, ExpiresIn: (method, Params, ExpiresIn)
+    try:
+        return func(s3, bucket='briefcase-support', **kwargs)
+    except ValueError:
+        return ValueError
+
+
+def _windows_url(func, **kwargs):
+    try:
+        return func(**kwargs)
+    except ValueError:
+        return ValueError
+
+
+@pytest.mark.parametrize(
+    "platform, version, host_arch, revision",
+    list(itertools.product(PLATFORMS, VERSIONS, HOST_ARCHES, REVISIONS)),
+)
+def test_support_url_matches_legacy(platform, version, host_arch, revision):
+    "The compiled support index gives the same result as the original implementation"
+    kwargs = dict(platform=platform, version=version, host_arch=host_arch, revision=revision)
+
+    assert _signed_key(support_url, **kwargs) == _signed_key(legacy_support_url, **kwargs)
+
+
+@pytest.mark.parametrize(
+    "version, host_arch, revision",
+    list(itertools.product(VERSIONS, HOST_ARCHES + ['something'], REVISIONS)),
+)
+def test_windows_support_url_matches_legacy(version, host_arch, revision):
+    "The compiled Windows index gives the same result as the original implementation"
+    kwargs = dict(version=version, host_arch=host_arch, revision=revision)
+
+    assert _windows_url(windows_support_url, **kwargs) == _windows_url(legacy_windows_support_url, **kwargs)
+
+
+def test_support_index_keys():
+    "Every default support package in the catalog has a precompiled key"
+    assert len(SUPPORT_INDEX) == 23
+    assert SUPPORT_INDEX['linux', '3.10', 'x86_64', None] == (
+        'python/3.10/linux/x86_64/Python-3.10-linux-x86_64-support.b3.tar.gz'
+    )
+
+
+def test_support_key_explicit_revision():
+    "An explicit revision is spliced into the compiled template"
+    assert support_key(platform='iOS', version='3.9', host_arch=None, revision='12') == (
+        'python/3.9/iOS/Python-3.9-iOS-support.b12.tar.gz'
+    )
+
+
+@pytest.mark.parametrize(
+    "platform, version, host_arch, revision",
+    list(itertools.product(PLATFORMS, VERSIONS, HOST_ARCHES + ['something'], REVISIONS + [''])),
+)
+def test_is_supported_matches_resolution(platform, version, host_arch, revision):
+    "A query is supported exactly when it can be resolved"
+    kwargs = dict(version=version, host_arch=host_arch, revision=revision)
+    if platform == 'windows':
+        result = _windows_url(windows_support_url, **kwargs)
+    else:
+        result = _signed_key(support_url, platform=platform, **kwargs)
+
+    assert is_supported(platform, version, host_arch, revision) == (result is not ValueError)
@@ -0,0 +1,339 @@
+import asyncio
+import gzip
+import threading
+import time
+from urllib.parse import urlsplit
+
+import pytest
+
+from skep import platforms
+from skep.aio import ASGIApp, wsgi_environ
+from skep.skep import LANDING_PAGE, create_app
+
+MACOS_KEY = 'python/3.10/macOS/Python-3.10-macOS-support.b3.tar.gz'
+
+
+class ASGIResponse:
+    def __init__(self, messages):
+        start = messages[0]
+        assert start['type'] == 'http.response.start'
+        self.status = start['status']
+        self.headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in start['headers']}
+        self.chunks = [message['body'] for message in messages[1:]]
+        self.body = b''.join(self.chunks)
+        assert not messages[-1].get('more_body', False)
+
+
+class ASGIClient:
+    "An in-process ASGI client"
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, url, headers=None, body=b''):
+        parts = urlsplit(url)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': parts.path,
+            'root_path': '',
+            'query_string': parts.query.encode('latin-1'),
+            'headers': [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in (headers or {}).items()
+            ],
+            'client': ('127.0.0.1', 12345),
+            'server': ('testserver', 80),
+        }
+        received = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        messages = []
+
+        async def receive():
+            if received:
+                return received.pop(0)
+            # Nothing more will be sent; wait until cancelled.
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        await self.app(scope, receive, send)
+        return ASGIResponse(messages)
+
+    def get(self, url, **kwargs):
+        return asyncio.run(self.request('GET', url, **kwargs))
+
+
+@pytest.fixture
+def client(fake_s3):
+    return ASGIClient(ASGIApp(create_app({'TESTING': True})))
+
+
+def test_home(client):
+    "The landing page is served"
+    response = client.get('/')
+    assert response.status == 200
+    assert response.body == LANDING_PAGE.encode('utf-8')
+    assert response.headers['content-type'] == 'text/html; charset=utf-8'
+    assert response.headers['vary'] == 'Accept-Encoding'
+
+
+def test_home_gzip(client):
+    "The landing page is served compressed"
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.status == 200
+    assert response.headers['content-encoding'] == 'gzip'
+    assert gzip.decompress(response.body) == LANDING_PAGE.encode('utf-8')
+
+    etag = response.headers['etag']
+    response = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status == 304
+    assert response.body == b''
+
+
+@pytest.mark.parametrize(
+    'query, status',
+    [
+        ('', 400),
+        ('version=3.10', 400),
+        ('version=3.4&platform=iOS', 404),
+        ('version=3.10&platform=tvOS', 404),
+    ]
+)
+def test_rejected(client, query, status):
+    "Invalid requests are rejected"
+    response = client.get(f'/python?{query}')
+    assert response.status == status
+
+
+def test_redirect(client, fake_s3):
+    "A support package request is redirected to a signed URL"
+    response = client.get('/python?version=3.10&platform=macOS')
+    assert response.status == 302
+    assert response.headers['location'] == f'https://briefcase-support.s3.amazonaws.com/{MACOS_KEY}?Expires=60'
+    assert fake_s3.calls == [('generate_presigned_url', 'briefcase-support', MACOS_KEY)]
+
+
+def test_windows(client, fake_s3):
+    "Windows requests are redirected to python.org"
+    response = client.get('/python?version=3.10&platform=windows&arch=win32')
+    assert response.status == 302
+    assert response.headers['location'] == 'https://www.python.org/ftp/python/3.10.7/python-3.10.7-embed-win32.zip'
+    assert fake_s3.calls == []
+
+
+def test_bad_gateway(client, monkeypatch):
+    "A failure to sign a URL is a 502"
+    def support_url(*args, **kwargs):
+        raise RuntimeError()
+    monkeypatch.setattr(platforms, 'support_url', support_url)
+
+    assert client.get('/python?version=3.10&platform=macOS').status == 502
+
+
+def test_negative_cache(client, fake_s3, monkeypatch):
+    "Failed lookups are remembered"
+    calls = []
+
+    def support_url(*args, **kwargs):
+        calls.append(kwargs)
+        raise ValueError()
+    monkeypatch.setattr(platforms, 'support_url', support_url)
+
+    assert client.get('/python?version=3.10&platform=macOS').status == 404
+    assert client.get('/python?version=3.10&platform=macOS').status == 404
+    assert len(calls) == 1
+
+
+def test_stream(fake_s3):
+    "A streamed support package is sent in chunks"
+    fake_s3.objects[MACOS_KEY] = b'x' * 10
+    client = ASGIClient(ASGIApp(create_app({'TESTING': True, 'STREAMING_CHUNK_SIZE': 4})))
+
+    response = client.get('/python?version=3.10&platform=macOS&stream=1')
+
+    assert response.status == 200
+    assert response.headers['content-length'] == '10'
+    assert response.chunks == [b'xxxx', b'xxxx', b'xx', b'']
+    assert fake_s3.bodies[0].closed
+
+
+def test_head(client):
+    "HEAD requests have no body"
+    response = asyncio.run(client.request('HEAD', '/python?version=3.10&platform=macOS'))
+    assert response.status == 302
+    assert response.body == b''
+
+
+def test_stream_head(client, fake_s3):
+    "HEAD requests for a streamed support package only read its metadata"
+    fake_s3.objects[MACOS_KEY] = b'x' * 10
+    response = asyncio.run(client.request('HEAD', '/python?version=3.10&platform=macOS&stream=1'))
+
+    assert response.status == 200
+    assert response.headers['content-length'] == '10'
+    assert response.body == b''
+    assert fake_s3.calls == [('head_object', 'briefcase-support', MACOS_KEY)]
+
+
+def test_delegated(client):
+    "Other requests are handled by Flask"
+    response = asyncio.run(client.request(
+        'POST',
+        '/python/batch',
+        headers={'Content-Type': 'application/json'},
+        body=b'[{"version": "3.10", "platform": "windows"}]',
+    ))
+    assert response.status == 200
+    assert b'python-3.10.7-embed-amd64.zip' in response.body
+
+    assert client.get('/missing').status == 404
+
+
+def test_metrics(client):
+    "Requests are counted"
+    client.get('/python?version=3.10&platform=macOS')
+
+    text = client.get('/metrics').body.decode('utf-8')
+    assert 'skep_requests_total{platform="macOS",version="3.10",status="302"} 1' in text
+
+
+def test_concurrent(fake_s3):
+    "Blocking S3 work runs in a bounded pool, without blocking the event loop"
+    lock = threading.Lock()
+    running = []
+    peak = []
+    original = fake_s3.generate_presigned_url
+
+    def slow_presigned_url(*args, **kwargs):
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.1)
+        with lock:
+            running.pop()
+        return original(*args, **kwargs)
+    fake_s3.generate_presigned_url = slow_presigned_url
+
+    app = ASGIApp(create_app({'TESTING': True, 'PRESIGNED_URL_CACHE_SIZE': 0}), max_workers=4)
+    client = ASGIClient(app)
+
+    async def burst():
+        signed = [
+            # Different revisions, so the signatures can't be shared.
+            asyncio.ensure_future(client.request('GET', f'/python?version=3.10&platform=macOS&revision={i}'))
+            for i in range(8)
+        ]
+        # The landing page is served while the signing is in progress.
+        home = await client.request('GET', '/')
+        assert not any(request.done() for request in signed)
+        return home, await asyncio.gather(*signed)
+
+    start = time.perf_counter()
+    home, responses = asyncio.run(burst())
+    elapsed = time.perf_counter() - start
+
+    assert home.status == 200
+    assert [response.status for response in responses] == [302] * 8
+    # 8 signatures, 4 at a time.
+    assert max(peak) == 4
+    assert 0.2 <= elapsed < 0.6
+
+
+def test_load_shed(fake_s3):
+    "Requests beyond the concurrency limit are shed without waiting for the thread pool"
+    original = fake_s3.generate_presigned_url
+
+    def slow_presigned_url(*args, **kwargs):
+        time.sleep(0.1)
+        return original(*args, **kwargs)
+    fake_s3.generate_presigned_url = slow_presigned_url
+
+    app = ASGIApp(create_app({
+        'TESTING': True,
+        'PRESIGNED_URL_CACHE_SIZE': 0,
+        'MAX_CONCURRENT_REQUESTS': 2,
+    }), max_workers=1)
+    client = ASGIClient(app)
+
+    async def burst():
+        return await asyncio.gather(*(
+            client.request('GET', f'/python?version=3.10&platform=macOS&revision={i}')
+            for i in range(4)
+        ))
+
+    responses = asyncio.run(burst())
+
+    assert sorted(response.status for response in responses) == [302, 302, 503, 503]
+    assert app.app.extensions['concurrency_limit'].active == 0
+
+
+def test_stream_held(fake_s3):
+    "A streamed support package counts against the concurrency limit until it has been sent"
+    fake_s3.objects[MACOS_KEY] = b'x' * 10
+    app = ASGIApp(create_app({'TESTING': True, 'STREAMING_CHUNK_SIZE': 4, 'MAX_CONCURRENT_REQUESTS': 1}))
+    limit = app.app.extensions['concurrency_limit']
+    active = []
+    get_object = fake_s3.get_object
+
+    def recording_get_object(*args, **kwargs):
+        obj = get_object(*args, **kwargs)
+        read = obj['Body'].read
+
+        def recording_read(size=-1):
+            active.append(limit.active)
+            return read(size)
+        obj['Body'].read = recording_read
+        return obj
+    fake_s3.get_object = recording_get_object
+
+    response = ASGIClient(app).get('/python?version=3.10&platform=macOS&stream=1')
+
+    assert response.body == b'x' * 10
+    assert set(active) == {1}
+    assert limit.active == 0
+
+
+def test_lifespan(fake_s3):
+    "The thread pool is shut down with the server"
+    app = ASGIApp(create_app({'TESTING': True}))
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app({'type': 'lifespan'}, receive, send))
+
+    assert sent == [{'type': 'lifespan.startup.complete'}, {'type': 'lifespan.shutdown.complete'}]
+    with pytest.raises(RuntimeError):
+        app.executor.submit(print)
+
+
+def test_wsgi_environ():
+    "Headers are translated into a WSGI environ"
+    environ = wsgi_environ(
+        {
+            'method': 'GET',
+            'path': '/python',
+            'query_string': b'version=3.10',
+            'headers': [
+                (b'content-type', b'text/plain'),
+                (b'accept-encoding', b'gzip'),
+                (b'x-multi', b'a'),
+                (b'x-multi', b'b'),
+            ],
+        },
+        b'',
+    )
+
+    assert environ['QUERY_STRING'] == 'version=3.10'
+    assert environ['CONTENT_TYPE'] == 'text/plain'
+    assert environ['HTTP_ACCEPT_ENCODING'] == 'gzip'
+    assert environ['HTTP_X_MULTI'] == 'a,b'
+    assert environ['SERVER_NAME'] == 'localhost'
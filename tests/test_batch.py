@@ -0,0 +1,183 @@
+from unittest import mock
+
+import boto3
+
+from skep import platforms
+
+
+def test_batch(test_client, fake_s3):
+    "Many support packages can be resolved in one request"
+    response = test_client.post('/python/batch', json=[
+        {'version': '3.10', 'platform': 'iOS'},
+        {'version': '3.10', 'platform': 'macOS', 'revision': '2'},
+        {'version': '3.10', 'platform': 'android'},
+        {'version': '3.10', 'platform': 'linux', 'arch': 'x86_64'},
+        {'version': '3.10', 'platform': 'windows'},
+        {'version': '3.10', 'platform': 'windows', 'arch': 'win32', 'revision': '4'},
+    ])
+
+    assert response.status_code == 200
+    assert response.json == [
+        {
+            'version': '3.10',
+            'platform': 'iOS',
+            'arch': None,
+            'revision': None,
+            'status': 200,
+            'url': 'https://briefcase-support.s3.amazonaws.com/'
+                   'python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz?Expires=60',
+        },
+        {
+            'version': '3.10',
+            'platform': 'macOS',
+            'arch': None,
+            'revision': '2',
+            'status': 200,
+            'url': 'https://briefcase-support.s3.amazonaws.com/'
+                   'python/3.10/macOS/Python-3.10-macOS-support.b2.tar.gz?Expires=60',
+        },
+        {
+            'version': '3.10',
+            'platform': 'android',
+            'arch': None,
+            'revision': None,
+            'status': 200,
+            'url': 'https://briefcase-support.s3.amazonaws.com/'
+                   'python/3.10/android/Python-3.10-Android-support.b2.zip?Expires=60',
+        },
+        {
+            'version': '3.10',
+            'platform': 'linux',
+            'arch': 'x86_64',
+            'revision': None,
+            'status': 200,
+            'url': 'https://briefcase-support.s3.amazonaws.com/'
+                   'python/3.10/linux/x86_64/Python-3.10-linux-x86_64-support.b3.tar.gz?Expires=60',
+        },
+        {
+            'version': '3.10',
+            'platform': 'windows',
+            'arch': None,
+            'revision': None,
+            'status': 200,
+            'url': 'https://www.python.org/ftp/python/3.10.7/python-3.10.7-embed-amd64.zip',
+        },
+        {
+            'version': '3.10',
+            'platform': 'windows',
+            'arch': 'win32',
+            'revision': '4',
+            'status': 200,
+            'url': 'https://www.python.org/ftp/python/3.10.4/python-3.10.4-embed-win32.zip',
+        },
+    ]
+
+
+def test_batch_mixed_results(test_client, fake_s3):
+    "Each item in a batch succeeds or fails independently"
+    response = test_client.post('/python/batch', json=[
+        {'version': '3.10', 'platform': 'iOS'},
+        {'version': '2.7', 'platform': 'iOS'},
+        {'version': '3.10', 'platform': 'linux'},
+        {'version': '2.7', 'platform': 'windows'},
+        {'platform': 'iOS'},
+        {'version': '3.10'},
+        'iOS',
+    ])
+
+    assert response.status_code == 200
+    assert [(item['status'], item.get('error')) for item in response.json] == [
+        (200, None),
+        (404, 'No support package found'),
+        (404, 'No support package found'),
+        (404, 'No support package found'),
+        (400, 'No Python version requested'),
+        (400, 'No platform requested'),
+        (400, 'Expected a support package request'),
+    ]
+
+
+def test_batch_not_strings(test_client, fake_s3):
+    "Values that aren't strings are rejected, rather than converted"
+    response = test_client.post('/python/batch', json=[
+        {'version': 3.10, 'platform': 'iOS'},
+        {'version': '3.10', 'platform': 'macOS', 'revision': True},
+        {'version': '3.10', 'platform': 'macOS', 'revision': 2},
+        {'version': '3.10', 'platform': 'iOS', 'arch': None},
+    ])
+
+    assert [(item['status'], item.get('error')) for item in response.json] == [
+        (400, 'Expected version to be a string'),
+        (400, 'Expected revision to be a string'),
+        (400, 'Expected revision to be a string'),
+        (200, None),
+    ]
+    assert [call for call in fake_s3.calls if call[0] == 'generate_presigned_url'] == [
+        ('generate_presigned_url', 'briefcase-support', 'python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz'),
+    ]
+
+
+def test_batch_shared_client(test_client, monkeypatch):
+    "All S3 URLs in a batch are signed with a single client"
+    mock_s3_client = mock.MagicMock()
+    monkeypatch.setattr(boto3, 'client', mock_s3_client)
+    mock_support_url = mock.MagicMock(return_value='https://example.com/support_file.tar.gz')
+    monkeypatch.setattr(platforms, 'support_url', mock_support_url)
+
+    response = test_client.post('/python/batch', json=[
+        {'version': version, 'platform': platform}
+        for version in ['3.8', '3.9', '3.10']
+        for platform in ['iOS', 'macOS', 'android']
+    ])
+
+    assert response.status_code == 200
+    assert mock_s3_client.call_count == 1
+    assert mock_support_url.call_count == 9
+    assert len({call.args[0] for call in mock_support_url.call_args_list}) == 1
+
+
+def test_batch_windows_only(test_client, monkeypatch):
+    "A batch of Windows packages doesn't need an S3 client"
+    mock_s3_client = mock.MagicMock()
+    monkeypatch.setattr(boto3, 'client', mock_s3_client)
+
+    response = test_client.post('/python/batch', json=[
+        {'version': '3.9', 'platform': 'windows'},
+        {'version': '3.10', 'platform': 'windows'},
+    ])
+
+    assert [item['status'] for item in response.json] == [200, 200]
+    mock_s3_client.assert_not_called()
+
+
+def test_batch_signing_failure(test_client, monkeypatch):
+    "If a URL can't be signed, the item reports a 502"
+    monkeypatch.setattr(platforms, 'support_url', mock.MagicMock(side_effect=RuntimeError))
+    monkeypatch.setattr(boto3, 'client', mock.MagicMock())
+
+    response = test_client.post('/python/batch', json=[{'version': '3.10', 'platform': 'iOS'}])
+
+    assert response.json[0]['status'] == 502
+
+
+def test_batch_not_a_list(test_client):
+    "A batch must be a JSON list"
+    response = test_client.post('/python/batch', json={'version': '3.10', 'platform': 'iOS'})
+
+    assert response.status_code == 400
+    assert b'Expected a JSON list of support package requests' in response.data
+
+
+def test_batch_not_json(test_client):
+    "A batch must be JSON"
+    response = test_client.post('/python/batch', data='version=3.10')
+
+    assert response.status_code == 400
+
+
+def test_batch_too_large(test_client):
+    "Batches are limited in size"
+    response = test_client.post('/python/batch', json=[{'version': '3.10', 'platform': 'windows'}] * 101)
+
+    assert response.status_code == 400
+    assert b'No more than 100 support packages can be requested at once' in response.data
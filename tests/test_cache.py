@@ -0,0 +1,134 @@
+from unittest import mock
+
+from skep.cache import NegativeCache, PresignedURLCache
+from skep.skep import create_app
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_hit():
+    "A URL with enough validity left is served from the cache"
+    clock = FakeClock()
+    cache = PresignedURLCache(maxsize=4, margin=20, clock=clock)
+    sign = mock.MagicMock(return_value='https://example.com/signed')
+
+    assert cache.get('key', 60, sign) == 'https://example.com/signed'
+    clock.now += 40
+    assert cache.get('key', 60, sign) == 'https://example.com/signed'
+
+    assert sign.call_count == 1
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 0}
+
+
+def test_cache_resign_near_expiry():
+    "A URL inside the safety margin is re-signed"
+    clock = FakeClock()
+    cache = PresignedURLCache(maxsize=4, margin=20, clock=clock)
+    sign = mock.MagicMock(side_effect=['https://example.com/first', 'https://example.com/second'])
+
+    assert cache.get('key', 60, sign) == 'https://example.com/first'
+    clock.now += 41
+    assert cache.get('key', 60, sign) == 'https://example.com/second'
+    # The new URL is then cached.
+    assert cache.get('key', 60, sign) == 'https://example.com/second'
+
+    assert sign.call_count == 2
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 2, 'evictions': 0, 'expirations': 1}
+
+
+def test_cache_time_bucket():
+    "With time buckets, a URL is only served in the bucket it was signed in"
+    clock = FakeClock(now=1200.0)
+    cache = PresignedURLCache(maxsize=4, margin=20, time_bucket=300, clock=clock)
+    sign = mock.MagicMock(side_effect=['https://example.com/first', 'https://example.com/second'])
+
+    assert cache.get('key', 3600, sign) == 'https://example.com/first'
+    clock.now += 299
+    assert cache.get('key', 3600, sign) == 'https://example.com/first'
+    clock.now += 1
+    assert cache.get('key', 3600, sign) == 'https://example.com/second'
+
+    assert sign.call_count == 2
+
+
+def test_cache_lru_eviction():
+    "When the cache is full, the least recently used URL is evicted"
+    cache = PresignedURLCache(maxsize=2, margin=20, clock=FakeClock())
+
+    cache.get('a', 60, lambda: 'https://example.com/a')
+    cache.get('b', 60, lambda: 'https://example.com/b')
+    # Touch 'a', so 'b' is the least recently used
+    cache.get('a', 60, lambda: 'https://example.com/new-a')
+    cache.get('c', 60, lambda: 'https://example.com/c')
+
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert cache.get('a', 60, lambda: 'https://example.com/new-a') == 'https://example.com/a'
+    assert cache.get('b', 60, lambda: 'https://example.com/new-b') == 'https://example.com/new-b'
+
+
+def test_caching_presigner():
+    "A bound cache signs each bucket/key pair once"
+    s3 = mock.MagicMock()
+    s3.generate_presigned_url.side_effect = lambda method, Params, ExpiresIn: f"https://{Params['Key']}"
+    presigner = PresignedURLCache(clock=FakeClock()).bind(s3)
+
+    for i in range(5):
+        assert presigner.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': 'briefcase-support', 'Key': 'first'},
+            ExpiresIn=60,
+        ) == 'https://first'
+        assert presigner.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': 'briefcase-support', 'Key': 'second'},
+            ExpiresIn=60,
+        ) == 'https://second'
+
+    assert s3.generate_presigned_url.call_count == 2
+    s3.generate_presigned_url.assert_called_with(
+        'get_object',
+        Params={'Bucket': 'briefcase-support', 'Key': 'second'},
+        ExpiresIn=60,
+    )
+
+
+def test_cache_disabled():
+    "The presigned URL cache can be disabled"
+    app = create_app({'TESTING': True, 'PRESIGNED_URL_CACHE_SIZE': 0})
+
+    assert app.extensions['presigned_url_cache'] is None
+
+
+def test_negative_cache_expiry():
+    "Negative results are forgotten after their TTL"
+    clock = FakeClock()
+    cache = NegativeCache(maxsize=4, ttl=60, clock=clock)
+
+    cache.add('bad')
+    assert 'bad' in cache
+    assert 'other' not in cache
+
+    clock.now += 60
+    assert 'bad' not in cache
+    assert len(cache) == 0
+    assert cache.hits == 1
+
+
+def test_negative_cache_bounded():
+    "The negative cache is bounded in size"
+    cache = NegativeCache(maxsize=2, ttl=60, clock=FakeClock())
+
+    cache.add('a')
+    cache.add('b')
+    cache.add('c')
+
+    assert len(cache) == 2
+    assert 'a' not in cache
+    assert 'c' in cache
@@ -0,0 +1,282 @@
+import os
+import threading
+import time
+
+import pytest
+
+from skep.diskcache import SupportPackageCache
+from skep.skep import create_app
+
+KEY = 'python/3.10/macOS/Python-3.10-macOS-support.b3.tar.gz'
+
+
+def writer(data):
+    def fill(f):
+        f.write(data)
+    return fill
+
+
+def cached(cache, key, fill):
+    "The path of the cached file for ``key``."
+    with cache.open(key, fill) as f:
+        return f.name
+
+
+def test_miss_then_hit(tmp_path):
+    "A file is filled on a miss, and served from disk on a hit"
+    cache = SupportPackageCache(tmp_path, max_bytes=1000)
+    calls = []
+
+    def fill(f):
+        calls.append(f)
+        f.write(b'support package')
+
+    first = cached(cache, KEY, fill)
+    second = cached(cache, KEY, fill)
+
+    assert first == second
+    assert os.path.basename(first).endswith('-Python-3.10-macOS-support.b3.tar.gz')
+    with open(first, 'rb') as f:
+        assert f.read() == b'support package'
+    assert len(calls) == 1
+    assert cache.stats() == {
+        'size': 15,
+        'files': 1,
+        'hits': 1,
+        'misses': 1,
+        'evictions': 0,
+        'hit_ratio': 0.5,
+    }
+
+
+def test_lru_eviction_by_size(tmp_path):
+    "The least recently used files are evicted when the cache is too large"
+    cache = SupportPackageCache(tmp_path, max_bytes=250)
+
+    a = cached(cache, 'a', writer(b'a' * 100))
+    b = cached(cache, 'b', writer(b'b' * 100))
+    # Touch 'a', so 'b' is the least recently used
+    cached(cache, 'a', writer(b'x'))
+    c = cached(cache, 'c', writer(b'c' * 100))
+
+    assert os.path.exists(a)
+    assert not os.path.exists(b)
+    assert os.path.exists(c)
+    assert cache.size == 200
+    assert cache.evictions == 1
+
+
+def test_open_survives_eviction(tmp_path):
+    "A file that has been opened can be read after it is evicted"
+    cache = SupportPackageCache(tmp_path, max_bytes=150)
+
+    with cache.open('a', writer(b'a' * 100)) as f:
+        cached(cache, 'b', writer(b'b' * 100))
+        assert not os.path.exists(f.name)
+        assert f.read() == b'a' * 100
+
+
+def test_failed_fill(tmp_path):
+    "A failed fill leaves nothing behind"
+    cache = SupportPackageCache(tmp_path, max_bytes=1000)
+
+    def fill(f):
+        f.write(b'partial')
+        raise RuntimeError('download failed')
+
+    with pytest.raises(RuntimeError):
+        cached(cache, KEY, fill)
+
+    assert os.listdir(tmp_path) == []
+    assert cache.size == 0
+
+    # The next request tries again.
+    cached(cache, KEY, writer(b'support package'))
+    assert cache.size == 15
+
+
+def test_concurrent_fill(tmp_path):
+    "Concurrent misses for the same key only download once"
+    cache = SupportPackageCache(tmp_path, max_bytes=1000)
+    calls = []
+    barrier = threading.Barrier(8)
+    paths = []
+
+    def fill(f):
+        calls.append(f)
+        time.sleep(0.05)
+        f.write(b'support package')
+
+    def worker():
+        barrier.wait()
+        paths.append(cached(cache, KEY, fill))
+
+    threads = [threading.Thread(target=worker) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(set(paths)) == 1
+    assert cache.misses == 1
+    assert cache.hits == 7
+
+
+def test_concurrent_failed_fill(tmp_path):
+    "After a failed fill, waiting and newly arriving requests don't fill concurrently"
+    cache = SupportPackageCache(tmp_path, max_bytes=1000)
+    filling = threading.Event()
+    failed = threading.Event()
+    active = []
+    calls = []
+
+    def fill(f):
+        calls.append(f)
+        active.append(f)
+        try:
+            if len(calls) == 1:
+                filling.set()
+                assert failed.wait(10)
+                raise RuntimeError('download failed')
+            time.sleep(0.05)
+            assert active == [f]
+            f.write(b'support package')
+        finally:
+            active.remove(f)
+
+    def worker():
+        try:
+            with cache.open(KEY, fill):
+                pass
+        except RuntimeError:
+            pass
+
+    first = threading.Thread(target=worker)
+    first.start()
+    assert filling.wait(10)
+    # One request waits on the failing fill; another arrives after it fails.
+    waiting = threading.Thread(target=worker)
+    waiting.start()
+    while cache._fills[cache.filename(KEY)].waiters != 2:
+        time.sleep(0.001)
+    failed.set()
+    first.join()
+    arriving = threading.Thread(target=worker)
+    arriving.start()
+    waiting.join()
+    arriving.join()
+
+    assert len(calls) == 2
+    assert cache.stats()['size'] == 15
+    assert cache.misses == 2
+    assert cache._fills == {}
+
+
+def test_existing_files_adopted(tmp_path):
+    "Files cached by a previous process are reused; partial fills are discarded"
+    cache = SupportPackageCache(tmp_path, max_bytes=1000)
+    cached(cache, KEY, writer(b'support package'))
+    (tmp_path / '.tmp-interrupted').write_bytes(b'partial')
+
+    cache = SupportPackageCache(tmp_path, max_bytes=1000)
+    path = cached(cache, KEY, writer(b'other'))
+
+    with open(path, 'rb') as f:
+        assert f.read() == b'support package'
+    assert not (tmp_path / '.tmp-interrupted').exists()
+    assert cache.stats()['hits'] == 1
+
+
+@pytest.fixture
+def cached_app(fake_s3, tmp_path):
+    fake_s3.objects[KEY] = bytes(range(256)) * 100
+    return create_app({
+        'TESTING': True,
+        'STREAMING': True,
+        'DISK_CACHE_DIR': str(tmp_path),
+        'DISK_CACHE_MAX_BYTES': 1024 * 1024,
+    })
+
+
+def test_app_serves_from_disk(cached_app, fake_s3):
+    "Streamed packages are downloaded from the store once, then served from disk"
+    test_client = cached_app.test_client()
+
+    for i in range(3):
+        response = test_client.get('/python?version=3.10&platform=macOS')
+        assert response.status_code == 200
+        assert response.data == bytes(range(256)) * 100
+        assert response.mimetype == 'application/gzip'
+        assert response.headers['Content-Disposition'] == (
+            'attachment; filename=Python-3.10-macOS-support.b3.tar.gz'
+        )
+        response.close()
+
+    assert fake_s3.calls == [('get_object', 'briefcase-support', KEY)]
+    assert cached_app.extensions['disk_cache'].stats()['hits'] == 2
+
+    # The cached file can be revalidated.
+    etag = response.headers['ETag']
+    response = test_client.get('/python?version=3.10&platform=macOS', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    response.close()
+
+
+def test_app_range_from_disk(cached_app, fake_s3):
+    "Ranges are served from the cached file"
+    test_client = cached_app.test_client()
+
+    response = test_client.get('/python?version=3.10&platform=macOS', headers={'Range': 'bytes=10-19'})
+
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == 'bytes 10-19/25600'
+    assert response.data == bytes(range(10, 20))
+    response.close()
+
+
+def test_app_multi_range(cached_app, fake_s3):
+    "Multiple ranges are read from the store"
+    test_client = cached_app.test_client()
+
+    response = test_client.get('/python?version=3.10&platform=macOS', headers={'Range': 'bytes=0-9,20-29'})
+
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    assert bytes(range(10)) in response.data
+    assert bytes(range(20, 30)) in response.data
+    assert fake_s3.calls[0] == ('head_object', 'briefcase-support', KEY)
+
+
+@pytest.mark.parametrize('fast_path', [False, True], ids=['flask', 'fast_path'])
+def test_app_evicted_while_serving(fake_s3, tmp_path, fast_path):
+    "A cached file can be served after it has been evicted"
+    fake_s3.objects[KEY] = b'a' * 100
+    fake_s3.objects['python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz'] = b'b' * 100
+    app = create_app({
+        'TESTING': True,
+        'STREAMING': True,
+        'WSGI_FAST_PATH': fast_path,
+        'DISK_CACHE_DIR': str(tmp_path),
+        'DISK_CACHE_MAX_BYTES': 150,
+    })
+    test_client = app.test_client()
+
+    response = test_client.get('/python?version=3.10&platform=macOS', buffered=False)
+    test_client.get('/python?version=3.10&platform=iOS').close()
+
+    assert app.extensions['disk_cache'].evictions == 1
+    assert response.status_code == 200
+    assert response.headers['Content-Length'] == '100'
+    assert response.get_data() == b'a' * 100
+    response.close()
+
+
+def test_app_missing_object(cached_app, fake_s3):
+    "If the package isn't in the store, a 404 is returned, and nothing is cached"
+    test_client = cached_app.test_client()
+
+    response = test_client.get('/python?version=3.9&platform=macOS')
+
+    assert response.status_code == 404
+    assert cached_app.extensions['disk_cache'].size == 0
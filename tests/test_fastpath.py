@@ -0,0 +1,124 @@
+from unittest import mock
+
+import pytest
+
+from skep import platforms
+from skep.skep import create_app
+
+QUERIES = [
+    '',
+    '?version=3.10',
+    '?version=3.10&platform=iOS',
+    '?version=3.10&platform=iOS&revision=2',
+    '?version=3.10&platform=linux&arch=x86_64',
+    '?version=3.10&platform=windows',
+    '?version=3.10&platform=windows&arch=arm64&revision=7.post1',
+    '?version=3.4&platform=iOS',
+    '?version=3.10&platform=tvOS',
+    '?version=3.10&platform=macOS&stream=1',
+]
+
+
+def headers(response):
+    # Expires depends on the time of the request.
+    return sorted((name, value) for name, value in response.headers.items() if name != 'Expires')
+
+
+@pytest.fixture
+def apps(fake_s3):
+    return (
+        create_app({'TESTING': True}),
+        create_app({'TESTING': True, 'WSGI_FAST_PATH': True}),
+    )
+
+
+@pytest.mark.parametrize('query', QUERIES)
+@pytest.mark.parametrize('method', ['GET', 'HEAD'])
+def test_matches_flask(apps, method, query):
+    "Responses from the fast path are the same as those from Flask"
+    flask_app, fast_app = apps
+
+    expected = flask_app.test_client().open(f'/python{query}', method=method)
+    response = fast_app.test_client().open(f'/python{query}', method=method)
+
+    assert response.status_code == expected.status_code
+    assert headers(response) == headers(expected)
+    assert response.data == expected.data
+
+
+def test_bypasses_flask(fake_s3):
+    "Requests for /python skip Flask's request handling"
+    app = create_app({'TESTING': True, 'WSGI_FAST_PATH': True})
+    before_request = mock.MagicMock(return_value=None)
+    app.before_request(before_request)
+    client = app.test_client()
+
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 302
+    before_request.assert_not_called()
+
+    # Everything else is handled by Flask.
+    assert client.get('/').status_code == 200
+    assert client.get('/python/').status_code == 404
+    assert client.post('/python?version=3.10&platform=iOS').status_code == 405
+    assert before_request.call_count == 3
+
+
+def test_metrics(fake_s3):
+    "Requests served by the fast path are counted"
+    app = create_app({'TESTING': True, 'WSGI_FAST_PATH': True})
+    client = app.test_client()
+    client.get('/python?version=3.10&platform=iOS')
+    client.get('/python?version=3.4&platform=iOS')
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'skep_requests_total{platform="iOS",version="3.10",status="302"} 1' in text
+    assert 'skep_requests_total{platform="iOS",version="other",status="404"} 1' in text
+    assert 'skep_request_phase_seconds_count{phase="sign"} 1' in text
+
+
+def test_bad_gateway(fake_s3, monkeypatch):
+    "A failure to produce a URL is a 502"
+    monkeypatch.setattr(platforms, 'support_url', mock.MagicMock(side_effect=RuntimeError))
+    app = create_app({'TESTING': True, 'WSGI_FAST_PATH': True})
+    client = app.test_client()
+
+    response = client.get('/python?version=3.10&platform=iOS')
+
+    assert response.status_code == 502
+    assert 'skep_requests_total{platform="iOS",version="3.10",status="502"} 1' in (
+        client.get('/metrics').get_data(as_text=True)
+    )
+
+
+def test_unexpected_error(fake_s3, monkeypatch):
+    "Unexpected errors are logged and reported as a 500, as Flask would"
+    monkeypatch.setattr(platforms, 'support_url', mock.MagicMock(side_effect=KeyError))
+    app = create_app({'WSGI_FAST_PATH': True})
+
+    with mock.patch.object(app.logger, 'exception') as log_exception:
+        response = app.test_client().get('/python?version=3.10&platform=iOS')
+
+    assert response.status_code == 500
+    log_exception.assert_called_once_with('Exception on /python [GET]')
+
+
+def test_unexpected_error_testing(fake_s3, monkeypatch):
+    "When testing, unexpected errors are propagated"
+    monkeypatch.setattr(platforms, 'support_url', mock.MagicMock(side_effect=KeyError))
+    app = create_app({'TESTING': True, 'WSGI_FAST_PATH': True})
+
+    with pytest.raises(KeyError):
+        app.test_client().get('/python?version=3.10&platform=iOS')
+
+
+def test_profiling(fake_s3, tmp_path):
+    "Requests served by the fast path can be profiled"
+    app = create_app({
+        'TESTING': True,
+        'WSGI_FAST_PATH': True,
+        'PROFILE_RATE': 1.0,
+        'PROFILE_DIR': str(tmp_path),
+    })
+
+    assert app.test_client().get('/python?version=3.10&platform=iOS').status_code == 302
+    assert app.extensions['profiler'].samples == {'support_package': 1}
@@ -0,0 +1,112 @@
+import time
+from unittest import mock
+
+import pytest
+
+from skep import platforms
+from skep.headers import presigned_url_expiry, redirect_etag, redirect_max_age
+
+SIGV4_URL = (
+    'https://briefcase-support.s3.amazonaws.com/python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz'
+    '?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Credential=AKIDEXAMPLE%2F20220501%2Fus-west-2%2Fs3%2Faws4_request'
+    '&X-Amz-Date=20220501T120000Z&X-Amz-Expires=60&X-Amz-SignedHeaders=host&X-Amz-Signature=abc123'
+)
+SIGV2_URL = (
+    'https://briefcase-support.s3.amazonaws.com/python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz'
+    '?AWSAccessKeyId=AKIDEXAMPLE&Signature=abc123&Expires=1651406460'
+)
+
+
+@pytest.mark.parametrize(
+    "url, expiry",
+    [
+        (SIGV4_URL, 1651406460),
+        (SIGV2_URL, 1651406460),
+        ('https://www.python.org/ftp/python/3.7.9/python-3.7.9-embed-amd64.zip', None),
+        ('https://example.com/object.zip?Expires=soon', None),
+    ]
+)
+def test_presigned_url_expiry(url, expiry):
+    "The expiry time of a presigned URL can be determined"
+    assert presigned_url_expiry(url) == expiry
+
+
+@pytest.mark.parametrize(
+    "now, max_age",
+    [
+        (1651406400, 55),
+        (1651406450, 5),
+        (1651406456, 0),
+        (1651406500, 0),
+    ]
+)
+def test_redirect_max_age(now, max_age):
+    "A redirect can be cached until just before the signature expires"
+    assert redirect_max_age(SIGV4_URL, margin=5, now=now) == max_age
+
+
+def test_redirect_max_age_unsigned():
+    "A URL without an expiry can't be cached"
+    assert redirect_max_age('https://example.com/object.zip', margin=5) == 0
+
+
+def test_windows_redirect_cacheable(test_client):
+    "Windows redirects can be cached for a long time"
+    response = test_client.get('/python?version=3.7&platform=windows')
+
+    assert response.status_code == 302
+    assert response.location == 'https://www.python.org/ftp/python/3.7.9/python-3.7.9-embed-amd64.zip'
+    assert response.headers['Cache-Control'] == 'public, max-age=2592000'
+    assert response.headers['ETag'] == f'"{redirect_etag(response.location)}"'
+    assert response.expires.timestamp() == pytest.approx(time.time() + 2592000, abs=5)
+
+
+def test_windows_redirect_not_modified(test_client):
+    "If the client holds the current redirect, a 304 is returned"
+    url = 'https://www.python.org/ftp/python/3.7.9/python-3.7.9-embed-amd64.zip'
+    response = test_client.get(
+        '/python?version=3.7&platform=windows',
+        headers={'If-None-Match': f'"{redirect_etag(url)}"'},
+    )
+
+    assert response.status_code == 304
+    assert 'Location' not in response.headers
+    assert response.headers['Cache-Control'] == 'public, max-age=2592000'
+    assert response.headers['ETag'] == f'"{redirect_etag(url)}"'
+
+
+def test_windows_redirect_modified(test_client):
+    "If the client holds a different redirect, the redirect is returned"
+    response = test_client.get(
+        '/python?version=3.7&platform=windows',
+        headers={'If-None-Match': '"stale"'},
+    )
+
+    assert response.status_code == 302
+
+
+def test_support_redirect_cacheable(test_client, monkeypatch):
+    "S3 redirects can be cached until just before the signature expires"
+    url = f'https://briefcase-support.s3.amazonaws.com/support.tar.gz?Expires={int(time.time()) + 60}'
+    monkeypatch.setattr(platforms, 'support_url', mock.MagicMock(return_value=url))
+
+    response = test_client.get('/python?version=3.7&platform=linux&arch=x86_64')
+
+    assert response.status_code == 302
+    assert response.cache_control.public
+    assert 50 <= response.cache_control.max_age <= 55
+    assert response.headers['ETag'] == f'"{redirect_etag(url)}"'
+
+
+def test_support_redirect_unknown_expiry(test_client, monkeypatch):
+    "If the lifetime of the URL isn't known, the redirect isn't cached"
+    monkeypatch.setattr(
+        platforms,
+        'support_url',
+        mock.MagicMock(return_value='https://example.com/support_file.tar.gz'),
+    )
+
+    response = test_client.get('/python?version=3.7&platform=linux&arch=x86_64')
+
+    assert response.status_code == 302
+    assert response.headers['Cache-Control'] == 'no-cache'
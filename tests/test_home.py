@@ -1,5 +1,78 @@
+import gzip
+
+import pytest
+
+from skep import pages
+from skep.pages import PrecompressedPage
+from skep.skep import LANDING_PAGE
+
 
 def test_home(test_client):
     "The home page can be retrieved."
     response = test_client.get('/')
     assert response.status_code == 200
+    assert response.data == LANDING_PAGE.encode('utf-8')
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['Cache-Control'] == 'public, max-age=3600'
+    etag, weak = response.get_etag()
+    assert not weak
+
+
+def test_home_gzip(test_client):
+    "The home page is served gzipped to clients that accept it"
+    response = test_client.get('/', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.data) == LANDING_PAGE.encode('utf-8')
+    # Each encoding has its own strong ETag.
+    assert response.get_etag()[0] != test_client.get('/').get_etag()[0]
+
+
+def test_home_brotli(test_client):
+    "The home page is served brotli-compressed to clients that accept it"
+    brotli = pytest.importorskip('brotli')
+    response = test_client.get('/', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == LANDING_PAGE.encode('utf-8')
+
+
+def test_home_no_brotli(monkeypatch):
+    "If brotli isn't installed, gzip is used instead"
+    monkeypatch.setattr(pages, 'brotli', None)
+    page = PrecompressedPage('<html></html>')
+
+    assert set(page.variants) == {'identity', 'gzip'}
+    assert page.encodings == ['gzip', 'identity']
+
+
+def test_home_not_modified(test_client):
+    "A client holding the current page gets a 304"
+    etag = test_client.get('/', headers={'Accept-Encoding': 'gzip'}).get_etag()[0]
+
+    response = test_client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.get_etag() == (etag, False)
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['Cache-Control'] == 'public, max-age=3600'
+
+
+def test_home_modified(test_client):
+    "A client holding a different encoding or an old page gets the full page"
+    etag = test_client.get('/', headers={'Accept-Encoding': 'gzip'}).get_etag()[0]
+
+    response = test_client.get('/', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.data == LANDING_PAGE.encode('utf-8')
+
+    response = test_client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"stale"'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_gzip_stable():
+    "The gzipped variant is identical every time the page is built"
+    assert PrecompressedPage('<html></html>').variants['gzip'] == PrecompressedPage('<html></html>').variants['gzip']
@@ -0,0 +1,135 @@
+import threading
+from unittest import mock
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from skep.inventory import S3Inventory
+from skep.skep import create_app
+
+IOS_KEY = 'python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz'
+MACOS_KEY = 'python/3.10/macOS/Python-3.10-macOS-support.b3.tar.gz'
+
+
+@pytest.fixture
+def s3():
+    return boto3.client(
+        's3',
+        region_name='us-west-2',
+        aws_access_key_id='AKIDEXAMPLE',
+        aws_secret_access_key='secret',
+    )
+
+
+def stub_listing(stubber, *pages):
+    for i, keys in enumerate(pages):
+        expected = {'Bucket': 'briefcase-support', 'Prefix': 'python/'}
+        response = {
+            'Contents': [{'Key': key} for key in keys],
+            'IsTruncated': i < len(pages) - 1,
+        }
+        if i > 0:
+            expected['ContinuationToken'] = f'token-{i}'
+        if i < len(pages) - 1:
+            response['NextContinuationToken'] = f'token-{i + 1}'
+        stubber.add_response('list_objects_v2', response, expected)
+
+
+def test_refresh(s3):
+    "The inventory is built from a paginated listing of the bucket"
+    inventory = S3Inventory(s3, bucket='briefcase-support')
+
+    with Stubber(s3) as stubber:
+        stub_listing(stubber, [IOS_KEY], [MACOS_KEY])
+        inventory.refresh()
+        stubber.assert_no_pending_responses()
+
+    assert len(inventory) == 2
+    assert inventory.exists(IOS_KEY)
+    assert inventory.exists(MACOS_KEY)
+    assert not inventory.exists('python/3.10/iOS/Python-3.10-iOS-support.b99.tar.gz')
+
+
+def test_not_loaded(s3):
+    "Until the inventory has been loaded, every key is assumed to exist"
+    inventory = S3Inventory(s3, bucket='briefcase-support')
+
+    assert inventory.exists(IOS_KEY)
+
+
+def test_failed_refresh(s3):
+    "If a refresh fails, the previous index is retained"
+    inventory = S3Inventory(s3, bucket='briefcase-support')
+
+    with Stubber(s3) as stubber:
+        stub_listing(stubber, [IOS_KEY])
+        stubber.add_client_error('list_objects_v2', service_error_code='AccessDenied')
+        inventory.safe_refresh()
+        inventory.safe_refresh()
+
+    assert inventory.keys == {IOS_KEY}
+
+
+def test_background_refresh():
+    "The inventory can be refreshed in the background"
+    s3 = mock.MagicMock()
+    calls = []
+    refreshed = threading.Event()
+
+    def paginate(Bucket, Prefix):
+        calls.append(Prefix)
+        if len(calls) == 1:
+            return [{'Contents': [{'Key': IOS_KEY}]}]
+        refreshed.set()
+        return [{'Contents': [{'Key': IOS_KEY}, {'Key': MACOS_KEY}]}]
+
+    s3.get_paginator.return_value.paginate.side_effect = paginate
+    inventory = S3Inventory(s3, bucket='briefcase-support')
+
+    inventory.refresh()
+    assert not inventory.exists(MACOS_KEY)
+
+    inventory.start(0.01)
+    assert refreshed.wait(5)
+    inventory.stop()
+
+    assert inventory.exists(MACOS_KEY)
+
+
+@pytest.fixture
+def inventory_client(s3, monkeypatch):
+    monkeypatch.setattr(boto3, 'client', lambda *args, **kwargs: s3)
+    with Stubber(s3) as stubber:
+        stub_listing(stubber, [IOS_KEY, MACOS_KEY])
+        app = create_app({
+            'TESTING': True,
+            'S3_INVENTORY': True,
+            'S3_INVENTORY_REFRESH_INTERVAL': 0,
+        })
+        yield app.test_client()
+
+
+def test_app_known_key(inventory_client):
+    "A key in the inventory is signed"
+    response = inventory_client.get('/python?version=3.10&platform=iOS')
+
+    assert response.status_code == 302
+    assert response.location.startswith(f'https://briefcase-support.s3.amazonaws.com/{IOS_KEY}?')
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        'version=3.10&platform=iOS&revision=99',
+        'version=3.10&platform=android',
+        'version=3.10&platform=macOS&revision=99&stream=1',
+    ]
+)
+def test_app_unknown_key(inventory_client, s3, query):
+    "A key that isn't in the inventory is rejected without signing"
+    with mock.patch.object(s3, 'generate_presigned_url') as mock_sign:
+        response = inventory_client.get(f'/python?{query}')
+
+    assert response.status_code == 404
+    mock_sign.assert_not_called()
@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import json
+
+import boto3
+import pytest
+
+from skep import manifest
+from skep.skep import create_app
+from tests.fakes import FakeS3
+
+IOS_KEY = 'python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz'
+IOS_OLD_KEY = 'python/3.10/iOS/Python-3.10-iOS-support.b2.tar.gz'
+LINUX_KEY = 'python/3.10/linux/x86_64/Python-3.10-linux-x86_64-support.b3.tar.gz'
+WINDOWS_KEY = 'python/3.10/windows/python-3.10.7-embed-amd64.zip'
+
+
+@pytest.fixture
+def s3():
+    return FakeS3({
+        IOS_KEY: b'ios support' * 1000,
+        IOS_OLD_KEY: b'old ios support',
+        LINUX_KEY: b'linux support',
+        WINDOWS_KEY: b'windows embed',
+        'python/3.10/iOS/README.txt': b'not a support package',
+        'python/3.10/iOS/Python-3.10-iOS-support.bX.tar.gz': b'not a revision',
+    })
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_resolve_key():
+    "Keys are mapped back to the request that resolves to them"
+    assert manifest.resolve_key(IOS_KEY) == ('iOS', '3.10', None, '3')
+    assert manifest.resolve_key(LINUX_KEY) == ('linux', '3.10', 'x86_64', '3')
+    assert manifest.resolve_key(WINDOWS_KEY) == ('windows', '3.10', 'amd64', '7')
+    assert manifest.resolve_key('python/3.10/iOS/README.txt') is None
+    assert manifest.resolve_key('python/3.10/tvOS/Python-3.10-tvOS-support.b3.tar.gz') is None
+
+
+def test_hash_object(s3):
+    "Objects are hashed one chunk at a time"
+    assert manifest.hash_object(s3, 'briefcase-support', IOS_KEY, chunk_size=1000) == sha256(b'ios support' * 1000)
+    body = s3.bodies[0]
+    assert body.reads == [1000] * 12
+    assert body.closed
+
+
+def test_build(s3):
+    "Every resolvable support package is described"
+    result = manifest.build_manifest(s3, 'briefcase-support')
+
+    assert result == {
+        'bucket': 'briefcase-support',
+        'packages': [
+            {
+                'platform': 'iOS',
+                'version': '3.10',
+                'arch': None,
+                'revision': '2',
+                'default': False,
+                'key': IOS_OLD_KEY,
+                'size': 15,
+                'etag': s3._metadata(b'old ios support')['ETag'],
+                'sha256': sha256(b'old ios support'),
+            },
+            {
+                'platform': 'iOS',
+                'version': '3.10',
+                'arch': None,
+                'revision': '3',
+                'default': True,
+                'key': IOS_KEY,
+                'size': 11000,
+                'etag': s3._metadata(b'ios support' * 1000)['ETag'],
+                'sha256': sha256(b'ios support' * 1000),
+            },
+            {
+                'platform': 'linux',
+                'version': '3.10',
+                'arch': 'x86_64',
+                'revision': '3',
+                'default': True,
+                'key': LINUX_KEY,
+                'size': 13,
+                'etag': s3._metadata(b'linux support')['ETag'],
+                'sha256': sha256(b'linux support'),
+            },
+            {
+                'platform': 'windows',
+                'version': '3.10',
+                'arch': 'amd64',
+                'revision': '7',
+                'default': True,
+                'key': WINDOWS_KEY,
+                'size': 13,
+                'etag': s3._metadata(b'windows embed')['ETag'],
+                'sha256': sha256(b'windows embed'),
+            },
+        ],
+    }
+
+
+def test_build_incremental(s3):
+    "Objects that haven't changed aren't hashed again"
+    previous = manifest.build_manifest(s3, 'briefcase-support')
+    s3.objects[LINUX_KEY] = b'new linux support'
+    s3.calls.clear()
+
+    result = manifest.build_manifest(s3, 'briefcase-support', previous=previous)
+
+    assert [call for call in s3.calls if call[0] == 'get_object'] == [('get_object', 'briefcase-support', LINUX_KEY)]
+    assert result['packages'][2]['sha256'] == sha256(b'new linux support')
+    assert result['packages'][:2] == previous['packages'][:2]
+
+
+def test_write_and_read(s3, tmp_path):
+    "The manifest is written as compact, stable JSON"
+    path = str(tmp_path / 'manifest.json')
+    result = manifest.build_manifest(s3, 'briefcase-support')
+
+    manifest.write_manifest(result, path)
+    data = (tmp_path / 'manifest.json').read_bytes()
+
+    assert b' ' not in data
+    assert data == manifest.dumps(manifest.build_manifest(s3, 'briefcase-support'))
+    assert manifest.read_manifest(path) == result
+    assert manifest.read_manifest(str(tmp_path / 'missing.json')) is None
+    assert [path.name for path in tmp_path.iterdir()] == ['manifest.json']
+
+
+def test_main(s3, tmp_path, monkeypatch, capsys):
+    "The builder reuses the previous manifest"
+    monkeypatch.setattr(boto3, 'client', lambda *args, **kwargs: s3)
+    output = str(tmp_path / 'manifest.json')
+
+    assert manifest.main(['--output', output]) == 0
+    assert capsys.readouterr().out == f'4 support packages written to {output}\n'
+    s3.calls.clear()
+
+    assert manifest.main(['--output', output]) == 0
+    assert not [call for call in s3.calls if call[0] == 'get_object']
+
+
+@pytest.fixture
+def client(s3, tmp_path):
+    path = tmp_path / 'manifest.json'
+    manifest.write_manifest(manifest.build_manifest(s3, 'briefcase-support'), str(path))
+    app = create_app({
+        'TESTING': True,
+        'MANIFEST_PATH': str(path),
+    })
+    return app.test_client()
+
+
+def test_serve(client, tmp_path):
+    "The manifest is served with a strong ETag"
+    response = client.get('/python/manifest')
+
+    assert response.status_code == 200
+    assert response.content_type == 'application/json'
+    assert response.data == (tmp_path / 'manifest.json').read_bytes()
+    assert response.json['packages'][1]['key'] == IOS_KEY
+    assert response.headers['Cache-Control'] == 'public, max-age=300'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert not response.get_etag()[1]
+
+
+def test_serve_gzip(client, tmp_path):
+    "The manifest can be served compressed"
+    response = client.get('/python/manifest', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data)) == json.loads((tmp_path / 'manifest.json').read_bytes())
+
+
+def test_serve_not_modified(client):
+    "A client holding the current manifest gets a 304"
+    etag = client.get('/python/manifest').get_etag()[0]
+
+    response = client.get('/python/manifest', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    response = client.get('/python/manifest', headers={'If-None-Match': '"stale"'})
+    assert response.status_code == 200
+
+
+def test_serve_missing(tmp_path):
+    "If no manifest has been built, there is no manifest endpoint"
+    app = create_app({
+        'TESTING': True,
+        'MANIFEST_PATH': str(tmp_path / 'manifest.json'),
+    })
+
+    assert app.test_client().get('/python/manifest').status_code == 404
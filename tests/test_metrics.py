@@ -0,0 +1,180 @@
+import json
+import logging
+from unittest import mock
+
+import pytest
+
+from skep import platforms
+from skep.metrics import Metrics, RequestTimer, TimingPresigner
+from skep.skep import create_app
+
+
+@pytest.fixture
+def app(fake_s3):
+    return create_app({
+        'TESTING': True,
+    })
+
+
+def sample(text, line):
+    "Find the value of a sample in a Prometheus exposition"
+    for candidate in text.splitlines():
+        name, _, value = candidate.rpartition(' ')
+        if name == line:
+            return float(value)
+    raise AssertionError(f'{line} not found in metrics')
+
+
+def test_render_counters_and_histograms():
+    "Counters and histograms are rendered in the Prometheus text format"
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.inc('skep_requests_total', (('platform', 'iOS'), ('version', '3.10'), ('status', 302)))
+    metrics.inc('skep_requests_total', (('platform', 'iOS'), ('version', '3.10'), ('status', 302)))
+    metrics.observe('skep_request_duration_seconds', (('platform', 'iOS'),), 0.05)
+    metrics.observe('skep_request_duration_seconds', (('platform', 'iOS'),), 0.5)
+    metrics.observe('skep_request_duration_seconds', (('platform', 'iOS'),), 5)
+
+    assert metrics.render().splitlines() == [
+        '# HELP skep_request_duration_seconds Total time taken to serve a support package request.',
+        '# TYPE skep_request_duration_seconds histogram',
+        'skep_request_duration_seconds_bucket{platform="iOS",le="0.1"} 1',
+        'skep_request_duration_seconds_bucket{platform="iOS",le="1.0"} 2',
+        'skep_request_duration_seconds_bucket{platform="iOS",le="+Inf"} 3',
+        'skep_request_duration_seconds_sum{platform="iOS"} 5.55',
+        'skep_request_duration_seconds_count{platform="iOS"} 3',
+        '# HELP skep_requests_total Requests for support packages, by platform, version and status.',
+        '# TYPE skep_requests_total counter',
+        'skep_requests_total{platform="iOS",version="3.10",status="302"} 2',
+    ]
+
+
+def test_render_escapes_labels():
+    "Label values are escaped"
+    metrics = Metrics()
+    metrics.inc('skep_example', (('value', 'a"b\\c\n'),))
+
+    assert 'skep_example{value="a\\"b\\\\c\\n"} 1' in metrics.render()
+
+
+def test_collectors():
+    "Values maintained elsewhere are reported as gauges"
+    metrics = Metrics()
+    metrics.add_collector(lambda: [('skep_example_size', (), 3)])
+
+    assert metrics.render() == '# TYPE skep_example_size gauge\nskep_example_size 3\n'
+
+
+def test_timer_phases():
+    "Signing time is excluded from resolution, and the rest is overhead"
+    timer = RequestTimer()
+    timer.add('resolve', 0.003)
+    timer.add('sign', 0.002)
+    timer.start -= 0.01
+
+    total, phases = timer.finish()
+
+    assert total >= 0.01
+    assert phases['resolve'] == pytest.approx(0.001)
+    assert phases['sign'] == 0.002
+    assert phases['overhead'] == pytest.approx(total - 0.003)
+
+
+def test_timing_presigner():
+    "The time spent signing is recorded"
+    client = mock.MagicMock()
+    client.generate_presigned_url.return_value = 'https://example.com/signed'
+    timer = RequestTimer()
+
+    presigner = TimingPresigner(client, timer)
+    url = presigner.generate_presigned_url('get_object', Params={'Bucket': 'b', 'Key': 'k'}, ExpiresIn=60)
+
+    assert url == 'https://example.com/signed'
+    client.generate_presigned_url.assert_called_once_with(
+        'get_object',
+        Params={'Bucket': 'b', 'Key': 'k'},
+        ExpiresIn=60,
+    )
+    assert timer.phases['sign'] >= 0
+
+
+def test_metrics_endpoint(app, fake_s3):
+    "Support package requests are counted and timed"
+    client = app.test_client()
+    client.get('/python?version=3.10&platform=iOS')
+    client.get('/python?version=3.10&platform=iOS')
+    client.get('/python?version=3.4&platform=iOS')
+    client.get('/python?version=3.10&platform=ios')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type == 'text/plain; version=0.0.4; charset=utf-8'
+    text = response.get_data(as_text=True)
+    assert sample(text, 'skep_requests_total{platform="iOS",version="3.10",status="302"}') == 2
+    assert sample(text, 'skep_requests_total{platform="iOS",version="other",status="404"}') == 1
+    # Unknown platforms don't create new time series.
+    assert sample(text, 'skep_requests_total{platform="other",version="3.10",status="404"}') == 1
+
+    assert sample(text, 'skep_request_duration_seconds_count{platform="iOS"}') == 3
+    # Only the first request was signed; the second was served from the URL cache.
+    assert sample(text, 'skep_request_phase_seconds_count{phase="sign"}') == 1
+    assert sample(text, 'skep_request_phase_seconds_count{phase="client"}') == 2
+    assert sample(text, 'skep_request_phase_seconds_count{phase="overhead"}') == 4
+
+    assert sample(text, 'skep_presigned_url_cache_hits') == 1
+    assert sample(text, 'skep_negative_cache_size') == 0
+
+
+def test_metrics_other_endpoints(app):
+    "Only support package requests are recorded"
+    client = app.test_client()
+    client.get('/')
+
+    assert 'skep_requests_total' not in client.get('/metrics').get_data(as_text=True)
+
+
+def test_metrics_disabled(fake_s3, monkeypatch):
+    "Metrics can be disabled"
+    mock_record = mock.MagicMock()
+    monkeypatch.setattr('skep.support.record_request', mock_record)
+    app = create_app({
+        'TESTING': True,
+        'METRICS': False,
+    })
+    client = app.test_client()
+
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 302
+    assert client.get('/metrics').status_code == 404
+    mock_record.assert_not_called()
+
+
+def test_metrics_log(fake_s3, caplog):
+    "Each support package request can be logged as a structured line"
+    app = create_app({
+        'TESTING': True,
+        'METRICS_LOG': True,
+    })
+
+    with caplog.at_level(logging.INFO, logger='skep.requests'):
+        app.test_client().get('/python?version=3.10&platform=linux&arch=x86_64&revision=3')
+
+    [record] = caplog.records
+    line = json.loads(record.getMessage())
+    assert line['platform'] == 'linux'
+    assert line['version'] == '3.10'
+    assert line['arch'] == 'x86_64'
+    assert line['revision'] == '3'
+    assert line['status'] == 302
+    assert set(line['phases']) == {'client', 'resolve', 'sign', 'respond', 'overhead'}
+    assert line['duration'] >= sum(line['phases'].values()) - 1e-9
+
+
+def test_metrics_windows(app, monkeypatch):
+    "Windows requests are not signed"
+    monkeypatch.setattr(platforms, 'windows_support_url', lambda **kwargs: 'https://example.com/embed.zip')
+    client = app.test_client()
+    client.get('/python?version=3.10&platform=windows')
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert sample(text, 'skep_requests_total{platform="windows",version="3.10",status="302"}') == 1
+    assert 'phase="sign"' not in text
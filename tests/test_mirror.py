@@ -0,0 +1,253 @@
+import base64
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import pytest
+
+from skep import mirror, platforms
+from skep.skep import create_app
+from tests.fakes import FakeS3
+
+MIRROR_KEY = 'python/3.10/windows/python-3.10.7-embed-amd64.zip'
+
+
+def content(path):
+    "The content served by the stand-in for an embed package"
+    return f'zip file for {path}'.encode('utf-8') * 100
+
+
+class Server(ThreadingHTTPServer):
+    # Allow for a burst of parallel downloads.
+    request_queue_size = 64
+
+
+class PythonOrg:
+    "A local stand-in for python.org"
+    def __init__(self):
+        self.missing = set()
+        self.truncated = set()
+        self.requests = []
+
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self.respond(body=False)
+
+            def do_GET(self):
+                self.respond(body=True)
+
+            def respond(self, body):
+                origin.requests.append((self.command, self.path))
+                if self.path.rsplit('/', 1)[1] in origin.missing:
+                    self.send_error(404)
+                    return
+                data = content(self.path)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/zip')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                if body:
+                    if self.path.rsplit('/', 1)[1] in origin.truncated:
+                        data = data[:-10]
+                    self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.origin = f'http://127.0.0.1:{self.server.server_port}/ftp/python/'
+
+    def gets(self):
+        return [path for method, path in self.requests if method == 'GET']
+
+
+@pytest.fixture
+def python_org():
+    origin = PythonOrg()
+    thread = threading.Thread(target=origin.server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield origin
+    origin.server.shutdown()
+    origin.server.server_close()
+
+
+def test_embed_packages():
+    "Every package the pinned table can produce is mirrored"
+    packages = mirror.embed_packages('http://localhost/ftp/python/')
+
+    assert len(packages) == len(platforms.WINDOWS_MICRO_VERSIONS) * len(platforms.WINDOWS_HOST_ARCHES)
+    assert (MIRROR_KEY, 'http://localhost/ftp/python/3.10.7/python-3.10.7-embed-amd64.zip') in packages
+
+
+def test_sync_directory(python_org, tmp_path):
+    "Packages are downloaded into a local directory"
+    python_org.missing.add('python-3.5.4-embed-arm64.zip')
+    destination = mirror.DirectoryMirror(str(tmp_path))
+
+    results = mirror.sync(destination, mirror.embed_packages(python_org.origin), jobs=4)
+
+    assert results['python/3.5/windows/python-3.5.4-embed-arm64.zip'] == mirror.MISSING
+    assert list(results.values()).count(mirror.MIRRORED) == len(results) - 1
+    assert (tmp_path / 'python/3.10/windows/python-3.10.7-embed-amd64.zip').read_bytes() == content(
+        '/ftp/python/3.10.7/python-3.10.7-embed-amd64.zip'
+    )
+    # No temporary files are left behind.
+    assert [path.name for path in tmp_path.iterdir()] == ['python']
+
+
+def test_sync_skips_mirrored(python_org, tmp_path):
+    "Packages that have already been mirrored aren't downloaded again"
+    destination = mirror.DirectoryMirror(str(tmp_path))
+    packages = mirror.embed_packages(python_org.origin)
+    mirror.sync(destination, packages)
+    python_org.requests.clear()
+
+    # A partially mirrored file is replaced.
+    (tmp_path / MIRROR_KEY).write_bytes(b'partial')
+    results = mirror.sync(destination, packages)
+
+    assert results[MIRROR_KEY] == mirror.MIRRORED
+    assert list(results.values()).count(mirror.SKIPPED) == len(packages) - 1
+    assert python_org.gets() == ['/ftp/python/3.10.7/python-3.10.7-embed-amd64.zip']
+
+
+def test_sync_size_mismatch(python_org, tmp_path):
+    "A truncated download isn't mirrored"
+    python_org.truncated.add('python-3.10.7-embed-amd64.zip')
+    destination = mirror.DirectoryMirror(str(tmp_path))
+
+    results = mirror.sync(destination, [(MIRROR_KEY, python_org.origin + '3.10.7/python-3.10.7-embed-amd64.zip')])
+
+    assert results == {MIRROR_KEY: mirror.FAILED}
+    assert not (tmp_path / MIRROR_KEY).exists()
+
+
+def test_sync_checksums(python_org, tmp_path):
+    "Downloads are verified against expected checksums"
+    destination = mirror.DirectoryMirror(str(tmp_path))
+    good = hashlib.md5(content('/ftp/python/3.10.7/python-3.10.7-embed-amd64.zip')).hexdigest()
+    packages = [
+        (MIRROR_KEY, python_org.origin + '3.10.7/python-3.10.7-embed-amd64.zip'),
+        (
+            'python/3.10/windows/python-3.10.7-embed-win32.zip',
+            python_org.origin + '3.10.7/python-3.10.7-embed-win32.zip',
+        ),
+    ]
+    checksums = mirror.read_checksums([
+        f'{good}  python-3.10.7-embed-amd64.zip\n',
+        '\n',
+        f'{"0" * 32} *python-3.10.7-embed-win32.zip\n',
+    ])
+
+    results = mirror.sync(destination, packages, checksums=checksums)
+
+    assert results == {
+        MIRROR_KEY: mirror.MIRRORED,
+        'python/3.10/windows/python-3.10.7-embed-win32.zip': mirror.FAILED,
+    }
+
+
+def test_sync_bucket(python_org):
+    "Packages are uploaded to S3, with a checksum"
+    s3 = FakeS3()
+
+    def put_object(Bucket, Key, Body, ContentMD5, ContentType):
+        s3.calls.append(('put_object', Bucket, Key, ContentMD5, ContentType))
+        s3.objects[Key] = Body.read()
+    s3.put_object = put_object
+    destination = mirror.BucketMirror(s3, 'briefcase-support')
+    packages = [(MIRROR_KEY, python_org.origin + '3.10.7/python-3.10.7-embed-amd64.zip')]
+
+    assert mirror.sync(destination, packages) == {MIRROR_KEY: mirror.MIRRORED}
+    data = content('/ftp/python/3.10.7/python-3.10.7-embed-amd64.zip')
+    assert s3.objects[MIRROR_KEY] == data
+    assert s3.calls[-1][3:] == (
+        base64.b64encode(hashlib.md5(data).digest()).decode('ascii'),
+        'application/zip',
+    )
+
+    assert mirror.sync(destination, packages) == {MIRROR_KEY: mirror.SKIPPED}
+
+
+def test_main(python_org, tmp_path, capsys):
+    "The sync tool reports a summary, and fails if any package failed"
+    python_org.missing.add('python-3.5.4-embed-arm64.zip')
+    argv = ['--directory', str(tmp_path), '--origin', python_org.origin, '--jobs', '8']
+
+    assert mirror.main(argv) == 0
+    assert capsys.readouterr().out == '17 mirrored, 0 skipped, 1 missing, 0 failed\n'
+
+    assert mirror.main(argv) == 0
+    assert capsys.readouterr().out == '0 mirrored, 17 skipped, 1 missing, 0 failed\n'
+
+    (tmp_path / MIRROR_KEY).unlink()
+    python_org.truncated.add('python-3.10.7-embed-amd64.zip')
+    assert mirror.main(argv) == 1
+    assert capsys.readouterr().out == '0 mirrored, 16 skipped, 1 missing, 1 failed\n'
+
+
+def test_serve_from_mirror(fake_s3):
+    "Pinned Windows packages can be served from the support bucket"
+    app = create_app({
+        'TESTING': True,
+        'WINDOWS_MIRROR': True,
+    })
+    client = app.test_client()
+
+    response = client.get('/python?version=3.10&platform=windows')
+    assert response.status_code == 302
+    assert response.location == f'https://briefcase-support.s3.amazonaws.com/{MIRROR_KEY}?Expires=60'
+    assert fake_s3.calls == [('generate_presigned_url', 'briefcase-support', MIRROR_KEY)]
+    # The redirect is only cacheable while the signature is valid.
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    # Revisions that aren't pinned are still served from python.org.
+    response = client.get('/python?version=3.10&platform=windows&revision=4')
+    assert response.status_code == 302
+    assert response.location == 'https://www.python.org/ftp/python/3.10.4/python-3.10.4-embed-amd64.zip'
+    assert response.headers['Cache-Control'] == 'public, max-age=2592000'
+
+
+def test_serve_unmirrored(fake_s3):
+    "Packages missing from the mirror are served from python.org"
+    fake_s3.objects[MIRROR_KEY] = b'embed package'
+    app = create_app({
+        'TESTING': True,
+        'WINDOWS_MIRROR': True,
+        'S3_INVENTORY': True,
+        'S3_INVENTORY_REFRESH_INTERVAL': 0,
+    })
+    client = app.test_client()
+
+    response = client.get('/python?version=3.10&platform=windows')
+    assert response.location == f'https://briefcase-support.s3.amazonaws.com/{MIRROR_KEY}?Expires=60'
+
+    url = platforms.windows_support_url(version='3.9', host_arch=None, revision=None)
+    assert platforms.windows_mirror_key(url) is not None
+    response = client.get('/python?version=3.9&platform=windows')
+    assert response.status_code == 302
+    assert response.location == url
+
+
+def test_serve_from_mirror_batch(fake_s3):
+    "Batch requests for pinned Windows packages are served from the mirror"
+    app = create_app({
+        'TESTING': True,
+        'WINDOWS_MIRROR': True,
+    })
+
+    response = app.test_client().post('/python/batch', json=[{'version': '3.10', 'platform': 'windows'}])
+
+    assert response.json[0]['url'] == f'https://briefcase-support.s3.amazonaws.com/{MIRROR_KEY}?Expires=60'
+
+
+def test_mirror_disabled(test_client):
+    "By default, Windows packages are served from python.org"
+    with mock.patch('boto3.client') as mock_client:
+        response = test_client.get('/python?version=3.10&platform=windows')
+
+    assert response.location == 'https://www.python.org/ftp/python/3.10.7/python-3.10.7-embed-amd64.zip'
+    mock_client.assert_not_called()
@@ -0,0 +1,124 @@
+import os
+import pstats
+import random
+
+import pytest
+
+from skep.profiling import RequestProfiler
+from skep.skep import create_app
+
+
+def profiled_calls(path, name):
+    "The number of calls recorded for the function ``name`` in a pstats file"
+    stats = pstats.Stats(str(path))
+    return sum(
+        calls
+        for (filename, line, function), (primitive, calls, *_) in stats.stats.items()
+        if function == name
+    )
+
+
+@pytest.mark.parametrize('rate', [0.0, 0.1, 0.5, 1.0])
+def test_sample_rate(tmp_path, rate):
+    "Requests are sampled at the configured rate"
+    profiler = RequestProfiler(tmp_path, rate=rate, random=random.Random(42).random)
+
+    sampled = sum(profiler.sampled() for i in range(10000))
+
+    assert sampled == pytest.approx(10000 * rate, abs=200)
+
+
+def test_sample_token(tmp_path):
+    "A request with the profiling token is always sampled"
+    profiler = RequestProfiler(tmp_path, token='s3cret', random=lambda: 1.0)
+
+    assert profiler.sampled('s3cret')
+    assert not profiler.sampled('guess')
+    assert not profiler.sampled(None)
+
+
+def test_run(tmp_path):
+    "Profiles are aggregated per endpoint, and written as loadable pstats"
+    profiler = RequestProfiler(tmp_path, rate=1.0)
+
+    def view(value):
+        return value * 2
+
+    assert profiler.run('view', view, 21) == 42
+    assert profiler.run('view', view, 1) == 2
+
+    assert profiler.samples == {'view': 2}
+    assert profiled_calls(tmp_path / 'view.pstats', 'view') == 2
+    # No temporary files are left behind.
+    assert os.listdir(tmp_path) == ['view.pstats']
+
+
+def test_run_exception(tmp_path):
+    "A request that raises is still profiled"
+    profiler = RequestProfiler(tmp_path, rate=1.0)
+
+    def view():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        profiler.run('view', view)
+
+    assert profiled_calls(tmp_path / 'view.pstats', 'view') == 1
+
+
+def test_run_concurrent(tmp_path):
+    "Only one request is profiled at a time"
+    profiler = RequestProfiler(tmp_path, rate=1.0)
+
+    def inner():
+        return 'inner'
+
+    def outer():
+        return profiler.run('inner', inner)
+
+    assert profiler.run('outer', outer) == 'inner'
+    assert profiler.samples == {'outer': 1}
+
+
+def test_profile_views(fake_s3, tmp_path):
+    "The landing page and support package views are profiled"
+    app = create_app({
+        'TESTING': True,
+        'PROFILE_RATE': 1.0,
+        'PROFILE_DIR': str(tmp_path),
+    })
+    client = app.test_client()
+
+    assert client.get('/').status_code == 200
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 302
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 302
+
+    assert app.extensions['profiler'].samples == {'hello': 1, 'support_package': 2}
+    assert profiled_calls(tmp_path / 'support_package.pstats', 'support_package') == 2
+    assert profiled_calls(tmp_path / 'hello.pstats', 'hello') == 1
+
+
+def test_profile_views_token(fake_s3, tmp_path):
+    "Only requests carrying the profiling token are profiled"
+    app = create_app({
+        'TESTING': True,
+        'PROFILE_TOKEN': 's3cret',
+        'PROFILE_DIR': str(tmp_path),
+    })
+    client = app.test_client()
+
+    client.get('/python?version=3.10&platform=iOS')
+    client.get('/python?version=3.10&platform=iOS', headers={'X-Skep-Profile': 'guess'})
+    client.get('/python?version=3.10&platform=iOS', headers={'X-Skep-Profile': 's3cret'})
+
+    assert app.extensions['profiler'].samples == {'support_package': 1}
+
+
+def test_profiling_disabled(fake_s3):
+    "By default, the views aren't wrapped"
+    app = create_app({
+        'TESTING': True,
+    })
+
+    assert app.extensions['profiler'] is None
+    assert not hasattr(app.view_functions['support_package'], '__wrapped__')
@@ -0,0 +1,273 @@
+from unittest import mock
+
+import pytest
+from botocore.exceptions import ClientError
+
+from skep import proxy
+from skep.skep import create_app
+
+KEY = 'python/3.10/macOS/Python-3.10-macOS-support.b3.tar.gz'
+
+
+@pytest.fixture
+def streaming_client(fake_s3):
+    fake_s3.objects[KEY] = bytes(range(256)) * 1000
+    return create_app({
+        'TESTING': True,
+        'STREAMING_CHUNK_SIZE': 4096,
+    }).test_client()
+
+
+def test_stream_parameter(streaming_client, fake_s3):
+    "A support package can be streamed through the app on request"
+    response = streaming_client.get('/python?version=3.10&platform=macOS&stream=1')
+
+    assert response.status_code == 200
+    assert response.headers['Content-Length'] == '256000'
+    assert response.headers['Content-Type'] == 'binary/octet-stream'
+    assert response.headers['Content-Disposition'] == (
+        'attachment; filename="Python-3.10-macOS-support.b3.tar.gz"'
+    )
+    assert response.data == bytes(range(256)) * 1000
+    assert fake_s3.calls == [('get_object', 'briefcase-support', KEY)]
+
+
+def test_stream_bounded_reads(streaming_client, fake_s3):
+    "The object is read from the store in chunks"
+    response = streaming_client.get('/python?version=3.10&platform=macOS&stream=1')
+    chunks = list(response.response)
+
+    assert len(chunks) == 63
+    assert max(len(chunk) for chunk in chunks) == 4096
+    assert set(fake_s3.bodies[0].reads) == {4096}
+    assert fake_s3.bodies[0].closed
+
+
+def test_stream_config(fake_s3):
+    "Streaming can be enabled for every request"
+    fake_s3.objects[KEY] = b'support package'
+    test_client = create_app({'TESTING': True, 'STREAMING': True}).test_client()
+
+    response = test_client.get('/python?version=3.10&platform=macOS')
+
+    assert response.status_code == 200
+    assert response.data == b'support package'
+
+
+def test_stream_not_requested(streaming_client, fake_s3):
+    "By default, requests are redirected"
+    response = streaming_client.get('/python?version=3.10&platform=macOS&stream=0')
+
+    assert response.status_code == 302
+    assert response.location == f'https://briefcase-support.s3.amazonaws.com/{KEY}?Expires=60'
+    assert fake_s3.calls == [('generate_presigned_url', 'briefcase-support', KEY)]
+
+
+def test_stream_unknown_package(streaming_client, fake_s3):
+    "If the package isn't in the catalog, a 404 is returned"
+    response = streaming_client.get('/python?version=2.7&platform=macOS&stream=1')
+
+    assert response.status_code == 404
+    assert fake_s3.calls == []
+
+
+def test_stream_missing_object(streaming_client, fake_s3):
+    "If the package is in the catalog, but not in the store, a 404 is returned"
+    response = streaming_client.get('/python?version=3.9&platform=macOS&stream=1')
+
+    assert response.status_code == 404
+
+
+def test_stream_store_failure(streaming_client, fake_s3, monkeypatch):
+    "If the store fails, a 502 is returned"
+    monkeypatch.setattr(fake_s3, 'get_object', mock.MagicMock(side_effect=ClientError(
+        {'Error': {'Code': 'AccessDenied', 'Message': 'Access Denied'}},
+        'GetObject',
+    )))
+
+    response = streaming_client.get('/python?version=3.10&platform=macOS&stream=1')
+
+    assert response.status_code == 502
+
+
+@pytest.mark.parametrize(
+    "key, content_type",
+    [
+        ('python/3.10/android/Python-3.10-Android-support.b2.zip', 'application/zip'),
+        ('python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz', 'application/gzip'),
+        ('python/3.10/iOS/unknown', 'application/octet-stream'),
+    ]
+)
+def test_content_type_fallback(key, content_type):
+    "If the store doesn't provide a content type, one is guessed from the key"
+    assert proxy.content_type(key, {}) == content_type
+
+
+DATA = bytes(range(256)) * 1000
+URL = '/python?version=3.10&platform=macOS&stream=1'
+
+
+def test_full_response_headers(streaming_client, fake_s3):
+    "A full response advertises range support and validators"
+    response = streaming_client.get(URL)
+
+    assert response.status_code == 200
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'] == fake_s3.head_object('briefcase-support', KEY)['ETag']
+    assert response.headers['Last-Modified'] == 'Sun, 01 May 2022 12:00:00 GMT'
+
+
+@pytest.mark.parametrize('fast_path', [False, True], ids=['flask', 'fast_path'])
+def test_stream_head(fake_s3, fast_path):
+    "A HEAD request only reads the object's metadata"
+    fake_s3.objects[KEY] = DATA
+    test_client = create_app({'TESTING': True, 'WSGI_FAST_PATH': fast_path}).test_client()
+
+    response = test_client.head(URL)
+
+    assert response.status_code == 200
+    assert response.headers['Content-Length'] == '256000'
+    assert response.headers['ETag'] == fake_s3.head_object('briefcase-support', KEY)['ETag']
+    assert response.data == b''
+    assert fake_s3.calls == [('head_object', 'briefcase-support', KEY)] * 2
+
+
+def test_body_closed_unread(fake_s3):
+    "A streamed body is closed even if it was never read"
+    fake_s3.objects[KEY] = DATA
+    response = proxy.full_response(fake_s3, 'briefcase-support', KEY, chunk_size=4096)
+
+    response.close()
+
+    assert fake_s3.bodies[0].closed
+    assert fake_s3.bodies[0].reads == []
+
+
+@pytest.mark.parametrize(
+    "header, s3_range, content_range, data",
+    [
+        ('bytes=0-99', 'bytes=0-99', 'bytes 0-99/256000', DATA[:100]),
+        ('bytes=255900-', 'bytes=255900-', 'bytes 255900-255999/256000', DATA[255900:]),
+        ('bytes=-100', 'bytes=-100', 'bytes 255900-255999/256000', DATA[-100:]),
+        ('bytes=1000-999999', 'bytes=1000-999999', 'bytes 1000-255999/256000', DATA[1000:]),
+    ],
+    ids=['start-stop', 'start', 'suffix', 'past-end'],
+)
+def test_single_range(streaming_client, fake_s3, header, s3_range, content_range, data):
+    "A single range is forwarded to the store"
+    response = streaming_client.get(URL, headers={'Range': header})
+
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == content_range
+    assert response.headers['Content-Length'] == str(len(data))
+    assert response.data == data
+    assert fake_s3.calls == [('get_object', 'briefcase-support', KEY, s3_range)]
+
+
+def test_single_range_not_satisfiable(streaming_client, fake_s3):
+    "A range beyond the end of the object can't be satisfied"
+    response = streaming_client.get(URL, headers={'Range': 'bytes=256000-'})
+
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == 'bytes */256000'
+
+
+def test_multi_range(streaming_client, fake_s3):
+    "Multiple ranges are returned as a multipart response"
+    response = streaming_client.get(URL, headers={'Range': 'bytes=0-9,1000-1019,-5'})
+
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    boundary = response.mimetype_params['boundary']
+    assert response.headers['Content-Length'] == str(len(response.data))
+
+    assert response.data == (
+        f'--{boundary}\r\n'
+        'Content-Type: binary/octet-stream\r\n'
+        'Content-Range: bytes 0-9/256000\r\n'
+        '\r\n'
+    ).encode() + DATA[:10] + (
+        f'\r\n--{boundary}\r\n'
+        'Content-Type: binary/octet-stream\r\n'
+        'Content-Range: bytes 1000-1019/256000\r\n'
+        '\r\n'
+    ).encode() + DATA[1000:1020] + (
+        f'\r\n--{boundary}\r\n'
+        'Content-Type: binary/octet-stream\r\n'
+        'Content-Range: bytes 255995-255999/256000\r\n'
+        '\r\n'
+    ).encode() + DATA[-5:] + (
+        f'\r\n--{boundary}--\r\n'
+    ).encode()
+
+    # Only the requested bytes were read from the store
+    assert fake_s3.calls == [
+        ('head_object', 'briefcase-support', KEY),
+        ('get_object', 'briefcase-support', KEY, 'bytes=0-9'),
+        ('get_object', 'briefcase-support', KEY, 'bytes=1000-1019'),
+        ('get_object', 'briefcase-support', KEY, 'bytes=255995-255999'),
+    ]
+
+
+def test_multi_range_limit(streaming_client, fake_s3):
+    "If too many ranges are requested, the whole object is returned"
+    ranges = ','.join(f'{i * 10}-{i * 10 + 4}' for i in range(proxy.MAX_RANGES + 1))
+    response = streaming_client.get(URL, headers={'Range': f'bytes={ranges}'})
+
+    assert response.status_code == 200
+    assert response.data == DATA
+    assert fake_s3.calls == [('get_object', 'briefcase-support', KEY)]
+
+
+def test_multi_range_not_satisfiable(streaming_client, fake_s3):
+    "If none of the ranges can be satisfied, a 416 is returned"
+    response = streaming_client.get(URL, headers={'Range': 'bytes=300000-300010,400000-'})
+
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == 'bytes */256000'
+
+
+def test_if_range_unsatisfiable(streaming_client, fake_s3):
+    "If the If-Range ETag matches, an unsatisfiable range is still rejected"
+    etag = fake_s3.head_object('briefcase-support', KEY)['ETag']
+    response = streaming_client.get(URL, headers={'Range': 'bytes=300000-', 'If-Range': etag})
+
+    assert response.status_code == 416
+
+
+@pytest.mark.parametrize(
+    "range_header, status",
+    [
+        ('bytes=0-99', 206),
+        ('bytes=0-9,20-29', 206),
+    ]
+)
+def test_if_range_etag_matches(streaming_client, fake_s3, range_header, status):
+    "If the If-Range ETag matches, the range is returned"
+    etag = fake_s3.head_object('briefcase-support', KEY)['ETag']
+    response = streaming_client.get(URL, headers={'Range': range_header, 'If-Range': etag})
+
+    assert response.status_code == status
+
+
+@pytest.mark.parametrize("range_header", ['bytes=0-99', 'bytes=0-9,20-29', 'bytes=300000-'])
+def test_if_range_etag_stale(streaming_client, fake_s3, range_header):
+    "If the If-Range ETag doesn't match, the full object is returned"
+    response = streaming_client.get(URL, headers={'Range': range_header, 'If-Range': '"stale"'})
+
+    assert response.status_code == 200
+    assert response.data == DATA
+
+
+@pytest.mark.parametrize(
+    "if_range, status",
+    [
+        ('Sun, 01 May 2022 12:00:00 GMT', 206),
+        ('Sat, 30 Apr 2022 12:00:00 GMT', 200),
+    ]
+)
+def test_if_range_date(streaming_client, fake_s3, if_range, status):
+    "An If-Range date must match the object's modification date"
+    response = streaming_client.get(URL, headers={'Range': 'bytes=0-99', 'If-Range': if_range})
+
+    assert response.status_code == status
@@ -1,8 +1,17 @@
 from unittest import mock
 
 import boto3
+import pytest
 
 from skep import platforms
+from skep.s3 import PresignerWrapper
+
+
+def s3_client(presigner):
+    "Find the S3 client at the bottom of a chain of presigners"
+    while isinstance(presigner, PresignerWrapper):
+        presigner = presigner.client
+    return presigner
 
 
 def test_no_version(test_client):
@@ -137,16 +146,18 @@ def test_support_missing(test_client, monkeypatch):
     monkeypatch.setattr(platforms, 'support_url', mock_support_url)
     monkeypatch.setattr(boto3, 'client', mock_s3_client)
 
-    response = test_client.get('/python?version=3.7&platform=linux')
+    response = test_client.get('/python?version=3.7&platform=linux&arch=x86_64')
 
     mock_support_url.assert_called_with(
-        mock_s3,
+        mock.ANY,
         bucket='briefcase-support',
         version='3.7',
         platform='linux',
-        host_arch=None,
+        host_arch='x86_64',
         revision=None,
     )
+    # The S3 client is wrapped by the presigned URL cache
+    assert s3_client(mock_support_url.call_args.args[0]) is mock_s3
 
     assert response.status_code == 404
 
@@ -163,16 +174,18 @@ def test_support_exists(test_client, monkeypatch):
     monkeypatch.setattr(platforms, 'support_url', mock_support_url)
     monkeypatch.setattr(boto3, 'client', mock_s3_client)
 
-    response = test_client.get('/python?version=3.7&platform=linux')
+    response = test_client.get('/python?version=3.7&platform=linux&arch=x86_64')
 
     mock_support_url.assert_called_with(
-        mock_s3,
+        mock.ANY,
         bucket='briefcase-support',
         version='3.7',
         platform='linux',
-        host_arch=None,
+        host_arch='x86_64',
         revision=None,
     )
+    # The S3 client is wrapped by the presigned URL cache
+    assert s3_client(mock_support_url.call_args.args[0]) is mock_s3
 
     assert response.status_code == 302
     assert response.location == 'https://example.com/support_file.tar.gz'
@@ -190,16 +203,18 @@ def test_support_revision(test_client, monkeypatch):
     monkeypatch.setattr(platforms, 'support_url', mock_support_url)
     monkeypatch.setattr(boto3, 'client', mock_s3_client)
 
-    response = test_client.get('/python?version=3.7&platform=linux&revision=b4')
+    response = test_client.get('/python?version=3.7&platform=linux&arch=x86_64&revision=b4')
 
     mock_support_url.assert_called_with(
-        mock_s3,
+        mock.ANY,
         bucket='briefcase-support',
         version='3.7',
         platform='linux',
-        host_arch=None,
+        host_arch='x86_64',
         revision='b4'
     )
+    # The S3 client is wrapped by the presigned URL cache
+    assert s3_client(mock_support_url.call_args.args[0]) is mock_s3
 
     assert response.status_code == 302
     assert response.location == 'https://example.com/support_file.tar.gz'
@@ -217,16 +232,18 @@ def test_support_with_arch_exists(test_client, monkeypatch):
     monkeypatch.setattr(platforms, 'support_url', mock_support_url)
     monkeypatch.setattr(boto3, 'client', mock_s3_client)
 
-    response = test_client.get('/python?version=3.7&platform=linux&arch=amd64')
+    response = test_client.get('/python?version=3.7&platform=linux&arch=x86_64')
 
     mock_support_url.assert_called_with(
-        mock_s3,
+        mock.ANY,
         bucket='briefcase-support',
         version='3.7',
         platform='linux',
-        host_arch='amd64',
+        host_arch='x86_64',
         revision=None,
     )
+    # The S3 client is wrapped by the presigned URL cache
+    assert s3_client(mock_support_url.call_args.args[0]) is mock_s3
 
     assert response.status_code == 302
     assert response.location == 'https://example.com/support_file.tar.gz'
@@ -244,16 +261,61 @@ def test_support_with_revision_and_arch(test_client, monkeypatch):
     monkeypatch.setattr(platforms, 'support_url', mock_support_url)
     monkeypatch.setattr(boto3, 'client', mock_s3_client)
 
-    response = test_client.get('/python?version=3.7&platform=linux&arch=amd64&revision=b5')
+    response = test_client.get('/python?version=3.7&platform=linux&arch=x86_64&revision=b5')
 
     mock_support_url.assert_called_with(
-        mock_s3,
+        mock.ANY,
         bucket='briefcase-support',
         version='3.7',
         platform='linux',
-        host_arch='amd64',
+        host_arch='x86_64',
         revision='b5',
     )
+    # The S3 client is wrapped by the presigned URL cache
+    assert s3_client(mock_support_url.call_args.args[0]) is mock_s3
 
     assert response.status_code == 302
     assert response.location == 'https://example.com/support_file.tar.gz'
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        'version=3.10&platform=beos',
+        'version=2.7&platform=iOS',
+        'version=3.10&platform=iOS&arch=arm64',
+        'version=3.10&platform=linux',
+        'version=3.10&platform=linux&arch=sparc&revision=3',
+        'version=2.7&platform=windows',
+    ]
+)
+def test_unsupported_rejected_early(test_client, monkeypatch, query):
+    "Requests for packages that aren't in the catalog are rejected without being resolved"
+    mock_support_url = mock.MagicMock()
+    mock_windows_support_url = mock.MagicMock()
+    monkeypatch.setattr(platforms, 'support_url', mock_support_url)
+    monkeypatch.setattr(platforms, 'windows_support_url', mock_windows_support_url)
+
+    response = test_client.get(f'/python?{query}')
+
+    assert response.status_code == 404
+    mock_support_url.assert_not_called()
+    mock_windows_support_url.assert_not_called()
+
+
+def test_negative_result_cached(test_client, monkeypatch):
+    "A request that failed to resolve is rejected from the cache next time"
+    mock_support_url = mock.MagicMock(side_effect=ValueError)
+    monkeypatch.setattr(platforms, 'support_url', mock_support_url)
+    monkeypatch.setattr(boto3, 'client', mock.MagicMock())
+
+    for i in range(3):
+        response = test_client.get('/python?version=3.7&platform=linux&arch=x86_64&revision=99')
+        assert response.status_code == 404
+
+    assert mock_support_url.call_count == 1
+
+    # A different revision is resolved independently
+    response = test_client.get('/python?version=3.7&platform=linux&arch=x86_64&revision=98')
+    assert response.status_code == 404
+    assert mock_support_url.call_count == 2
@@ -0,0 +1,281 @@
+import threading
+
+import pytest
+
+from skep.ratelimit import ConcurrencyLimit, MemoryStore, RateLimiter
+from skep.skep import create_app
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def test_bucket():
+    "A client can make a burst of requests, and then requests at a steady rate"
+    clock = FakeClock()
+    limiter = RateLimiter(rate=2, burst=3, clock=clock)
+
+    assert [limiter.acquire('1.2.3.4') for i in range(3)] == [0, 0, 0]
+    assert limiter.acquire('1.2.3.4') == 0.5
+    # Other clients have their own bucket.
+    assert limiter.acquire('5.6.7.8') == 0
+
+    clock.advance(0.25)
+    assert limiter.acquire('1.2.3.4') == 0.25
+    clock.advance(0.25)
+    assert limiter.acquire('1.2.3.4') == 0
+    assert limiter.acquire('1.2.3.4') == 0.5
+
+    # The bucket never holds more than the burst.
+    clock.advance(60)
+    assert [limiter.acquire('1.2.3.4') for i in range(4)] == [0, 0, 0, 0.5]
+    assert limiter.limited == 4
+
+
+def test_bucket_cost():
+    "A request can take more than one token"
+    clock = FakeClock()
+    limiter = RateLimiter(rate=2, burst=3, clock=clock)
+
+    assert limiter.acquire('1.2.3.4', cost=2) == 0
+    assert limiter.acquire('1.2.3.4', cost=2) == 0.5
+    # A request that is turned away doesn't take any tokens.
+    assert limiter.acquire('1.2.3.4') == 0
+
+
+def test_store_bounded():
+    "The least recently used buckets are dropped"
+    store = MemoryStore(maxsize=2)
+
+    assert store.take('a', rate=1, burst=1, now=0) == 0
+    assert store.take('b', rate=1, burst=1, now=0) == 0
+    assert store.take('a', rate=1, burst=1, now=0) == 1
+    assert store.take('c', rate=1, burst=1, now=0) == 0
+
+    assert len(store) == 2
+    # 'b' was dropped, so it starts with a full bucket.
+    assert store.take('b', rate=1, burst=1, now=0) == 0
+    assert store.take('c', rate=1, burst=1, now=0) == 1
+
+
+def test_concurrency_limit():
+    "Requests beyond the limit are shed"
+    limit = ConcurrencyLimit(2)
+
+    assert limit.acquire()
+    assert limit.acquire()
+    assert not limit.acquire()
+    limit.release()
+    assert limit.acquire()
+
+    assert (limit.active, limit.shed) == (2, 1)
+
+
+@pytest.fixture(params=[False, True], ids=['flask', 'fast_path'])
+def app(request, fake_s3):
+    app = create_app({
+        'TESTING': True,
+        'WSGI_FAST_PATH': request.param,
+        'RATE_LIMIT_PER_MINUTE': 60,
+        'RATE_LIMIT_BURST': 2,
+    })
+    app.extensions['rate_limiter'].clock = FakeClock()
+    return app
+
+
+def test_rate_limited(app, fake_s3):
+    "Clients that make too many requests are turned away, without signing a URL"
+    client = app.test_client()
+    clock = app.extensions['rate_limiter'].clock
+
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 302
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 302
+    fake_s3.calls.clear()
+
+    response = client.get('/python?version=3.10&platform=iOS')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert fake_s3.calls == []
+
+    # Invalid requests count, too.
+    clock.advance(1)
+    assert client.get('/python?version=3.10').status_code == 400
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 429
+
+    # Requests from other clients aren't affected.
+    response = client.get('/python?version=3.10&platform=iOS', environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert response.status_code == 302
+
+    clock.advance(1)
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 302
+
+
+def test_rate_limit_header(fake_s3):
+    "Clients can be identified by a header set by a proxy"
+    app = create_app({
+        'TESTING': True,
+        'RATE_LIMIT_PER_MINUTE': 60,
+        'RATE_LIMIT_BURST': 1,
+        'RATE_LIMIT_HEADER': 'X-Forwarded-For',
+    })
+    client = app.test_client()
+
+    assert client.get('/python?version=3.10&platform=iOS', headers={'X-Forwarded-For': '1.1.1.1'}).status_code == 302
+    # Only the address added by the proxy is trusted.
+    response = client.get('/python?version=3.10&platform=iOS', headers={'X-Forwarded-For': '9.9.9.9, 1.1.1.1'})
+    assert response.status_code == 429
+    response = client.get('/python?version=3.10&platform=iOS', headers={'X-Forwarded-For': '2.2.2.2'})
+    assert response.status_code == 302
+
+
+def test_rate_limit_store(fake_s3):
+    "The token buckets can be held in another store"
+    calls = []
+
+    class Store:
+        def take(self, key, rate, burst, now, cost=1):
+            calls.append((key, rate, burst, cost))
+            return 30
+
+    app = create_app({
+        'TESTING': True,
+        'RATE_LIMIT_PER_MINUTE': 6,
+        'RATE_LIMIT_BURST': 5,
+        'RATE_LIMIT_STORE': Store(),
+    })
+
+    response = app.test_client().get('/python?version=3.10&platform=iOS')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '30'
+    assert calls == [('127.0.0.1', 0.1, 5, 1)]
+
+
+def test_rate_limited_batch(app):
+    "Batch requests are rate limited"
+    client = app.test_client()
+
+    for status in [200, 200, 429]:
+        assert client.post('/python/batch', json=[{'version': '3.10', 'platform': 'iOS'}]).status_code == status
+
+
+def test_rate_limited_batch_size(app, fake_s3):
+    "Each support package in a batch counts against the rate limit"
+    client = app.test_client()
+    clock = app.extensions['rate_limiter'].clock
+    package = {'version': '3.10', 'platform': 'iOS'}
+
+    assert client.post('/python/batch', json=[package] * 2).status_code == 200
+    response = client.post('/python/batch', json=[package] * 2)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '2'
+
+    # A batch can't be larger than the burst.
+    clock.advance(60)
+    response = client.post('/python/batch', json=[package] * 3)
+    assert response.status_code == 400
+    assert b'No more than 2 support packages' in response.data
+    assert [call for call in fake_s3.calls if call[0] == 'generate_presigned_url'] == [
+        ('generate_presigned_url', 'briefcase-support', 'python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz'),
+    ]
+
+
+def test_rate_limit_metrics(app):
+    "Rate limited requests are counted"
+    client = app.test_client()
+    for i in range(3):
+        client.get('/python?version=3.10&platform=iOS')
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'skep_rate_limit_limited 1' in body
+    assert 'status="429"' in body
+
+
+@pytest.mark.parametrize('fast_path', [False, True], ids=['flask', 'fast_path'])
+def test_load_shed(fake_s3, fast_path):
+    "Requests beyond the concurrency limit are shed before they are resolved"
+    app = create_app({
+        'TESTING': True,
+        'WSGI_FAST_PATH': fast_path,
+        'MAX_CONCURRENT_REQUESTS': 1,
+        'OVERLOAD_RETRY_AFTER': 5,
+        'PRESIGNED_URL_CACHE_SIZE': 0,
+    })
+    signing = threading.Event()
+    release = threading.Event()
+    generate_presigned_url = fake_s3.generate_presigned_url
+
+    def slow_presigned_url(*args, **kwargs):
+        signing.set()
+        release.wait(10)
+        return generate_presigned_url(*args, **kwargs)
+    fake_s3.generate_presigned_url = slow_presigned_url
+
+    statuses = []
+    thread = threading.Thread(
+        target=lambda: statuses.append(app.test_client().get('/python?version=3.10&platform=iOS').status_code)
+    )
+    thread.start()
+    assert signing.wait(10)
+
+    response = app.test_client().get('/python?version=3.10&platform=macOS')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+    release.set()
+    thread.join()
+    assert statuses == [302]
+    assert app.extensions['concurrency_limit'].active == 0
+    # Once the first request has been served, there is capacity again.
+    assert app.test_client().get('/python?version=3.10&platform=macOS').status_code == 302
+
+
+@pytest.mark.parametrize('fast_path', [False, True], ids=['flask', 'fast_path'])
+def test_streams_held(fake_s3, fast_path):
+    "A streamed support package counts against the concurrency limit until it has been sent"
+    fake_s3.objects['python/3.10/macOS/Python-3.10-macOS-support.b3.tar.gz'] = b'support package'
+    app = create_app({
+        'TESTING': True,
+        'WSGI_FAST_PATH': fast_path,
+        'MAX_CONCURRENT_REQUESTS': 1,
+    })
+    client = app.test_client()
+
+    response = client.get('/python?version=3.10&platform=macOS&stream=1', buffered=False)
+    assert response.status_code == 200
+    assert app.extensions['concurrency_limit'].active == 1
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 503
+
+    assert response.get_data() == b'support package'
+    response.close()
+    assert app.extensions['concurrency_limit'].active == 0
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 302
+
+
+def test_shed_not_rate_limited(fake_s3):
+    "Requests that are shed don't count against the client's rate limit"
+    fake_s3.objects['python/3.10/macOS/Python-3.10-macOS-support.b3.tar.gz'] = b'support package'
+    app = create_app({
+        'TESTING': True,
+        'MAX_CONCURRENT_REQUESTS': 1,
+        'RATE_LIMIT_PER_MINUTE': 60,
+        'RATE_LIMIT_BURST': 2,
+    })
+    app.extensions['rate_limiter'].clock = FakeClock()
+    client = app.test_client()
+
+    response = client.get('/python?version=3.10&platform=macOS&stream=1', buffered=False)
+    for i in range(3):
+        assert client.get('/python?version=3.10&platform=iOS').status_code == 503
+    response.close()
+
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 302
+    assert client.get('/python?version=3.10&platform=iOS').status_code == 429
+    # A request that is rate limited doesn't hold a place.
+    assert app.extensions['concurrency_limit'].active == 0
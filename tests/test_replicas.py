@@ -0,0 +1,222 @@
+import boto3
+import pytest
+
+from skep.replicas import ReplicaSet
+from skep.s3 import S3ClientPool
+from skep.skep import create_app
+from tests.fakes import FakeS3
+
+IOS_KEY = 'python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz'
+MACOS_KEY = 'python/3.10/macOS/Python-3.10-macOS-support.b2.tar.gz'
+
+REPLICAS = {
+    'eu-west-1': 'briefcase-support-eu',
+    'ap-southeast-2': 'briefcase-support-ap',
+}
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    "A local stand-in for the S3 client in each region."
+    clients = {
+        'us-west-2': FakeS3(),
+        'eu-west-1': FakeS3({IOS_KEY: b'ios support'}),
+        'ap-southeast-2': FakeS3({IOS_KEY: b'ios support'}),
+    }
+    clients['created'] = []
+
+    def client(service, region_name=None, **kwargs):
+        clients['created'].append(region_name)
+        return clients[region_name]
+
+    monkeypatch.setattr(boto3, 'client', client)
+    return clients
+
+
+@pytest.fixture
+def app(clients):
+    return create_app({
+        'TESTING': True,
+        'S3_REPLICAS': REPLICAS,
+        'S3_REPLICA_COUNTRIES': {'de': 'eu-west-1', 'AU': 'ap-southeast-2'},
+    })
+
+
+def test_default(app, clients):
+    "Requests that don't select a replica are served from the primary bucket"
+    response = app.test_client().get('/python?version=3.10&platform=iOS')
+
+    assert response.location == f'https://briefcase-support.s3.amazonaws.com/{IOS_KEY}?Expires=60'
+    assert clients['eu-west-1'].calls == []
+    assert clients['created'] == ['us-west-2']
+
+
+def test_query_argument(app, clients):
+    "A replica can be requested explicitly"
+    response = app.test_client().get('/python?version=3.10&platform=iOS&region=eu-west-1')
+
+    assert response.status_code == 302
+    assert response.location == f'https://briefcase-support-eu.s3.amazonaws.com/{IOS_KEY}?Expires=60'
+    assert clients['eu-west-1'].calls == [
+        ('head_object', 'briefcase-support-eu', IOS_KEY),
+        ('generate_presigned_url', 'briefcase-support-eu', IOS_KEY),
+    ]
+    assert clients['us-west-2'].calls == []
+
+
+def test_unknown_region(app, clients):
+    "An unknown region is served from the primary bucket"
+    response = app.test_client().get('/python?version=3.10&platform=iOS&region=mars-north-1')
+
+    assert response.location == f'https://briefcase-support.s3.amazonaws.com/{IOS_KEY}?Expires=60'
+
+
+def test_country_header(app, clients):
+    "A replica can be selected by the country the request came from"
+    client = app.test_client()
+
+    response = client.get('/python?version=3.10&platform=iOS', headers={'CloudFront-Viewer-Country': 'AU'})
+    assert response.location == f'https://briefcase-support-ap.s3.amazonaws.com/{IOS_KEY}?Expires=60'
+    # Shared caches mustn't serve the redirect to users elsewhere.
+    assert response.headers['Vary'] == 'CloudFront-Viewer-Country'
+
+    response = client.get('/python?version=3.10&platform=iOS', headers={'CloudFront-Viewer-Country': 'de'})
+    assert response.location == f'https://briefcase-support-eu.s3.amazonaws.com/{IOS_KEY}?Expires=60'
+
+    response = client.get('/python?version=3.10&platform=iOS', headers={'CloudFront-Viewer-Country': 'US'})
+    assert response.location == f'https://briefcase-support.s3.amazonaws.com/{IOS_KEY}?Expires=60'
+
+    # The query argument takes precedence over the header.
+    response = client.get(
+        '/python?version=3.10&platform=iOS&region=eu-west-1',
+        headers={'CloudFront-Viewer-Country': 'AU'},
+    )
+    assert response.location == f'https://briefcase-support-eu.s3.amazonaws.com/{IOS_KEY}?Expires=60'
+
+
+def test_fallback(app, clients):
+    "Keys that haven't been replicated yet are served from the primary bucket"
+    client = app.test_client()
+
+    for _ in range(2):
+        response = client.get('/python?version=3.10&platform=macOS&revision=2&region=eu-west-1')
+        assert response.location == f'https://briefcase-support.s3.amazonaws.com/{MACOS_KEY}?Expires=60'
+
+    # The replica is only checked once.
+    assert clients['eu-west-1'].calls == [('head_object', 'briefcase-support-eu', MACOS_KEY)]
+    assert app.extensions['s3_replicas'].stats() == {'served': 0, 'fallbacks': 2}
+
+
+def test_clients_reused(app, clients):
+    "Each region's client is built once"
+    client = app.test_client()
+
+    for region in ['eu-west-1', 'ap-southeast-2', 'eu-west-1', 'ap-southeast-2']:
+        assert client.get(f'/python?version=3.10&platform=iOS&region={region}').status_code == 302
+
+    assert sorted(clients['created']) == ['ap-southeast-2', 'eu-west-1', 'us-west-2']
+
+
+def test_batch(app, clients):
+    "Every URL in a batch is signed for the same replica"
+    response = app.test_client().post('/python/batch?region=eu-west-1', json=[
+        {'version': '3.10', 'platform': 'iOS'},
+        {'version': '3.10', 'platform': 'macOS', 'revision': '2'},
+    ])
+
+    assert [result['url'] for result in response.json] == [
+        f'https://briefcase-support-eu.s3.amazonaws.com/{IOS_KEY}?Expires=60',
+        f'https://briefcase-support.s3.amazonaws.com/{MACOS_KEY}?Expires=60',
+    ]
+
+
+def test_metrics(app, clients):
+    "Replica usage is reported as metrics"
+    client = app.test_client()
+    client.get('/python?version=3.10&platform=iOS&region=eu-west-1')
+    client.get('/python?version=3.10&platform=macOS&revision=2&region=eu-west-1')
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'skep_s3_replicas_served 1' in body
+    assert 'skep_s3_replicas_fallbacks 1' in body
+
+
+def test_unknown_country_region(clients):
+    "Countries can only be mapped to configured replicas"
+    with pytest.raises(ValueError, match=r"unknown replica regions \['eu-central-1'\]"):
+        create_app({
+            'TESTING': True,
+            'S3_REPLICAS': REPLICAS,
+            'S3_REPLICA_COUNTRIES': {'DE': 'eu-central-1'},
+        })
+
+
+def test_check_expires(clients):
+    "A key missing from a replica is checked again after a while"
+    now = [1000]
+    replicas = ReplicaSet(S3ClientPool(), REPLICAS, ttl=60, clock=lambda: now[0])
+
+    assert not replicas.exists('eu-west-1', MACOS_KEY)
+    clients['eu-west-1'].objects[MACOS_KEY] = b'macos support'
+    now[0] += 59
+    assert not replicas.exists('eu-west-1', MACOS_KEY)
+    now[0] += 1
+    assert replicas.exists('eu-west-1', MACOS_KEY)
+
+    assert clients['eu-west-1'].calls == [('head_object', 'briefcase-support-eu', MACOS_KEY)] * 2
+
+
+def test_checks_bounded(clients):
+    "Only the most recently used checks are remembered"
+    replicas = ReplicaSet(S3ClientPool(), REPLICAS, maxsize=2)
+
+    assert replicas.exists('eu-west-1', IOS_KEY)
+    assert not replicas.exists('eu-west-1', MACOS_KEY)
+    assert replicas.exists('eu-west-1', IOS_KEY)
+    assert replicas.exists('ap-southeast-2', IOS_KEY)
+
+    assert len(replicas._found) == 2
+    # The check for MACOS_KEY was dropped, so it is made again.
+    assert not replicas.exists('eu-west-1', MACOS_KEY)
+    assert clients['eu-west-1'].calls == [
+        ('head_object', 'briefcase-support-eu', IOS_KEY),
+        ('head_object', 'briefcase-support-eu', MACOS_KEY),
+        ('head_object', 'briefcase-support-eu', MACOS_KEY),
+    ]
+
+
+def test_inventory_checked_first(clients):
+    "Keys that aren't in the primary bucket's inventory aren't checked in a replica"
+    clients['us-west-2'].objects[IOS_KEY] = b'ios support'
+    app = create_app({
+        'TESTING': True,
+        'S3_REPLICAS': REPLICAS,
+        'S3_INVENTORY': True,
+        'S3_INVENTORY_REFRESH_INTERVAL': 0,
+    })
+    client = app.test_client()
+
+    response = client.get('/python?version=3.10&platform=iOS&region=eu-west-1')
+    assert response.location == f'https://briefcase-support-eu.s3.amazonaws.com/{IOS_KEY}?Expires=60'
+
+    response = client.get('/python?version=3.10&platform=macOS&revision=2&region=eu-west-1')
+    assert response.status_code == 404
+    assert clients['eu-west-1'].calls == [
+        ('head_object', 'briefcase-support-eu', IOS_KEY),
+        ('generate_presigned_url', 'briefcase-support-eu', IOS_KEY),
+    ]
+
+
+def test_unreachable_replica(clients):
+    "A replica that can't be reached isn't remembered as missing the key"
+    replicas = ReplicaSet(S3ClientPool(), REPLICAS)
+    head_object = clients['eu-west-1'].head_object
+
+    def unreachable(Bucket, Key):
+        raise ConnectionError("Connection refused")
+    clients['eu-west-1'].head_object = unreachable
+
+    assert not replicas.exists('eu-west-1', IOS_KEY)
+
+    clients['eu-west-1'].head_object = head_object
+    assert replicas.exists('eu-west-1', IOS_KEY)
@@ -0,0 +1,103 @@
+import threading
+from unittest import mock
+
+import boto3
+
+from skep import platforms
+from skep.s3 import S3ClientPool
+from skep.skep import create_app
+
+
+def test_client_reused(monkeypatch):
+    "A client is only constructed once per region"
+    mock_s3_client = mock.MagicMock()
+    monkeypatch.setattr(boto3, 'client', mock_s3_client)
+
+    pool = S3ClientPool(max_pool_connections=42, tcp_keepalive=False)
+
+    first = pool.client('us-west-2')
+    second = pool.client('us-west-2')
+
+    assert first is second
+    assert mock_s3_client.call_count == 1
+    args, kwargs = mock_s3_client.call_args
+    assert args == ('s3',)
+    assert kwargs['region_name'] == 'us-west-2'
+    assert kwargs['config'].max_pool_connections == 42
+    assert kwargs['config'].tcp_keepalive is False
+
+
+def test_client_per_region(monkeypatch):
+    "Each region gets its own client"
+    mock_s3_client = mock.MagicMock(side_effect=lambda *a, **kw: mock.MagicMock())
+    monkeypatch.setattr(boto3, 'client', mock_s3_client)
+
+    pool = S3ClientPool()
+
+    assert pool.client('us-west-2') is not pool.client('eu-west-1')
+    assert mock_s3_client.call_count == 2
+
+
+def test_close(monkeypatch):
+    "Closing the pool closes every client's connections"
+    mock_s3_client = mock.MagicMock(side_effect=lambda *a, **kw: mock.MagicMock())
+    monkeypatch.setattr(boto3, 'client', mock_s3_client)
+
+    pool = S3ClientPool()
+    clients = [pool.client('us-west-2'), pool.client('eu-west-1')]
+    pool.close()
+
+    for client in clients:
+        client.close.assert_called_once_with()
+    assert pool.client('us-west-2') is clients[0]
+
+
+def test_client_threaded(monkeypatch):
+    "Concurrent first use of a region only constructs a single client"
+    mock_s3_client = mock.MagicMock(side_effect=lambda *a, **kw: mock.MagicMock())
+    monkeypatch.setattr(boto3, 'client', mock_s3_client)
+
+    pool = S3ClientPool()
+    barrier = threading.Barrier(8)
+    clients = []
+
+    def worker():
+        barrier.wait()
+        clients.append(pool.client('us-west-2'))
+
+    threads = [threading.Thread(target=worker) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert mock_s3_client.call_count == 1
+    assert all(client is clients[0] for client in clients)
+
+
+def test_client_shared_across_requests(monkeypatch):
+    "The app constructs a single S3 client, no matter how many requests are served"
+    mock_s3_client = mock.MagicMock()
+    monkeypatch.setattr(boto3, 'client', mock_s3_client)
+
+    mock_support_url = mock.MagicMock(return_value='https://example.com/support_file.tar.gz')
+    monkeypatch.setattr(platforms, 'support_url', mock_support_url)
+
+    test_client = create_app({'TESTING': True}).test_client()
+    for i in range(20):
+        response = test_client.get('/python?version=3.7&platform=linux&arch=x86_64')
+        assert response.status_code == 302
+
+    assert mock_s3_client.call_count == 1
+    assert mock_support_url.call_count == 20
+
+
+def test_client_prewarm(monkeypatch):
+    "The S3 client can be constructed when the app is created"
+    mock_s3_client = mock.MagicMock()
+    monkeypatch.setattr(boto3, 'client', mock_s3_client)
+
+    app = create_app({'TESTING': True, 'S3_PREWARM': True})
+
+    assert mock_s3_client.call_count == 1
+    assert app.extensions['s3'].client('us-west-2') is mock_s3_client.return_value
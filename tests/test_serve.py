@@ -0,0 +1,180 @@
+import http.client
+import os
+import queue
+import re
+import signal
+import subprocess
+import sys
+import threading
+
+import pytest
+
+# Run the master with a slow view, to show how in-flight requests are
+# handled.
+SCRIPT = """
+import logging
+import sys
+import time
+
+from skep.serve import Master, listen
+from skep.skep import create_app
+
+
+def app_factory():
+    app = create_app({'TESTING': True})
+
+    @app.route('/slow')
+    def slow():
+        print("Slow request started", file=sys.stderr, flush=True)
+        time.sleep(float(sys.argv[2]))
+        return 'done'
+
+    return app
+
+
+logging.basicConfig(level=logging.INFO, format='[%(process)d] %(message)s')
+sock = listen('127.0.0.1', 0)
+print(f"Listening on http://127.0.0.1:{sock.getsockname()[1]}", file=sys.stderr, flush=True)
+Master(sock, app_factory=app_factory, workers=2, timeout=float(sys.argv[1])).run()
+"""
+
+
+class Server:
+    "A server running in a subprocess"
+    def __init__(self, args):
+        self.process = subprocess.Popen(
+            [sys.executable, *args],
+            stderr=subprocess.PIPE,
+            text=True,
+            env=dict(os.environ, AWS_ACCESS_KEY_ID='AKIDEXAMPLE', AWS_SECRET_ACCESS_KEY='secret'),
+        )
+        self.lines = queue.Queue()
+        self.log = []
+        threading.Thread(target=self._read, daemon=True).start()
+
+        self.port = int(self.expect(r'Listening on http://127.0.0.1:(\d+)').group(1))
+        self.workers = self.started(2)
+
+    def _read(self):
+        for line in self.process.stderr:
+            self.lines.put(line)
+
+    def expect(self, pattern, timeout=10):
+        "Wait for the server to log a line matching ``pattern``"
+        while True:
+            line = self.lines.get(timeout=timeout)
+            self.log.append(line)
+            match = re.search(pattern, line)
+            if match:
+                return match
+
+    def started(self, count):
+        return {int(self.expect(r'Started worker (\d+)').group(1)) for i in range(count)}
+
+    def exited(self, count):
+        return dict(
+            (int(match.group(1)), int(match.group(2)))
+            for match in (self.expect(r'Worker (\d+) exited with status (-?\d+)') for i in range(count))
+        )
+
+    def get(self, path):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def signal(self, signum):
+        self.process.send_signal(signum)
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(*args):
+        server = Server(args)
+        servers.append(server)
+        return server
+
+    yield start
+
+    for server in servers:
+        server.stop()
+
+
+def test_serve(server):
+    "Requests are served by the workers, until the master is stopped"
+    server = server('-m', 'skep.serve', '--port', '0', '--workers', '2')
+
+    assert server.get('/')[0] == 200
+    assert server.get('/python?version=3.10&platform=windows')[0] == 302
+    assert server.get('/python?version=3.10&platform=macOS')[0] == 302
+
+    server.signal(signal.SIGTERM)
+    assert server.exited(2) == {pid: 0 for pid in server.workers}
+    assert server.process.wait(timeout=10) == 0
+
+
+def test_reload(server):
+    "A reload replaces every worker"
+    server = server('-c', SCRIPT, '30', '0')
+
+    server.signal(signal.SIGHUP)
+    server.expect('Reloading')
+    replacements = server.started(2)
+
+    assert not replacements & server.workers
+    assert server.exited(2) == {pid: 0 for pid in server.workers}
+    for i in range(4):
+        assert server.get('/')[0] == 200
+
+
+def test_in_flight(server):
+    "Stopped workers finish the requests they are serving"
+    server = server('-c', SCRIPT, '30', '1')
+    results = []
+    thread = threading.Thread(target=lambda: results.append(server.get('/slow')))
+    thread.start()
+    server.expect('Slow request started')
+
+    server.signal(signal.SIGTERM)
+    thread.join()
+
+    assert results == [(200, b'done')]
+    assert server.process.wait(timeout=10) == 0
+
+
+def test_stop_timeout(server):
+    "Workers that don't stop in time are killed"
+    server = server('-c', SCRIPT, '0.5', '30')
+    thread = threading.Thread(target=lambda: pytest.raises(Exception, server.get, '/slow'))
+    thread.start()
+    server.expect('Slow request started')
+
+    server.signal(signal.SIGTERM)
+    thread.join()
+
+    assert sorted(server.exited(2).values()) == [-signal.SIGKILL, 0]
+    assert any("didn't stop in time" in line for line in server.log)
+    assert server.process.wait(timeout=10) == 0
+
+
+def test_replace_crashed_worker(server):
+    "A worker that dies is replaced"
+    server = server('-c', SCRIPT, '30', '0')
+    crashed = min(server.workers)
+
+    os.kill(crashed, signal.SIGKILL)
+
+    assert server.exited(1) == {crashed: -signal.SIGKILL}
+    replacement = server.started(1)
+    assert not replacement & server.workers
+    assert server.get('/')[0] == 200
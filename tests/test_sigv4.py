@@ -0,0 +1,261 @@
+import datetime
+from unittest import mock
+
+import boto3
+import botocore.auth
+import pytest
+from botocore.config import Config
+
+from skep.headers import presigned_url_expiry
+from skep.sigv4 import SigV4Presigner
+from skep.skep import create_app
+
+ACCESS_KEY = 'AKIDEXAMPLE'
+SECRET_KEY = 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY'
+
+
+def botocore_presigned_url(monkeypatch, region, session_token, timestamp, bucket, key, expires_in):
+    monkeypatch.setattr(
+        botocore.auth,
+        'get_current_datetime',
+        lambda: datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).replace(tzinfo=None),
+    )
+    s3 = boto3.client(
+        's3',
+        region_name=region,
+        aws_access_key_id=ACCESS_KEY,
+        aws_secret_access_key=SECRET_KEY,
+        aws_session_token=session_token,
+        config=Config(signature_version='s3v4'),
+    )
+    return s3.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket, 'Key': key},
+        ExpiresIn=expires_in,
+    )
+
+
+@pytest.mark.parametrize(
+    "region, session_token, timestamp, key, expires_in",
+    [
+        ('us-west-2', None, 1651406400, 'python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz', 60),
+        ('us-west-2', None, 1651449599, 'python/3.8/android/Python-3.8-Android-support.b5.zip', 60),
+        ('us-east-1', None, 1651406400, 'python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz', 3600),
+        ('eu-west-1', 'IQoJb3JpZ2/+=token', 1651406400, 'python/3.9/macOS/Python-3.9-macOS-support.b7.tar.gz', 60),
+        ('us-west-2', None, 1651406400, 'a key/with ~odd+chars=', 60),
+    ]
+)
+def test_matches_botocore(monkeypatch, region, session_token, timestamp, key, expires_in):
+    "The presigned URL is identical to the one botocore produces"
+    presigner = SigV4Presigner(
+        region,
+        access_key=ACCESS_KEY,
+        secret_key=SECRET_KEY,
+        session_token=session_token,
+        clock=lambda: timestamp,
+    )
+
+    url = presigner.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': 'briefcase-support', 'Key': key},
+        ExpiresIn=expires_in,
+    )
+
+    assert url == botocore_presigned_url(
+        monkeypatch,
+        region=region,
+        session_token=session_token,
+        timestamp=timestamp,
+        bucket='briefcase-support',
+        key=key,
+        expires_in=expires_in,
+    )
+
+
+def test_signing_key_rotates_daily(monkeypatch):
+    "The cached signing key is replaced when the date changes"
+    now = [1651406400]
+    presigner = SigV4Presigner('us-west-2', ACCESS_KEY, SECRET_KEY, clock=lambda: now[0])
+
+    presigner.presign('briefcase-support', 'key', 60)
+    now[0] += 86400
+    url = presigner.presign('briefcase-support', 'key', 60)
+
+    assert url == botocore_presigned_url(
+        monkeypatch,
+        region='us-west-2',
+        session_token=None,
+        timestamp=now[0],
+        bucket='briefcase-support',
+        key='key',
+        expires_in=60,
+    )
+
+
+def test_unsupported_method():
+    "Only get_object URLs can be signed"
+    presigner = SigV4Presigner('us-west-2', ACCESS_KEY, SECRET_KEY)
+
+    with pytest.raises(ValueError):
+        presigner.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': 'briefcase-support', 'Key': 'key'},
+            ExpiresIn=60,
+        )
+
+
+def test_from_environment():
+    "Credentials can be read from the environment"
+    presigner = SigV4Presigner.from_environment(
+        'us-west-2',
+        environ={
+            'AWS_ACCESS_KEY_ID': ACCESS_KEY,
+            'AWS_SECRET_ACCESS_KEY': SECRET_KEY,
+            'AWS_SESSION_TOKEN': 'token',
+        },
+    )
+
+    assert presigner.access_key == ACCESS_KEY
+    assert presigner.secret_key == SECRET_KEY
+    assert presigner.session_token == 'token'
+
+
+def test_from_environment_no_credentials():
+    "If there are no credentials in the environment, an error is raised"
+    with pytest.raises(RuntimeError):
+        SigV4Presigner.from_environment('us-west-2', environ={})
+
+
+def test_app_sigv4_signer(monkeypatch):
+    "The app can sign URLs without using boto3"
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', ACCESS_KEY)
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', SECRET_KEY)
+    mock_s3_client = mock.MagicMock()
+    monkeypatch.setattr(boto3, 'client', mock_s3_client)
+
+    test_client = create_app({'TESTING': True, 'S3_SIGNER': 'sigv4'}).test_client()
+    response = test_client.get('/python?version=3.10&platform=iOS')
+
+    assert response.status_code == 302
+    assert response.location.startswith(
+        'https://briefcase-support.s3.amazonaws.com/python/3.10/iOS/Python-3.10-iOS-support.b3.tar.gz?'
+        'X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Credential=AKIDEXAMPLE%2F'
+    )
+    mock_s3_client.assert_not_called()
+
+
+def test_app_sigv4_signer_no_credentials(monkeypatch):
+    "If there are no credentials for the SigV4 signer, a 502 is returned"
+    monkeypatch.delenv('AWS_ACCESS_KEY_ID', raising=False)
+    monkeypatch.delenv('AWS_SECRET_ACCESS_KEY', raising=False)
+
+    test_client = create_app({'TESTING': True, 'S3_SIGNER': 'sigv4'}).test_client()
+    response = test_client.get('/python?version=3.10&platform=iOS')
+
+    assert response.status_code == 502
+
+
+def test_app_unknown_signer():
+    "An unknown signer is a configuration error"
+    with pytest.raises(ValueError):
+        create_app({'TESTING': True, 'S3_SIGNER': 'unknown'})
+
+
+def presign_at(presigner, now):
+    presigner.clock = lambda: now
+    return presigner.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': 'briefcase-support', 'Key': 'key'},
+        ExpiresIn=60,
+    )
+
+
+def test_time_bucket_stable():
+    "Within a time bucket, the presigned URL doesn't change"
+    presigner = SigV4Presigner('us-west-2', ACCESS_KEY, SECRET_KEY, time_bucket=300)
+
+    # 1651406400 is the start of a 5 minute bucket.
+    url = presign_at(presigner, 1651406400)
+    assert presign_at(presigner, 1651406401.5) == url
+    assert presign_at(presigner, 1651406699) == url
+
+    # The URL is signed as of the start of the bucket, and lasts for the
+    # rest of the bucket plus the requested lifetime.
+    assert url == presigner.presign('briefcase-support', 'key', 360, timestamp=1651406400)
+    assert presigned_url_expiry(url) == 1651406400 + 300 + 60
+
+
+def test_time_bucket_rotates():
+    "Each time bucket gets a different presigned URL"
+    presigner = SigV4Presigner('us-west-2', ACCESS_KEY, SECRET_KEY, time_bucket=300)
+
+    first = presign_at(presigner, 1651406699)
+    second = presign_at(presigner, 1651406700)
+
+    assert first != second
+    assert 'X-Amz-Date=20220501T120000Z' in first
+    assert 'X-Amz-Date=20220501T120500Z' in second
+
+
+def test_time_bucket_disabled():
+    "Without a time bucket, URLs are signed as of the current time"
+    presigner = SigV4Presigner('us-west-2', ACCESS_KEY, SECRET_KEY)
+
+    assert presign_at(presigner, 1651406400) != presign_at(presigner, 1651406401)
+
+
+def test_app_time_bucket(monkeypatch):
+    "The app can produce time-bucketed URLs"
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', ACCESS_KEY)
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', SECRET_KEY)
+
+    test_client = create_app({
+        'TESTING': True,
+        'S3_SIGNER': 'sigv4',
+        'PRESIGN_TIME_BUCKET': 3600,
+        'PRESIGNED_URL_CACHE_SIZE': 0,
+    }).test_client()
+    first = test_client.get('/python?version=3.10&platform=iOS')
+    second = test_client.get('/python?version=3.10&platform=iOS')
+
+    assert first.location == second.location
+    assert 'X-Amz-Expires=3660' in first.location
+    assert first.headers['ETag'] == second.headers['ETag']
+
+
+def test_app_time_bucket_cached(monkeypatch):
+    "Cached URLs change when the time bucket does"
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', ACCESS_KEY)
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', SECRET_KEY)
+    now = [1651406400 + 290.0]
+    from_environment = SigV4Presigner.from_environment
+    monkeypatch.setattr(
+        SigV4Presigner,
+        'from_environment',
+        lambda region, **kwargs: from_environment(region, clock=lambda: now[0], **kwargs),
+    )
+
+    app = create_app({
+        'TESTING': True,
+        'S3_SIGNER': 'sigv4',
+        'PRESIGN_TIME_BUCKET': 300,
+    })
+    app.extensions['presigned_url_cache'].clock = lambda: now[0]
+    test_client = app.test_client()
+
+    # Signed late in a bucket, and valid for longer than the cache margin...
+    first = test_client.get('/python?version=3.10&platform=iOS').location
+    assert 'X-Amz-Date=20220501T120000Z' in first
+
+    # ...but the next bucket gets its own URL, as soon as it starts.
+    now[0] += 10
+    second = test_client.get('/python?version=3.10&platform=iOS').location
+    assert 'X-Amz-Date=20220501T120500Z' in second
+    now[0] += 289
+    assert test_client.get('/python?version=3.10&platform=iOS').location == second
+
+
+def test_app_time_bucket_requires_sigv4():
+    "Time-bucketed URLs can't be produced by boto3"
+    with pytest.raises(ValueError):
+        create_app({'TESTING': True, 'PRESIGN_TIME_BUCKET': 300})
@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+from skep.singleflight import SingleFlight
+from skep.skep import create_app
+
+MACOS_KEY = 'python/3.10/macOS/Python-3.10-macOS-support.b3.tar.gz'
+THREADS = 10
+
+
+def burst(target):
+    "Run ``target`` in several threads at once, returning the results (or exceptions)"
+    results = [None] * THREADS
+    barrier = threading.Barrier(THREADS)
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.001)
+
+
+def test_coalesced():
+    "Concurrent calls for the same key share one call"
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def sign():
+        calls.append(1)
+        # Hold the call open until every other caller is waiting on it.
+        release.wait()
+        return 'https://example.com/signed'
+
+    def request():
+        return flight.do('key', sign)
+
+    releaser = threading.Thread(target=lambda: (wait_for(lambda: flight.coalesced == THREADS - 1), release.set()))
+    releaser.start()
+    results = burst(request)
+    releaser.join()
+
+    assert results == ['https://example.com/signed'] * THREADS
+    assert len(calls) == 1
+    assert flight.coalesced == THREADS - 1
+
+
+def test_error_shared():
+    "An exception is raised by every caller waiting on the call"
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def sign():
+        calls.append(1)
+        release.wait()
+        raise RuntimeError("Signing failed")
+
+    releaser = threading.Thread(target=lambda: (wait_for(lambda: flight.coalesced == THREADS - 1), release.set()))
+    releaser.start()
+    results = burst(lambda: flight.do('key', sign))
+    releaser.join()
+
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_sequential():
+    "Results aren't kept once a call has finished"
+    flight = SingleFlight()
+
+    assert flight.do('key', lambda: 1) == 1
+    assert flight.do('key', lambda: 2) == 2
+    assert flight.coalesced == 0
+
+    with pytest.raises(ValueError):
+        flight.do('key', lambda: int('x'))
+    assert flight.do('key', lambda: 3) == 3
+
+
+def test_different_keys():
+    "Calls for different keys aren't coalesced"
+    flight = SingleFlight()
+    barrier = threading.Barrier(2, timeout=5)
+
+    def sign(value):
+        # Both calls must be in flight at the same time to pass the barrier.
+        barrier.wait()
+        return value
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda key=key: results.append(flight.do(key, lambda: sign(key))))
+        for key in ('a', 'b')
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == ['a', 'b']
+    assert flight.coalesced == 0
+
+
+@pytest.mark.parametrize('cache_size', [0, 256])
+def test_burst(fake_s3, cache_size):
+    "A burst of identical requests is signed once"
+    app = create_app({
+        'TESTING': True,
+        'PRESIGNED_URL_CACHE_SIZE': cache_size,
+    })
+    flight = app.extensions['signing_flight']
+    release = threading.Event()
+    original = fake_s3.generate_presigned_url
+
+    def slow_presigned_url(*args, **kwargs):
+        release.wait()
+        return original(*args, **kwargs)
+    fake_s3.generate_presigned_url = slow_presigned_url
+
+    def request():
+        return app.test_client().get('/python?version=3.10&platform=macOS').status_code
+
+    releaser = threading.Thread(target=lambda: (wait_for(lambda: flight.coalesced == THREADS - 1), release.set()))
+    releaser.start()
+    results = burst(request)
+    releaser.join()
+
+    assert results == [302] * THREADS
+    assert fake_s3.calls == [('generate_presigned_url', 'briefcase-support', MACOS_KEY)]
+
+
+def test_disabled(fake_s3):
+    "Coalescing can be disabled"
+    app = create_app({
+        'TESTING': True,
+        'COALESCE_SIGNING': False,
+    })
+
+    assert app.extensions['signing_flight'] is None
+    assert app.test_client().get('/python?version=3.10&platform=macOS').status_code == 302
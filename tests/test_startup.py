@@ -0,0 +1,41 @@
+import json
+import subprocess
+import sys
+
+# Run in a fresh interpreter, so that modules imported by other tests
+# don't affect what is loaded.
+SCRIPT = """
+import json
+import sys
+
+import skep.zappa
+
+loaded = {'import': 'boto3' in sys.modules}
+
+client = skep.zappa.app.test_client()
+client.get('/')
+loaded['home'] = 'boto3' in sys.modules
+client.get('/python?version=3.7&platform=windows')
+loaded['windows'] = 'boto3' in sys.modules
+client.get('/python?version=3.7&platform=linux&arch=x86_64')
+loaded['linux'] = 'boto3' in sys.modules
+
+print(json.dumps(loaded))
+"""
+
+
+def test_boto3_imported_lazily():
+    "boto3 isn't imported until the first S3-backed request"
+    result = subprocess.run(
+        [sys.executable, '-c', SCRIPT],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    assert json.loads(result.stdout) == {
+        'import': False,
+        'home': False,
+        'windows': False,
+        'linux': True,
+    }